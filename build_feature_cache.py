@@ -0,0 +1,9 @@
+"""
+Prebuilds the binary feature cache for all datasets, so that the models do not have to parse the feature csv files.
+"""
+
+from drevalpy.utils import build_feature_cache, get_feature_cache_parser
+
+if __name__ == "__main__":
+    arguments = get_feature_cache_parser().parse_args()
+    build_feature_cache(path_data=arguments.path_data, dataset_names=arguments.dataset_names, models=arguments.models)
@@ -16,6 +16,7 @@ The FeatureDataset class can be used to randomize feature vectors.
 import copy
 import os
 from abc import ABC, abstractmethod
+from collections.abc import Iterator, Mapping, MutableMapping
 from typing import Any, Callable, Optional, Union
 
 import networkx as nx
@@ -25,7 +26,7 @@ from numpy.typing import ArrayLike
 from sklearn.base import TransformerMixin
 from sklearn.model_selection import GroupKFold, train_test_split
 
-from .utils import permute_features, randomize_graph
+from .utils import atomic_write, encode_pairs, permute_features, randomize_graph
 
 
 class Dataset(ABC):
@@ -92,6 +93,44 @@ class DrugResponseDataset(Dataset):
             self.predictions = None
         self.cv_splits = None
 
+    @property
+    def cell_line_ids(self) -> Optional[np.ndarray]:
+        """Cell line IDs, one per row. Decoded from the integer codes on first access."""
+        return None if self._cell_lines is None else self._cell_lines.ids
+
+    @cell_line_ids.setter
+    def cell_line_ids(self, cell_line_ids: Optional[ArrayLike]) -> None:
+        self._cell_lines = None if cell_line_ids is None else _IdEncoding.from_ids(cell_line_ids)
+
+    @property
+    def drug_ids(self) -> Optional[np.ndarray]:
+        """Drug IDs, one per row. Decoded from the integer codes on first access."""
+        return None if self._drugs is None else self._drugs.ids
+
+    @drug_ids.setter
+    def drug_ids(self, drug_ids: Optional[ArrayLike]) -> None:
+        self._drugs = None if drug_ids is None else _IdEncoding.from_ids(drug_ids)
+
+    @property
+    def cell_line_codes(self) -> np.ndarray:
+        """int32 codes of the cell lines, positions in cell_line_vocabulary."""
+        return self._cell_lines.codes
+
+    @property
+    def drug_codes(self) -> np.ndarray:
+        """int32 codes of the drugs, positions in drug_vocabulary."""
+        return self._drugs.codes
+
+    @property
+    def cell_line_vocabulary(self) -> np.ndarray:
+        """Distinct cell line IDs. Shared by all datasets derived from this dataset, e.g., the CV splits."""
+        return self._cell_lines.vocabulary
+
+    @property
+    def drug_vocabulary(self) -> np.ndarray:
+        """Distinct drug IDs. Shared by all datasets derived from this dataset, e.g., the CV splits."""
+        return self._drugs.vocabulary
+
     def __len__(self):
         """Overwrites the default length method."""
         return len(self.response)
@@ -156,7 +195,7 @@ class DrugResponseDataset(Dataset):
         )
         if self.predictions is not None:
             out["predictions"] = self.predictions
-        out.to_csv(path, index=False)
+        atomic_write(path, write=lambda f: out.to_csv(f, index=False))
 
     def add_rows(self, other: "DrugResponseDataset") -> None:
         """
@@ -165,20 +204,15 @@ class DrugResponseDataset(Dataset):
         :param other: other dataset
         """
         self.response = np.concatenate([self.response, other.response])
-        self.cell_line_ids = np.concatenate([self.cell_line_ids, other.cell_line_ids])
-        self.drug_ids = np.concatenate([self.drug_ids, other.drug_ids])
+        self._cell_lines = self._cell_lines.concatenate(other._cell_lines)
+        self._drugs = self._drugs.concatenate(other._drugs)
 
         if self.predictions is not None and other.predictions is not None:
             self.predictions = np.concatenate([self.predictions, other.predictions])
 
     def remove_nan_responses(self) -> None:
         """Removes rows with NaN values in the response."""
-        mask = np.isnan(self.response)
-        self.response = self.response[~mask]
-        self.cell_line_ids = self.cell_line_ids[~mask]
-        self.drug_ids = self.drug_ids[~mask]
-        if self.predictions is not None:
-            self.predictions = self.predictions[~mask]
+        self.mask(~np.isnan(self.response))
 
     def shuffle(self, random_state: int = 42) -> None:
         """
@@ -189,11 +223,7 @@ class DrugResponseDataset(Dataset):
         indices = np.arange(len(self.response))
         np.random.seed(random_state)
         np.random.shuffle(indices)
-        self.response = self.response[indices]
-        self.cell_line_ids = self.cell_line_ids[indices]
-        self.drug_ids = self.drug_ids[indices]
-        if self.predictions is not None:
-            self.predictions = self.predictions[indices]
+        self.mask(indices)
 
     def remove_drugs(self, drugs_to_remove: Union[str, list]) -> None:
         """
@@ -203,11 +233,7 @@ class DrugResponseDataset(Dataset):
         """
         if isinstance(drugs_to_remove, str):
             drugs_to_remove = [drugs_to_remove]
-
-        mask = [drug not in drugs_to_remove for drug in self.drug_ids]
-        self.drug_ids = self.drug_ids[mask]
-        self.cell_line_ids = self.cell_line_ids[mask]
-        self.response = self.response[mask]
+        self.mask(~self.get_drug_mask(drugs_to_remove))
 
     def remove_cell_lines(self, cell_lines_to_remove: Union[str, list]) -> None:
         """
@@ -217,11 +243,7 @@ class DrugResponseDataset(Dataset):
         """
         if isinstance(cell_lines_to_remove, str):
             cell_lines_to_remove = [cell_lines_to_remove]
-
-        mask = [cell_line not in cell_lines_to_remove for cell_line in self.cell_line_ids]
-        self.drug_ids = self.drug_ids[mask]
-        self.cell_line_ids = self.cell_line_ids[mask]
-        self.response = self.response[mask]
+        self.mask(~self.get_cell_line_mask(cell_lines_to_remove))
 
     def remove_rows(self, indices: ArrayLike) -> None:
         """
@@ -229,8 +251,8 @@ class DrugResponseDataset(Dataset):
 
         :param indices: indices of rows to remove
         """
-        self.drug_ids = np.delete(self.drug_ids, indices)
-        self.cell_line_ids = np.delete(self.cell_line_ids, indices)
+        self._drugs = self._drugs.delete(indices)
+        self._cell_lines = self._cell_lines.delete(indices)
         self.response = np.delete(self.response, indices)
         if self.predictions is not None:
             self.predictions = np.delete(self.predictions, indices)
@@ -242,11 +264,116 @@ class DrugResponseDataset(Dataset):
         :param cell_line_ids: cell line IDs or None to keep all cell lines
         :param drug_ids: drug IDs or None to keep all cell lines
         """
+        keep = np.ones(len(self.response), dtype=bool)
         if drug_ids is not None:
-            self.remove_drugs(list(set(self.drug_ids) - set(drug_ids)))
-
+            keep &= self.get_drug_mask(drug_ids)
         if cell_line_ids is not None:
-            self.remove_cell_lines(list(set(self.cell_line_ids) - set(cell_line_ids)))
+            keep &= self.get_cell_line_mask(cell_line_ids)
+        self.mask(keep)
+
+    def get_cell_line_mask(self, cell_line_ids: Union[Any, ArrayLike]) -> np.ndarray:
+        """
+        Vectorized equivalent of cell_line_ids == cell_line_id or np.isin(cell_line_ids, cell_line_ids).
+
+        :param cell_line_ids: a single cell line ID or several cell line IDs
+        :return: boolean mask, True for the rows of the given cell lines
+        """
+        return self._cell_lines.isin(cell_line_ids)
+
+    def get_drug_mask(self, drug_ids: Union[Any, ArrayLike]) -> np.ndarray:
+        """
+        Vectorized equivalent of drug_ids == drug_id or np.isin(drug_ids, drug_ids).
+
+        :param drug_ids: a single drug ID or several drug IDs
+        :return: boolean mask, True for the rows of the given drugs
+        """
+        return self._drugs.isin(drug_ids)
+
+    def get_pair_codes(self) -> np.ndarray:
+        """
+        Returns one 64-bit key per (cell line, drug) pair, computed from the codes (see encode_pairs).
+
+        The keys are only comparable between datasets that share their vocabularies, e.g., the splits of one dataset.
+        Use get_pair_mask to compare pairs with any other dataset.
+        :return: int64 array, equal for rows with the same cell line and drug
+        """
+        return encode_pairs(self.cell_line_codes, self.drug_codes)
+
+    def get_pair_mask(self, other: "DrugResponseDataset") -> np.ndarray:
+        """
+        Vectorized test which (cell line, drug) pairs also occur in another dataset.
+
+        :param other: other dataset, its vocabularies may differ from the vocabularies of this dataset
+        :return: boolean mask, True for the rows whose pair occurs in other
+        """
+        cell_line_codes = self._cell_lines.recode(other._cell_lines)
+        drug_codes = self._drugs.recode(other._drugs)
+        known = (cell_line_codes >= 0) & (drug_codes >= 0)
+        other_pairs = encode_pairs(cell_line_codes[known], drug_codes[known])
+        return np.isin(self.get_pair_codes(), other_pairs)
+
+    def group_row_indices(self, group: str) -> dict[Any, np.ndarray]:
+        """
+        Groups the rows by cell line or by drug with a single sort of the codes.
+
+        :param group: cell_line or drug
+        :return: dictionary cell line/drug ID -> row indices in ascending order. The IDs are sorted.
+        :raises AssertionError: if group is neither cell_line nor drug
+        """
+        if group not in {"cell_line", "drug"}:
+            raise AssertionError(f"group must be 'cell_line' or 'drug', but is {group}")
+        encoding = self._cell_lines if group == "cell_line" else self._drugs
+        return encoding.group_indices()
+
+    def groupby_cell_line(self) -> Iterator[tuple[Any, "DrugResponseDataset"]]:
+        """
+        Splits the dataset by cell line, see _groupby.
+
+        :return: iterator over (cell line ID, dataset of the cell line), sorted by cell line ID
+        """
+        return self._groupby("cell_line")
+
+    def groupby_drug(self) -> Iterator[tuple[Any, "DrugResponseDataset"]]:
+        """
+        Splits the dataset by drug, see _groupby.
+
+        :return: iterator over (drug ID, dataset of the drug), sorted by drug ID
+        """
+        return self._groupby("drug")
+
+    def _groupby(self, group: str) -> Iterator[tuple[Any, "DrugResponseDataset"]]:
+        """
+        Splits the dataset by cell line or by drug.
+
+        The rows are sorted once by their codes into a copy of the dataset. The dataset of a group is a slice of that
+        copy, i.e., its arrays are views and the rows keep their order. Changing this dataset does not change the
+        groups and vice versa; changing the response of a group in place is only visible in that group.
+        :param group: cell_line or drug
+        :return: iterator over (ID, dataset of the group), sorted by ID
+        :raises AssertionError: if group is neither cell_line nor drug
+        """
+        if group not in {"cell_line", "drug"}:
+            raise AssertionError(f"group must be 'cell_line' or 'drug', but is {group}")
+        encoding = self._cell_lines if group == "cell_line" else self._drugs
+        order, bounds, group_codes = encoding.sort_groups()
+        sorted_dataset = self.subset(order)
+        for code in group_codes:
+            yield encoding.vocabulary[code], sorted_dataset.subset(slice(bounds[code], bounds[code + 1]))
+
+    def subset(self, indices: ArrayLike) -> "DrugResponseDataset":
+        """
+        Returns a new dataset with the selected rows. The new dataset shares the ID vocabularies with this dataset.
+
+        :param indices: row indices, boolean mask or slice. A slice returns views of the arrays of this dataset.
+        :return: the new dataset
+        """
+        subset = DrugResponseDataset(dataset_name=self.dataset_name)
+        subset.response = self.response[indices]
+        subset._cell_lines = self._cell_lines.take(indices)
+        subset._drugs = self._drugs.take(indices)
+        if self.predictions is not None:
+            subset.predictions = self.predictions[indices]
+        return subset
 
     def split_dataset(
         self,
@@ -269,20 +396,13 @@ class DrugResponseDataset(Dataset):
         :return: list of dictionaries containing the cross-validation datasets.
             Each fold is a dictionary with keys 'train', 'validation', 'test', 'validation_es', 'early_stopping'.
         """
-        cell_line_ids = self.cell_line_ids
-        drug_ids = self.drug_ids
-        response = self.response
-
         if mode == "LPO":
             cv_splits = _leave_pair_out_cv(
-                n_cv_splits,
-                response,
-                cell_line_ids,
-                drug_ids,
-                split_validation,
-                validation_ratio,
-                random_state,
-                self.dataset_name,
+                n_cv_splits=n_cv_splits,
+                dataset=self,
+                split_validation=split_validation,
+                validation_ratio=validation_ratio,
+                random_state=random_state,
             )
 
         elif mode in ["LCO", "LDO"]:
@@ -290,13 +410,10 @@ class DrugResponseDataset(Dataset):
             cv_splits = _leave_group_out_cv(
                 group=group,
                 n_cv_splits=n_cv_splits,
-                response=response,
-                cell_line_ids=cell_line_ids,
-                drug_ids=drug_ids,
+                dataset=self,
                 split_validation=split_validation,
                 validation_ratio=validation_ratio,
                 random_state=random_state,
-                dataset_name=self.dataset_name,
             )
         else:
             raise ValueError(f"Unknown split mode {mode!r}. Choose from 'LPO', 'LCO', 'LDO'.")
@@ -381,14 +498,13 @@ class DrugResponseDataset(Dataset):
                     self.cv_splits[i][mode] = split
 
     def copy(self):
-        """Returns a copy of the drug response dataset."""
-        return DrugResponseDataset(
-            response=copy.deepcopy(self.response),
-            cell_line_ids=copy.deepcopy(self.cell_line_ids),
-            drug_ids=copy.deepcopy(self.drug_ids),
-            predictions=copy.deepcopy(self.predictions),
-            dataset_name=self.dataset_name,
-        )
+        """Returns a copy of the drug response dataset. The copy shares the ID vocabularies with this dataset."""
+        copied = DrugResponseDataset(dataset_name=self.dataset_name)
+        copied.response = copy.deepcopy(self.response)
+        copied.predictions = copy.deepcopy(self.predictions)
+        copied._cell_lines = None if self._cell_lines is None else self._cell_lines.copy()
+        copied._drugs = None if self._drugs is None else self._drugs.copy()
+        return copied
 
     def __hash__(self):
         """Overwrites default hash method."""
@@ -409,8 +525,8 @@ class DrugResponseDataset(Dataset):
         :param mask: boolean mask
         """
         self.response = self.response[mask]
-        self.cell_line_ids = self.cell_line_ids[mask]
-        self.drug_ids = self.drug_ids[mask]
+        self._cell_lines = self._cell_lines.take(mask)
+        self._drugs = self._drugs.take(mask)
         if self.predictions is not None:
             self.predictions = self.predictions[mask]
 
@@ -444,6 +560,148 @@ class DrugResponseDataset(Dataset):
             self.predictions = response_transformation.inverse_transform(self.predictions.reshape(-1, 1)).squeeze()
 
 
+class _IdEncoding:
+    """
+    Cell line or drug IDs stored as int32 codes into a vocabulary of the distinct IDs.
+
+    Masks, splits and copies only move the codes and share the (read-only) vocabulary. The IDs are decoded lazily.
+    """
+
+    def __init__(self, codes: np.ndarray, vocabulary: np.ndarray, ids: Optional[np.ndarray] = None):
+        """
+        Initializes the encoding.
+
+        :param codes: int32 positions in the vocabulary, one per row
+        :param vocabulary: distinct IDs
+        :param ids: optional. The decoded IDs if they are already available
+        """
+        self.codes = codes
+        self.vocabulary = vocabulary
+        self._ids = ids
+        self._index: Optional[pd.Index] = None
+
+    @classmethod
+    def from_ids(cls, ids: ArrayLike) -> "_IdEncoding":
+        """
+        Encodes IDs.
+
+        :param ids: cell line IDs or drug IDs, one per row
+        :return: the encoding
+        """
+        codes, vocabulary = pd.factorize(ids, use_na_sentinel=False)
+        vocabulary = np.asarray(vocabulary)
+        vocabulary.flags.writeable = False
+        return cls(codes=codes.astype(np.int32), vocabulary=vocabulary, ids=ids)
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Returns the IDs, one per row."""
+        if self._ids is None:
+            self._ids = self.vocabulary[self.codes]
+        return self._ids
+
+    @property
+    def index(self) -> pd.Index:
+        """Returns the hashed index of the vocabulary."""
+        if self._index is None:
+            self._index = pd.Index(self.vocabulary)
+        return self._index
+
+    def take(self, indices: ArrayLike) -> "_IdEncoding":
+        """
+        Selects rows.
+
+        :param indices: row indices or boolean mask
+        :return: encoding of the selected rows with the same vocabulary
+        """
+        return self._with_codes(self.codes[indices])
+
+    def delete(self, indices: ArrayLike) -> "_IdEncoding":
+        """
+        Removes rows.
+
+        :param indices: row indices to remove
+        :return: encoding of the remaining rows with the same vocabulary
+        """
+        return self._with_codes(np.delete(self.codes, indices))
+
+    def copy(self) -> "_IdEncoding":
+        """Returns a copy of the codes with the same vocabulary."""
+        return self._with_codes(self.codes.copy())
+
+    def isin(self, values: Union[Any, ArrayLike]) -> np.ndarray:
+        """
+        Vectorized membership test. Every distinct ID is looked up once, then the rows are masked via their codes.
+
+        :param values: a single ID or several IDs
+        :return: boolean mask, True for the rows whose ID is in values
+        """
+        if np.ndim(values) == 0 and not isinstance(values, (set, frozenset)):
+            code = self.index.get_indexer([values])[0]
+            return self.codes == code if code >= 0 else np.zeros(len(self.codes), dtype=bool)
+        return self.index.isin(list(values))[self.codes]
+
+    def recode(self, other: "_IdEncoding") -> np.ndarray:
+        """
+        Translates the codes of another encoding into codes of this vocabulary.
+
+        :param other: other encoding
+        :return: int32 codes of the rows of other in this vocabulary, -1 for IDs unknown to this vocabulary
+        """
+        if other.vocabulary is self.vocabulary:
+            return other.codes
+        return self.index.get_indexer(other.vocabulary).astype(np.int32)[other.codes]
+
+    def concatenate(self, other: "_IdEncoding") -> "_IdEncoding":
+        """
+        Appends the rows of another encoding. IDs unknown to this vocabulary are appended to the vocabulary.
+
+        :param other: other encoding
+        :return: encoding of the rows of both encodings
+        """
+        if other.vocabulary is self.vocabulary:
+            return self._with_codes(np.concatenate([self.codes, other.codes]))
+        remap = self.index.get_indexer(other.vocabulary)
+        new_ids = remap < 0
+        remap[new_ids] = len(self.vocabulary) + np.arange(np.count_nonzero(new_ids))
+        vocabulary = np.concatenate([self.vocabulary, other.vocabulary[new_ids]])
+        vocabulary.flags.writeable = False
+        return _IdEncoding(
+            codes=np.concatenate([self.codes, remap[other.codes].astype(np.int32)]), vocabulary=vocabulary
+        )
+
+    def group_indices(self) -> dict[Any, np.ndarray]:
+        """
+        Groups the rows by ID with a single stable sort of the codes.
+
+        :return: dictionary ID -> row indices in ascending order, sorted by ID
+        """
+        order, bounds, group_codes = self.sort_groups()
+        groups = {}
+        for code in group_codes:
+            start, stop = bounds[code], bounds[code + 1]
+            groups[self.vocabulary[code]] = order[start:stop]
+        return groups
+
+    def sort_groups(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sorts the rows by code with a single stable sort.
+
+        :return: the row order, the bounds such that the rows of code c are order[bounds[c]:bounds[c + 1]] and the
+            codes that occur in the rows, sorted by ID
+        """
+        order = np.argsort(self.codes, kind="stable")
+        counts = np.bincount(self.codes, minlength=len(self.vocabulary))
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        group_codes = np.argsort(self.vocabulary, kind="stable")
+        return order, bounds, group_codes[counts[group_codes] > 0]
+
+    def _with_codes(self, codes: np.ndarray) -> "_IdEncoding":
+        encoding = _IdEncoding(codes=codes, vocabulary=self.vocabulary)
+        encoding._index = self._index
+        return encoding
+
+
 def _split_early_stopping_data(
     validation_dataset: DrugResponseDataset, test_mode: str
 ) -> tuple[DrugResponseDataset, DrugResponseDataset]:
@@ -470,44 +728,32 @@ def _split_early_stopping_data(
 
 def _leave_pair_out_cv(
     n_cv_splits: int,
-    response: ArrayLike,
-    cell_line_ids: ArrayLike,
-    drug_ids: ArrayLike,
+    dataset: DrugResponseDataset,
     split_validation=True,
     validation_ratio=0.1,
     random_state=42,
-    dataset_name: Optional[str] = None,
 ) -> list[dict]:
     """
     Leave pair out cross validation. Splits data into n_cv_splits number of cross validation splits.
 
     :param n_cv_splits: number of cross validation splits
-    :param response: response (e.g. ic50 values)
-    :param cell_line_ids: cell line IDs
-    :param drug_ids: drug IDs
+    :param dataset: the dataset to split. The splits share its ID vocabularies.
     :param split_validation: whether to split the training set into training and validation set
     :param validation_ratio: ratio of validation set (of the training set)
     :param random_state: random state
-    :param dataset_name: name of the dataset
     :return: list of dicts of the cross validation sets
     """
-    if not (len(response) == len(cell_line_ids) == len(drug_ids)):
-        raise AssertionError("response, cell_line_ids and drug_ids must have the same length")
-    indices = np.arange(len(response))
     np.random.seed(random_state)
-    shuffled_indices = np.random.permutation(indices)
-    response = response[shuffled_indices].copy()
-    cell_line_ids = cell_line_ids[shuffled_indices].copy()
-    drug_ids = drug_ids[shuffled_indices].copy()
+    dataset = dataset.subset(np.random.permutation(len(dataset)))
 
     # We use GroupKFold to ensure that each pair is only in one fold (prevent data leakage due to
     # experimental replicates).
     # If there are no replicates this is equivalent to KFold.
-    groups = [cell + "_" + drug for cell, drug in zip(cell_line_ids, drug_ids, strict=True)]
+    groups = dataset.get_pair_codes()
     kf = GroupKFold(n_splits=n_cv_splits)
     cv_sets = []
 
-    for train_indices, test_indices in kf.split(response, groups=groups):
+    for train_indices, test_indices in kf.split(dataset.response, groups=groups):
         if split_validation:
             # split training set into training and validation set
             train_indices, validation_indices = train_test_split(
@@ -517,27 +763,12 @@ def _leave_pair_out_cv(
                 random_state=random_state,
             )
         cv_fold = {
-            "train": DrugResponseDataset(
-                cell_line_ids=cell_line_ids[train_indices],
-                drug_ids=drug_ids[train_indices],
-                response=response[train_indices],
-                dataset_name=dataset_name,
-            ),
-            "test": DrugResponseDataset(
-                cell_line_ids=cell_line_ids[test_indices],
-                drug_ids=drug_ids[test_indices],
-                response=response[test_indices],
-                dataset_name=dataset_name,
-            ),
+            "train": dataset.subset(train_indices),
+            "test": dataset.subset(test_indices),
         }
 
         if split_validation:
-            cv_fold["validation"] = DrugResponseDataset(
-                cell_line_ids=cell_line_ids[validation_indices],
-                drug_ids=drug_ids[validation_indices],
-                response=response[validation_indices],
-                dataset_name=dataset_name,
-            )
+            cv_fold["validation"] = dataset.subset(validation_indices)
 
         cv_sets.append(cv_fold)
     return cv_sets
@@ -546,55 +777,37 @@ def _leave_pair_out_cv(
 def _leave_group_out_cv(
     group: str,
     n_cv_splits: int,
-    response: ArrayLike,
-    cell_line_ids: ArrayLike,
-    drug_ids: ArrayLike,
+    dataset: DrugResponseDataset,
     split_validation=True,
     validation_ratio=0.1,
     random_state=42,
-    dataset_name: Optional[str] = None,
 ):
     """
     Leave group out cross validation: Splits data into n_cv_splits number of cross validation splits.
 
     :param group: group to leave out (cell_line or drug)
     :param n_cv_splits: number of cross validation splits
+    :param dataset: the dataset to split. The splits share its ID vocabularies.
     :param random_state: random state
     :return: list of dicts of the cross validation sets
     """
     if group not in {"cell_line", "drug"}:
         raise AssertionError(f"group must be 'cell_line' or 'drug', but is {group}")
 
-    if group == "cell_line":
-        group_ids = cell_line_ids
-    else:
-        group_ids = drug_ids
-
     # shuffle, since GroupKFold does not implement this
-    indices = np.arange(len(response))
     np.random.seed(random_state)
-    shuffled_indices = np.random.permutation(indices)
-    response = response[shuffled_indices].copy()
-    cell_line_ids = cell_line_ids[shuffled_indices].copy()
-    drug_ids = drug_ids[shuffled_indices].copy()
-    group_ids = group_ids[shuffled_indices].copy()
+    dataset = dataset.subset(np.random.permutation(len(dataset)))
+    if group == "cell_line":
+        group_ids = dataset.cell_line_ids
+    else:
+        group_ids = dataset.drug_ids
     gkf = GroupKFold(n_splits=n_cv_splits)
     cv_sets = []
 
-    for train_indices, test_indices in gkf.split(response, groups=group_ids):
+    for train_indices, test_indices in gkf.split(dataset.response, groups=group_ids):
         cv_fold = {
-            "train": DrugResponseDataset(
-                cell_line_ids=cell_line_ids[train_indices],
-                drug_ids=drug_ids[train_indices],
-                response=response[train_indices],
-                dataset_name=dataset_name,
-            ),
-            "test": DrugResponseDataset(
-                cell_line_ids=cell_line_ids[test_indices],
-                drug_ids=drug_ids[test_indices],
-                response=response[test_indices],
-                dataset_name=dataset_name,
-            ),
+            "train": dataset.subset(train_indices),
+            "test": dataset.subset(test_indices),
         }
         if split_validation:
             # split training set into training and validation set.
@@ -607,27 +820,22 @@ def _leave_group_out_cv(
                 shuffle=True,
                 random_state=random_state,
             )
-            train_indices = np.where(np.isin(group_ids, train_groups))[0]
-            validation_indices = np.where(np.isin(group_ids, validation_groups))[0]
-            cv_fold["train"] = DrugResponseDataset(
-                cell_line_ids=cell_line_ids[train_indices],
-                drug_ids=drug_ids[train_indices],
-                response=response[train_indices],
-                dataset_name=dataset_name,
-            )
-            cv_fold["validation"] = DrugResponseDataset(
-                cell_line_ids=cell_line_ids[validation_indices],
-                drug_ids=drug_ids[validation_indices],
-                response=response[validation_indices],
-                dataset_name=dataset_name,
-            )
+            mask_function = dataset.get_cell_line_mask if group == "cell_line" else dataset.get_drug_mask
+            cv_fold["train"] = dataset.subset(mask_function(train_groups))
+            cv_fold["validation"] = dataset.subset(mask_function(validation_groups))
 
         cv_sets.append(cv_fold)
     return cv_sets
 
 
 class FeatureDataset(Dataset):
-    """Class for feature datasets."""
+    """
+    Class for feature datasets.
+
+    Vector views can be held in a dense backend: one contiguous 2-D matrix per view whose rows are aligned with
+    the identifiers. All other views (e.g., graphs, strings, nested dicts) are stored per identifier. The
+    dict-style access ``features[identifier][view]`` works for both storage types.
+    """
 
     def __init__(
         self,
@@ -643,7 +851,8 @@ class FeatureDataset(Dataset):
         :param meta_info: additional information for the views, e.g. gene names for gene expression
         """
         super().__init__()
-        self.features = features
+        self._dense_features: dict[str, np.ndarray] = {}
+        self._object_features = features
         self.view_names = self.get_view_names()
         if meta_info is not None:
             # assert that str of meta Dict[str, Any] is in view_names
@@ -652,7 +861,101 @@ class FeatureDataset(Dataset):
             self.meta_info = meta_info
         else:
             self.meta_info = None
-        self.identifiers = self.get_ids()
+        self._update_identifiers()
+
+    @classmethod
+    def from_matrices(
+        cls,
+        identifiers: ArrayLike,
+        matrices: dict[str, np.ndarray],
+        meta_info: Optional[dict[str, Any]] = None,
+        dtype: Optional[np.dtype] = None,
+    ) -> "FeatureDataset":
+        """
+        Creates a feature dataset with dense vector views.
+
+        :param identifiers: drug IDs/cell line IDs, one per matrix row
+        :param matrices: dictionary of feature matrices, key: view name, value: matrix of shape
+            (len(identifiers), n_features)
+        :param meta_info: additional information for the views, e.g. gene names for gene expression
+        :param dtype: float32 or float64. If None, float32 matrices are kept and everything else becomes float64
+        :return: the feature dataset
+        :raises AssertionError: if the identifiers are not unique or a matrix does not match the identifiers
+        """
+        identifiers = np.asarray(identifiers).tolist()
+        if len(set(identifiers)) != len(identifiers):
+            raise AssertionError("Identifiers of a FeatureDataset should be unique.")
+        dataset = cls(features={id_: {} for id_ in identifiers})
+        for view, matrix in matrices.items():
+            matrix = _as_dense_matrix(matrix, dtype=dtype)
+            if matrix.shape[0] != len(identifiers):
+                raise AssertionError(
+                    f"Feature matrix of view {view} has {matrix.shape[0]} rows but there are {len(identifiers)} "
+                    f"identifiers."
+                )
+            dataset._dense_features[view] = matrix
+        dataset.view_names = dataset.get_view_names()
+        if meta_info is not None:
+            if not all(meta_key in dataset.view_names for meta_key in meta_info.keys()):
+                raise AssertionError(f"Meta keys {meta_info.keys()} not in view names {dataset.view_names}")
+            dataset.meta_info = meta_info
+        return dataset
+
+    @property
+    def features(self) -> Union[dict[str, dict[str, Any]], "_FeatureView"]:
+        """
+        Returns the features as nested mapping: identifier -> view -> feature.
+
+        Without dense views this is the underlying dictionary. Otherwise, it is a view layer that reads from and writes
+        to the rows of the dense matrices.
+        """
+        if not self._dense_features:
+            return self._object_features
+        return _FeatureView(self)
+
+    @features.setter
+    def features(self, features: dict[str, dict[str, Any]]) -> None:
+        """
+        Replaces all features with the given dictionary.
+
+        :param features: dictionary of features, key: drug ID/cell line ID, value: Dict of feature views
+        """
+        self._dense_features = {}
+        self._object_features = features
+        self._update_identifiers()
+
+    @property
+    def dense_views(self) -> list[str]:
+        """Returns the names of the views that are stored as dense matrices."""
+        return list(self._dense_features)
+
+    def to_dense(self, views: Optional[list[str]] = None, dtype: Optional[np.dtype] = None) -> None:
+        """
+        Moves vector views into the dense backend.
+
+        :param views: views to convert. If None, all views whose features are numeric vectors of equal length
+            are converted.
+        :param dtype: float32 or float64. If None, float32 vectors are kept and everything else becomes float64
+        :raises AssertionError: if one of the requested views is not a numeric vector view
+        """
+        candidates = self.view_names if views is None else views
+        converted = []
+        for view in candidates:
+            if view in self._dense_features:
+                continue
+            vectors = [self._object_features[id_].get(view) for id_ in self._object_features]
+            if not _is_vector_view(vectors):
+                if views is not None:
+                    raise AssertionError(f"View {view!r} does not consist of numeric vectors of equal length.")
+                continue
+            self._dense_features[view] = _as_dense_matrix(np.stack(vectors, axis=0), dtype=dtype)
+            converted.append(view)
+        if converted:
+            self._object_features = {
+                id_: {view: value for view, value in views_.items() if view not in self._dense_features}
+                for id_, views_ in self._object_features.items()
+            }
+        self.view_names = self.get_view_names()
 
     def save(self, path: str):
         """
@@ -695,12 +998,7 @@ class FeatureDataset(Dataset):
             # E.g. each cell line gets the feature vector/graph/image...
             # of another cell line.
             # Drawn without replacement.
-            self.features = permute_features(
-                features=self.features,
-                views_to_permute=views_to_randomize,
-                identifiers=self.identifiers,
-                all_views=self.view_names,
-            )
+            self._permute_views(views_to_randomize)
 
         elif randomization_type == "invariant":
             # Invariant randomization:
@@ -709,39 +1007,87 @@ class FeatureDataset(Dataset):
             # For vectors this is the mean and standard deviation the feature view,
             # for networks the degree distribution.
             for view in views_to_randomize:
-                for identifier in self.identifiers:
-                    if isinstance(self.features[identifier][view], np.ndarray):
-                        new_features = np.random.normal(
-                            self.features[identifier][view].mean(),
-                            self.features[identifier][view].std(),
-                            self.features[identifier][view].shape,
-                        )
-                    elif isinstance(self.features[identifier][view], nx.classes.graph.Graph):
-                        new_features = randomize_graph(self.features[identifier][view])
-
-                    else:
-                        raise ValueError(
-                            f"No invariant randomization available for feature view "
-                            f"type {type(self.features[identifier][view])!r}."
-                        )
-                    self.features[identifier][view] = new_features
+                self._randomize_view_invariant(view)
+
+    def _permute_views(self, views: list[str]) -> None:
+        """
+        Permutes the features of the given views between the identifiers, with the same permutation for all views.
+
+        :param views: views to permute
+        """
+        permutation = np.random.permutation(len(self.identifiers))
+        for view in views:
+            if view in self._dense_features:
+                self._dense_features[view] = self._dense_features[view][permutation]
+        object_views = [view for view in self.view_names if view not in self._dense_features]
+        views_to_permute = [view for view in views if view in object_views]
+        if views_to_permute:
+            self._object_features = permute_features(
+                features=self._object_features,
+                views_to_permute=views_to_permute,
+                identifiers=self.identifiers,
+                all_views=object_views,
+                permutation=permutation,
+            )
+            self._update_identifiers()
+
+    def _randomize_view_invariant(self, view: str) -> None:
+        """
+        Replaces the features of a view with random features that keep their mean and standard deviation (vectors) or
+        their degree distribution (networks).
+
+        :param view: view to randomize
+        :raises ValueError: if the view has features without invariant randomization
+        """
+        if view in self._dense_features:
+            matrix = self._dense_features[view]
+            self._dense_features[view] = np.random.normal(
+                matrix.mean(axis=1, keepdims=True),
+                matrix.std(axis=1, keepdims=True),
+                matrix.shape,
+            ).astype(matrix.dtype)
+            return
+        for identifier in self.identifiers:
+            if isinstance(self.features[identifier][view], np.ndarray):
+                new_features = np.random.normal(
+                    self.features[identifier][view].mean(),
+                    self.features[identifier][view].std(),
+                    self.features[identifier][view].shape,
+                )
+            elif isinstance(self.features[identifier][view], nx.classes.graph.Graph):
+                new_features = randomize_graph(self.features[identifier][view])
+
+            else:
+                raise ValueError(
+                    f"No invariant randomization available for feature view "
+                    f"type {type(self.features[identifier][view])!r}."
+                )
+            self.features[identifier][view] = new_features
 
     def get_ids(self):
         """Returns drug ids of the dataset."""
-        return np.array(list(self.features.keys()))
+        return np.array(list(self._object_features.keys()))
 
     def get_view_names(self):
         """Returns feature view names."""
-        return list(self.features[list(self.features.keys())[0]].keys())
-
-    def get_feature_matrix(self, view: str, identifiers: ArrayLike, stack: bool = True) -> Union[np.ndarray, list]:
+        if len(self._object_features) == 0:
+            return list(self._dense_features.keys())
+        first_views = self._object_features[next(iter(self._object_features))]
+        return list(self._dense_features.keys()) + [view for view in first_views if view not in self._dense_features]
+
+    def get_feature_matrix(
+        self, view: str, identifiers: ArrayLike, stack: bool = True, validate: bool = True
+    ) -> Union[np.ndarray, list]:
         """
         Returns the feature matrix for the given view.
 
-        The feature view must be a vector or matrix.
+        The feature view must be a vector or matrix. The identifiers are looked up in the hashed index of the dataset
+        and the features are checked only once per unique identifier.
         :param view: view name
         :param identifiers: list of identifiers (cell lines oder drugs)
         :param stack: if True, stacks the feature vectors to a matrix. If False, returns a list of features.
+        :param validate: if False, skips the checks that the features are numpy arrays of equal length. Only use this
+            for views that have already been validated.
         :return: feature matrix
         """
         if len(identifiers) == 0:
@@ -749,24 +1095,51 @@ class FeatureDataset(Dataset):
 
         if view not in self.view_names:
             raise AssertionError(f"View {view!r} not in in the FeatureDataset.")
-        missing_identifiers = {id_ for id_ in identifiers if id_ not in self.identifiers}
-        if missing_identifiers:
+
+        rows = self._get_rows(identifiers)
+        if np.any(rows < 0):
+            missing_identifiers = set(np.asarray(identifiers)[rows < 0].tolist())
             raise AssertionError(
-                f"{len(missing_identifiers)} of {len(np.unique(identifiers))} ids are not in the "
+                f"{len(missing_identifiers)} of {len(set(np.asarray(identifiers).tolist()))} ids are not in the "
                 f"FeatureDataset. Missing ids: {missing_identifiers}"
             )
 
-        if not all(len(self.features[id_][view]) == len(self.features[identifiers[0]][view]) for id_ in identifiers):
-            raise AssertionError(f"Feature vectors of view {view} have different lengths.")
-
-        if not all(isinstance(self.features[id_][view], np.ndarray) for id_ in identifiers):
-            raise AssertionError(f"get_feature_matrix only works for vectors or matrices. {view} is not a numpy array.")
-        out = [self.features[id_][view] for id_ in identifiers]
-        return np.stack(out, axis=0) if stack else out
+        if view in self._dense_features:
+            matrix = self._dense_features[view][rows]
+            return matrix if stack else list(matrix)
+
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        all_features = list(self._object_features.values())
+        unique_features = [all_features[row][view] for row in unique_rows]
+        if validate:
+            if not all(len(feature) == len(unique_features[0]) for feature in unique_features):
+                raise AssertionError(f"Feature vectors of view {view} have different lengths.")
+
+            if not all(isinstance(feature, np.ndarray) for feature in unique_features):
+                raise AssertionError(
+                    f"get_feature_matrix only works for vectors or matrices. {view} is not a numpy array."
+                )
+        if stack:
+            return np.stack(unique_features, axis=0)[inverse]
+        return [unique_features[i] for i in inverse]
 
     def copy(self):
-        """Returns a copy of the feature dataset."""
-        return FeatureDataset(features=copy.deepcopy(self.features))
+        """
+        Returns a copy of the feature dataset whose dense views are copy-on-write.
+
+        Dense matrices are shared as read-only views by both datasets and are only copied by the first write to one
+        of their rows. _apply, transform_features, fit_transform_features and randomize_features replace the views they
+        change, so only the touched view is materialized in the dataset that changes it. The arrays themselves keep
+        their flags. All other views, e.g., graphs or nested dicts, can be changed in place and are deep-copied.
+        """
+        for view, matrix in self._dense_features.items():
+            if matrix.flags.writeable:
+                self._dense_features[view] = _read_only_view(matrix)
+        copied = FeatureDataset(features=copy.deepcopy(self._object_features))
+        copied._dense_features = dict(self._dense_features)
+        copied.view_names = copied.get_view_names()
+        copied.meta_info = copy.deepcopy(self.meta_info)
+        return copied
 
     def _add_features(self, other: "FeatureDataset") -> None:
         """
@@ -781,16 +1154,21 @@ class FeatureDataset(Dataset):
         if other.meta_info is not None:
             self.add_meta_info(other)
 
-        common_identifiers = set(self.identifiers).intersection(other.identifiers)
+        other_rows = other._get_rows(self.identifiers)
+        common = other_rows >= 0
+        self_rows = np.flatnonzero(common)
+        other_rows = other_rows[common]
+
+        new_dense = {view: matrix[self_rows] for view, matrix in self._dense_features.items()}
+        new_dense.update({view: matrix[other_rows] for view, matrix in other._dense_features.items()})
         new_features = {}
-        for id_ in common_identifiers:
-            new_features[id_] = {view: self.features[id_][view] for view in self.view_names}
-            for view in other.view_names:
-                new_features[id_][view] = other.features[id_][view]
+        for id_ in self.identifiers[common].tolist():
+            new_features[id_] = dict(self._object_features[id_])
+            new_features[id_].update(other._object_features[id_])
 
         self.features = new_features
+        self._dense_features = new_dense
         self.view_names = self.get_view_names()
-        self.identifiers = self.get_ids()
 
     def add_meta_info(self, other: "FeatureDataset") -> None:
         """
@@ -801,35 +1179,45 @@ class FeatureDataset(Dataset):
         other_meta = other.meta_info
         self.meta_info.update(other_meta)
 
-    def transform_features(self, ids: ArrayLike, transformer: TransformerMixin, view: str):
+    def transform_features(
+        self, ids: ArrayLike, transformer: TransformerMixin, view: str, inplace: bool = True
+    ) -> Optional["FeatureDataset"]:
         """
         Applies a transformation like standard scaling to features.
 
+        The features of all ids are transformed with a single call to the transformer.
         :param ids: The IDs to transform
         :param transformer: fitted sklearn transformer
         :param view: the view to transform
+        :param inplace: whether to transform this dataset. If False, this dataset is left unchanged and a transformed
+            copy is returned.
+        :return: None or the transformed copy if inplace is False
         """
         if view not in self.view_names:
             raise AssertionError(f"Transform view {view!r} not in in the FeatureDataset.")
-        if not all([clid in self.features for clid in ids]):
+        if np.any(self._get_rows(ids) < 0):
             raise AssertionError("Trying to transform, but a cell line is missing.")
 
         if len(np.unique(ids)) != len(ids):
             raise AssertionError("IDs should be unique.")
 
-        for identifier in ids:
-            feature_vector = self.features[identifier][view]
-            scaled_feature_vector = transformer.transform([feature_vector])[0]
-            self.features[identifier][view] = scaled_feature_vector
+        dataset = self if inplace else self.copy()
+        dataset._transform_view(view=view, function=transformer.transform, ids=ids)
+        return None if inplace else dataset
 
-    def fit_transform_features(self, train_ids: ArrayLike, transformer: TransformerMixin, view: str):
+    def fit_transform_features(
+        self, train_ids: ArrayLike, transformer: TransformerMixin, view: str, inplace: bool = True
+    ) -> Union[TransformerMixin, "FeatureDataset"]:
         """
         Fits and applies a transformation. Fitting is done only on the train_ids.
 
+        The transformer is fitted once on the stacked training features and applied once to the whole view.
         :param train_ids: The IDs corresponding to the training dataset.
         :param transformer: sklearn transformer
         :param view: the view to transform
-        :return: The modified FeatureDataset with transformed gene expression features.
+        :param inplace: whether to transform this dataset. If False, this dataset is left unchanged and a transformed
+            copy is returned. The transformer is fitted in both cases.
+        :return: the fitted transformer or the transformed copy if inplace is False
         """
         if view not in self.view_names:
             raise AssertionError(f"Transform view {view!r} not in in the FeatureDataset.")
@@ -837,25 +1225,211 @@ class FeatureDataset(Dataset):
         if len(np.unique(train_ids)) != len(train_ids):
             raise AssertionError("Train IDs should be unique.")
 
-        train_features = []
+        if view in self._dense_features:
+            train_features = self.get_feature_matrix(view=view, identifiers=train_ids)
+        else:
+            train_features = np.vstack([self.features[identifier][view] for identifier in train_ids])
+        transformer.fit(train_features)
 
-        # Collect all features of the view for fitting the scaler
-        for identifier in train_ids:
-            feature_vector = self.features[identifier][view]
-            train_features.append(feature_vector)
+        dataset = self if inplace else self.copy()
+        dataset._transform_view(view=view, function=transformer.transform)
+        return transformer if inplace else dataset
 
-        # Fit the scaler on the collected feature data
-        train_features = np.vstack(train_features)
-        transformer.fit(train_features)
+    def _apply(
+        self, function: Callable, view: str, inplace: bool = True, batched: bool = False
+    ) -> Optional["FeatureDataset"]:
+        """
+        Applies a function to the features of a view.
+
+        :param function: function applied to the feature of every identifier
+        :param view: the view
+        :param inplace: whether to change this dataset. If False, this dataset is left unchanged and the changed copy
+            is returned.
+        :param batched: whether the function works row-wise on a matrix, e.g., an element-wise numpy function like
+            np.log. The function is then called once with the stacked features of the view.
+        :return: None or the changed copy if inplace is False
+        """
+        dataset = self if inplace else self.copy()
+        if batched:
+            dataset._transform_view(view=view, function=function)
+        elif view in dataset._dense_features:
+            values = [function(row) for row in dataset._dense_features[view]]
+            if _is_vector_view(values):
+                dataset._dense_features[view] = _as_dense_matrix(np.stack(values, axis=0))
+            else:
+                dataset._demote_view(view)
+                for identifier, value in zip(dataset._object_features, values, strict=True):
+                    dataset._object_features[identifier][view] = value
+        else:
+            for identifier in dataset.features:
+                dataset.features[identifier][view] = function(dataset.features[identifier][view])
+        return None if inplace else dataset
+
+    def _transform_view(self, view: str, function: Callable, ids: Optional[ArrayLike] = None) -> None:
+        """
+        Applies a row-wise function to the stacked features of a view and scatters the result back.
+
+        Views that cannot be stacked (e.g., vectors of different length) are transformed per identifier.
+        :param view: the view
+        :param function: function mapping a (n_ids, n_features) matrix to a (n_ids, n_new_features) matrix
+        :param ids: the IDs to transform, all IDs if None
+        """
+        if view in self._dense_features:
+            matrix = self._dense_features[view]
+            if ids is None:
+                self._dense_features[view] = _as_dense_matrix(function(matrix))
+                return
+            rows = self._get_rows(ids)
+            transformed = np.asarray(function(matrix[rows]))
+            if transformed.shape == (len(rows), matrix.shape[1]):
+                matrix = matrix.copy()
+                matrix[rows] = transformed
+                self._dense_features[view] = matrix
+                return
+            # only a subset of the rows changes its dimension, so the view can no longer be dense
+            self._demote_view(view)
+
+        identifiers = list(self._object_features) if ids is None else list(ids)
+        values = [self._object_features[identifier][view] for identifier in identifiers]
+        if _is_vector_view(values):
+            transformed = np.asarray(function(np.stack(values, axis=0)))
+            if transformed.ndim != 2 or transformed.shape[0] != len(identifiers):
+                raise AssertionError(
+                    f"Transforming view {view!r} returned shape {transformed.shape}, expected one row per identifier."
+                )
+            for identifier, row in zip(identifiers, transformed, strict=True):
+                self._object_features[identifier][view] = row
+        else:
+            for identifier, value in zip(identifiers, values, strict=True):
+                self._object_features[identifier][view] = function([value])[0]
+
+    def _get_rows(self, identifiers: ArrayLike) -> np.ndarray:
+        """
+        Looks up the positions of the identifiers, -1 for unknown identifiers.
+
+        :param identifiers: drug IDs/cell line IDs
+        :return: integer array of positions in self.identifiers
+        """
+        return self._row_index.get_indexer(identifiers)
+
+    def _update_identifiers(self) -> None:
+        """Rebuilds the identifiers and the hashed identifier -> position index after the identifiers changed."""
+        self.identifiers = self.get_ids()
+        self._row_index = pd.Index(self.identifiers)
+
+    def _demote_view(self, view: str) -> None:
+        """
+        Moves a dense view back to the per-identifier storage.
+
+        :param view: the dense view
+        """
+        matrix = np.array(self._dense_features.pop(view))
+        for identifier, row in zip(self._object_features, matrix, strict=True):
+            self._object_features[identifier][view] = row
+
+
+class _FeatureView(Mapping):
+    """Read-only mapping identifier -> features of a FeatureDataset with dense views."""
+
+    def __init__(self, dataset: FeatureDataset):
+        self._dataset = dataset
+
+    def __getitem__(self, identifier: str) -> "_FeatureRow":
+        if identifier not in self._dataset._object_features:
+            raise KeyError(identifier)
+        return _FeatureRow(self._dataset, identifier)
+
+    def __contains__(self, identifier: object) -> bool:
+        return identifier in self._dataset._object_features
 
-        # Apply transformation and scaling to each feature vector
-        for identifier in self.features:
-            feature_vector = self.features[identifier][view]
-            scaled_gene_expression = transformer.transform([feature_vector])[0]
-            self.features[identifier][view] = scaled_gene_expression
-        return transformer
-
-    def _apply(self, function: Callable, view: str):
-        """Applies a function to the features of a view."""
-        for identifier in self.features:
-            self.features[identifier][view] = function(self.features[identifier][view])
+    def __iter__(self):
+        return iter(self._dataset._object_features)
+
+    def __len__(self) -> int:
+        return len(self._dataset._object_features)
+
+
+class _FeatureRow(MutableMapping):
+    """Mapping view -> feature for one identifier. Dense views are rows of the view matrix."""
+
+    def __init__(self, dataset: FeatureDataset, identifier: str):
+        self._dataset = dataset
+        self._identifier = identifier
+
+    def _row(self) -> int:
+        return self._dataset._row_index.get_loc(self._identifier)
+
+    def __getitem__(self, view: str) -> Any:
+        if view in self._dataset._dense_features:
+            return self._dataset._dense_features[view][self._row()]
+        return self._dataset._object_features[self._identifier][view]
+
+    def __setitem__(self, view: str, value: Any) -> None:
+        if view in self._dataset._dense_features:
+            matrix = self._dataset._dense_features[view]
+            if isinstance(value, np.ndarray) and value.shape == matrix.shape[1:]:
+                if not matrix.flags.writeable:
+                    # shared with a copy or memory-mapped from the feature cache
+                    matrix = np.array(matrix)
+                    self._dataset._dense_features[view] = matrix
+                matrix[self._row()] = value
+                return
+            # the new feature does not fit into the matrix anymore
+            self._dataset._demote_view(view)
+        self._dataset._object_features[self._identifier][view] = value
+
+    def __delitem__(self, view: str) -> None:
+        if view in self._dataset._dense_features:
+            raise KeyError(f"Cannot delete the dense view {view!r} for a single identifier.")
+        del self._dataset._object_features[self._identifier][view]
+
+    def __iter__(self):
+        yield from self._dataset._dense_features
+        for view in self._dataset._object_features[self._identifier]:
+            if view not in self._dataset._dense_features:
+                yield view
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+
+def _is_vector_view(values: list) -> bool:
+    """
+    Checks whether all features of a view are numeric vectors of the same length.
+
+    :param values: features of one view, one per identifier
+    :return: whether the view can be stored as a dense matrix
+    """
+    if len(values) == 0 or not all(isinstance(value, np.ndarray) and value.ndim == 1 for value in values):
+        return False
+    if any(value.shape != values[0].shape for value in values):
+        return False
+    return all(np.issubdtype(value.dtype, np.number) or np.issubdtype(value.dtype, np.bool_) for value in values)
+
+
+def _read_only_view(matrix: np.ndarray) -> np.ndarray:
+    """
+    Returns a read-only view of a matrix without changing the flags of the matrix itself.
+
+    :param matrix: the matrix
+    :return: read-only view sharing the memory of the matrix
+    """
+    view = matrix.view()
+    view.flags.writeable = False
+    return view
+
+
+def _as_dense_matrix(matrix: ArrayLike, dtype: Optional[np.dtype] = None) -> np.ndarray:
+    """
+    Converts a matrix to a contiguous 2-D float matrix.
+
+    :param matrix: the matrix
+    :param dtype: float32 or float64. If None, float32 matrices are kept and everything else becomes float64
+    :return: the dense matrix
+    """
+    matrix = np.asarray(matrix)
+    if dtype is None:
+        dtype = np.float32 if matrix.dtype == np.float32 else np.float64
+    if matrix.ndim != 2:
+        raise AssertionError(f"Dense feature views must be 2-D matrices, got shape {matrix.shape}.")
+    return np.ascontiguousarray(matrix, dtype=dtype)
@@ -0,0 +1,204 @@
+"""
+Persistent binary cache for feature tables that are parsed from CSV files.
+
+The cache lives in ``<path_data>/<dataset_name>/.cache``. Every entry stores the parsed values as ``.npy`` (feature
+matrices are memory-mapped when they are loaded) next to a json file with the row identifiers, the column names and a
+stamp of the source files (modification time, size and sha256 hash). An entry is rebuilt when one of its source files
+changed.
+"""
+
+import hashlib
+import json
+import os
+import warnings
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from .utils import atomic_write
+
+CACHE_DIR_NAME = ".cache"
+
+
+def get_cache_dir(data_path: str, dataset_name: str) -> str:
+    """
+    Returns the feature cache directory of a dataset.
+
+    :param data_path: path to the data directory, e.g., data/
+    :param dataset_name: name of the dataset, e.g., GDSC1
+    :return: path to the cache directory
+    """
+    return os.path.join(data_path, dataset_name, CACHE_DIR_NAME)
+
+
+def get_source_key(sources: list[str]) -> tuple:
+    """
+    Returns a hashable key that changes whenever one of the source files is modified.
+
+    :param sources: source files
+    :return: tuple of (absolute path, modification time, size) per source file
+    """
+    key = []
+    for source in sources:
+        stat = os.stat(source)
+        key.append((os.path.abspath(source), stat.st_mtime_ns, stat.st_size))
+    return tuple(key)
+
+
+def load_cached_table(
+    data_path: str,
+    dataset_name: str,
+    name: str,
+    sources: list[str],
+    build: Callable[[], pd.DataFrame],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Loads a numeric feature table from the cache or builds and caches it.
+
+    :param data_path: path to the data directory, e.g., data/
+    :param dataset_name: name of the dataset, e.g., GDSC1
+    :param name: name of the cache entry, e.g., gene_expression__landmark_genes
+    :param sources: files the table is built from. The entry is rebuilt if one of them changes.
+    :param build: function that parses the sources into a DataFrame with one row per identifier
+    :return: identifiers, column names and the read-only, memory-mapped float64 feature matrix
+    """
+    cache_dir = get_cache_dir(data_path, dataset_name)
+    meta = _load_valid_meta(cache_dir=cache_dir, name=name, sources=sources)
+    if meta is not None:
+        matrix = np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode="r")
+        return np.array(meta["ids"]), np.array(meta["columns"], dtype=object), matrix
+
+    table = build()
+    ids = table.index.to_numpy()
+    columns = table.columns.to_numpy(dtype=object)
+    matrix = table.to_numpy(dtype=np.float64)
+    meta = {"sources": _stamp_sources(sources), "ids": ids.tolist(), "columns": columns.tolist()}
+    if _write_entry(cache_dir=cache_dir, name=name, meta=meta, arrays={f"{name}.npy": matrix}):
+        matrix = np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode="r")
+    return ids, columns, matrix
+
+
+def load_cached_arrays(
+    data_path: str,
+    dataset_name: str,
+    name: str,
+    sources: list[str],
+    build: Callable[[], dict[str, np.ndarray]],
+) -> dict[str, np.ndarray]:
+    """
+    Loads a dictionary of arrays from the cache or builds and caches it.
+
+    This is meant for features that do not form one matrix, e.g., the graph of a single drug.
+    :param data_path: path to the data directory, e.g., data/
+    :param dataset_name: name of the dataset, e.g., GDSC1
+    :param name: name of the cache entry
+    :param sources: files the arrays are built from. The entry is rebuilt if one of them changes.
+    :param build: function that parses the sources into a dictionary of numeric arrays
+    :return: dictionary of arrays
+    """
+    cache_dir = get_cache_dir(data_path, dataset_name)
+    meta = _load_valid_meta(cache_dir=cache_dir, name=name, sources=sources)
+    if meta is not None:
+        with np.load(os.path.join(cache_dir, f"{name}.npz")) as arrays:
+            return {key: arrays[key] for key in meta["keys"]}
+
+    arrays = build()
+    meta = {"sources": _stamp_sources(sources), "keys": list(arrays)}
+    _write_entry(cache_dir=cache_dir, name=name, meta=meta, arrays={f"{name}.npz": arrays})
+    return arrays
+
+
+def _load_valid_meta(cache_dir: str, name: str, sources: list[str]):
+    """
+    Returns the meta information of a cache entry if the entry exists and its source files did not change.
+
+    A source whose modification time changed but whose content hash is unchanged (e.g., after copying the data
+    directory) still counts as unchanged.
+    :param cache_dir: cache directory
+    :param name: name of the cache entry
+    :param sources: source files of the entry
+    :return: the meta information or None if the entry has to be (re)built
+    """
+    meta_path = os.path.join(cache_dir, f"{name}.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    stamps = meta.get("sources", {})
+    if sorted(stamps) != sorted(os.path.abspath(source) for source in sources):
+        return None
+    for source, stamp in stamps.items():
+        if not os.path.exists(source):
+            return None
+        stat = os.stat(source)
+        if stat.st_size != stamp["size"]:
+            return None
+        if stat.st_mtime_ns != stamp["mtime_ns"] and _sha256(source) != stamp["sha256"]:
+            return None
+    return meta
+
+
+def _stamp_sources(sources: list[str]) -> dict[str, dict]:
+    """
+    Computes the modification time, size and content hash of the source files.
+
+    :param sources: source files
+    :return: dictionary absolute path -> stamp
+    """
+    stamps = {}
+    for source in sources:
+        stat = os.stat(source)
+        stamps[os.path.abspath(source)] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": _sha256(source),
+        }
+    return stamps
+
+
+def _sha256(path: str) -> str:
+    """
+    Computes the sha256 hash of a file.
+
+    :param path: path to the file
+    :return: hex digest
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _write_entry(cache_dir: str, name: str, meta: dict, arrays: dict) -> bool:
+    """
+    Writes a cache entry. Every file is written to a temporary file first and then renamed, the json file last, so
+    that concurrent readers never see a partially written entry.
+
+    :param cache_dir: cache directory
+    :param name: name of the cache entry
+    :param meta: meta information, saved as json
+    :param arrays: file name -> array for .npy files or file name -> dictionary of arrays for .npz files
+    :return: whether the entry was written. If the cache directory is not writable, a warning is raised.
+    """
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for file_name, values in arrays.items():
+            atomic_write(
+                path=os.path.join(cache_dir, file_name),
+                write=lambda f, values=values: (
+                    np.savez(f, **values) if isinstance(values, dict) else np.save(f, values)
+                ),
+            )
+        atomic_write(
+            path=os.path.join(cache_dir, f"{name}.json"),
+            write=lambda f: f.write(json.dumps(meta).encode("utf-8")),
+        )
+    except OSError as exc:
+        warnings.warn(f"Could not write feature cache entry {name} to {cache_dir}: {exc}", stacklevel=3)
+        return False
+    return True
@@ -0,0 +1,113 @@
+"""
+In-process registry of loaded feature datasets.
+
+During an experiment, the same features are loaded for every hyperparameter combination, every CV fold and every
+randomization and robustness run. The registry keeps the loaded FeatureDatasets in memory (least recently used first
+out, bounded by a memory budget) and hands out views that share the feature matrices with the registry until they
+are modified.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import numpy as np
+
+from .dataset import FeatureDataset
+
+
+class FeatureRegistry:
+    """LRU cache of FeatureDatasets with a memory budget and hit/miss counters."""
+
+    def __init__(self, max_bytes: int = 8 * 1024**3):
+        """
+        Initializes the registry.
+
+        :param max_bytes: memory budget. Least recently used datasets are evicted once the registered feature matrices
+            need more memory. Memory-mapped matrices count with their full size.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[FeatureDataset, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def n_bytes(self) -> int:
+        """Returns the memory used by the registered datasets."""
+        return sum(n_bytes for _, n_bytes in self._entries.values())
+
+    def get_or_load(self, key: Hashable, load: Callable[[], FeatureDataset]) -> FeatureDataset:
+        """
+        Returns a copy-on-write view of the registered dataset, loading and registering it first if needed.
+
+        :param key: key of the dataset, e.g., (loader, data_path, dataset_name, gene_list, view)
+        :param load: function that loads the dataset on a miss
+        :return: a copy-on-write copy of the dataset (see FeatureDataset.copy). Modifying it does not modify the
+            registered dataset.
+        """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key][0].copy()
+            self.misses += 1
+
+        dataset = load()
+        n_bytes = _dataset_n_bytes(dataset)
+        with self._lock:
+            if n_bytes <= self.max_bytes:
+                self._entries[key] = (dataset, n_bytes)
+                self._entries.move_to_end(key)
+                self._evict()
+            else:
+                return dataset
+        return dataset.copy()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the counters of the registry.
+
+        :return: dictionary with hits, misses, evictions, number of entries and registered bytes
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.n_bytes,
+            }
+
+    def clear(self) -> None:
+        """Removes all datasets and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def _evict(self) -> None:
+        """Evicts least recently used datasets until the registry fits into the memory budget."""
+        total = self.n_bytes
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, (_, n_bytes) = self._entries.popitem(last=False)
+            total -= n_bytes
+            self.evictions += 1
+
+
+FEATURE_REGISTRY = FeatureRegistry()
+
+
+def _dataset_n_bytes(dataset: FeatureDataset) -> int:
+    """
+    Estimates the memory of the numeric features of a dataset.
+
+    :param dataset: the dataset
+    :return: number of bytes of the dense matrices and of the numpy feature arrays
+    """
+    n_bytes = sum(matrix.nbytes for matrix in dataset._dense_features.values())
+    for views in dataset._object_features.values():
+        n_bytes += sum(value.nbytes for value in views.values() if isinstance(value, np.ndarray))
+    return n_bytes
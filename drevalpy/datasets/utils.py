@@ -1,7 +1,9 @@
 """Utility functions for datasets."""
 
 import os
+import uuid
 import zipfile
+from typing import Callable, Optional
 
 import networkx as nx
 import numpy as np
@@ -104,6 +106,7 @@ def permute_features(
     identifiers: ArrayLike,
     views_to_permute: list,
     all_views: list,
+    permutation: Optional[np.ndarray] = None,
 ) -> dict:
     """
     Permute the specified views for each entity (= cell line or drug).
@@ -114,12 +117,54 @@ def permute_features(
     :param identifiers: array of identifiers
     :param views_to_permute: list of views to permute
     :param all_views: list of all views
+    :param permutation: optional array of positions; identifiers[permutation[i]] donates its views to identifiers[i].
+        If None, a random permutation is drawn.
     :return: permuted features
     """
+    identifiers = np.asarray(identifiers)
+    if permutation is None:
+        permutation = np.random.permutation(len(identifiers))
     return {
         entity: {
             view: (features[entity][view] if view not in views_to_permute else features[other_entity][view])
             for view in all_views
         }
-        for entity, other_entity in zip(identifiers, np.random.permutation(identifiers), strict=True)
+        for entity, other_entity in zip(identifiers, identifiers[permutation], strict=True)
     }
+
+
+def encode_pairs(cell_line_codes: ArrayLike, drug_codes: ArrayLike) -> np.ndarray:
+    """
+    Combines cell line and drug codes into one 64-bit key per (cell line, drug) pair.
+
+    The cell line code occupies the upper and the drug code the lower 32 bits, so the key is unique for every pair of
+    non-negative int32 codes. Unlike joined strings, it cannot collide for IDs that contain the separator.
+
+    :param cell_line_codes: integer codes of the cell lines
+    :param drug_codes: integer codes of the drugs
+    :return: int64 pair keys
+    """
+    cell_line_codes = np.asarray(cell_line_codes, dtype=np.int64)
+    drug_codes = np.asarray(drug_codes, dtype=np.int64)
+    if np.any(cell_line_codes < 0) or np.any(drug_codes < 0):
+        raise AssertionError("Pair keys can only be computed for non-negative codes.")
+    return (cell_line_codes << 32) | drug_codes
+
+
+def atomic_write(path: str, write: Callable) -> None:
+    """
+    Writes a file via a temporary file in the same directory and an atomic rename.
+
+    Readers and restarted runs never see a partially written file: the file either does not exist or is complete.
+    :param path: final path of the file
+    :param write: function that writes the content to a binary file object
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
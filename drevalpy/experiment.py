@@ -4,19 +4,31 @@ import json
 import os
 import shutil
 import warnings
-from typing import Optional
+from typing import Any, Iterable, Iterator, Optional, Union
 
 import numpy as np
 import pandas as pd
 import ray
 import torch
+from joblib import Parallel, delayed
 from ray import tune
 from sklearn.base import TransformerMixin
 
 from .datasets.dataset import DrugResponseDataset, FeatureDataset
+from .datasets.feature_registry import FEATURE_REGISTRY
+from .datasets.utils import atomic_write
 from .evaluation import evaluate, get_mode
+from .hyperparameter_search import HyperparameterRange, TreeParzenEstimator
+from .manifest import MANIFEST_FILE_NAME, JobManifest, track_jobs
 from .models import MODEL_FACTORY, MULTI_DRUG_MODEL_FACTORY, SINGLE_DRUG_MODEL_FACTORY
 from .models.drp_model import DRPModel, SingleDrugModel
+from .scheduler import Job, run_jobs
+
+TUNING_STRATEGIES = ["grid", "successive_halving", "tpe"]
+# hyperparameters that set the training budget of a model, see apply_budget
+BUDGET_HYPERPARAMETERS = ["epochs", "EPOCHS", "n_estimators"]
+# minimum number of training rows when the budget is a subsample of the training dataset
+MIN_BUDGET_ROWS = 100
 
 
 def drug_response_experiment(
@@ -36,10 +48,27 @@ def drug_response_experiment(
     path_out: str = "results/",
     overwrite: bool = False,
     path_data: str = "data",
+    n_workers: int = 1,
+    threads_per_job: Optional[int] = None,
+    n_tuning_jobs: int = 1,
+    tuning_strategy: str = "grid",
+    n_tuning_trials: int = 20,
+    warm_start_tuning: bool = False,
+    batch_single_drug_models: bool = False,
 ) -> None:
     """
     Run the drug response prediction experiment. Save results to disc.
 
+    The experiment is split into jobs per model, drug (for single drug models), CV split and stage: "main"
+    (hyperparameter tuning, final training and test predictions), "cross_study_<dataset>" (predictions of a cross-study
+    dataset with the final model) and "posthoc" (randomization and robustness tests). The cross-study and posthoc jobs
+    of a split start once its main job has saved the best hyperparameters and the final model.
+
+    Without overwrite, the experiment is incremental: jobs whose results exist, according to the job manifest or on
+    disk, are skipped. Adding a model or a cross-study dataset to a finished experiment only runs the jobs of the new
+    model or the cross-study jobs of the new dataset, which predict with the saved final models instead of retraining
+    them if the models support saving.
+
     :param models: list of model classes to compare
     :param baselines: list of baseline models. No randomization or robustness tests are run for the
         baseline models.
@@ -81,15 +110,166 @@ def drug_response_experiment(
         leave-drug-out)
     :param overwrite: whether to overwrite existing results
     :param path_data: path to the data directory, usually data/
+    :param n_workers: number of jobs to run in parallel in separate processes. Default is 1, which runs the jobs one
+        after another in this process.
+    :param threads_per_job: maximum number of threads per job for BLAS, OpenMP and torch. Default is None (no limit).
+    :param n_tuning_jobs: number of hyperparameter combinations to evaluate in parallel processes during tuning,
+        without Ray. Default is 1.
+    :param tuning_strategy: hyperparameter tuning strategy without Ray, "grid" (default) trains every combination of
+        the hyperparameter grid, "successive_halving" drops bad combinations early after training on a small budget,
+        "tpe" trains n_tuning_trials combinations proposed by a tree-structured Parzen estimator. Only "tpe" searches
+        continuous ranges in the hyperparameters.yaml files; the other strategies use evenly spaced grid points.
+    :param n_tuning_trials: number of hyperparameter combinations to train with the "tpe" strategy
+    :param warm_start_tuning: whether to seed the hyperparameter search of a CV split with the tuning scores of the
+        previous splits: the best combinations of the previous splits are evaluated first and combinations that were
+        worse than all of them in every previous split are skipped. The splits of a model are then tuned one after
+        another.
+    :param batch_single_drug_models: whether to run the main stages of all drugs of a single drug model and CV split
+        in one job that loads the features once and partitions the split by drug once, see
+        run_single_drug_main_stages. The results are saved per drug as without batching.
     :return: None
     """
+    check_tuning_arguments(
+        multiprocessing=multiprocessing,
+        n_workers=n_workers,
+        n_tuning_jobs=n_tuning_jobs,
+        tuning_strategy=tuning_strategy,
+        warm_start_tuning=warm_start_tuning,
+        threads_per_job=threads_per_job,
+        n_tuning_trials=n_tuning_trials,
+    )
     if baselines is None:
         baselines = []
     cross_study_datasets = cross_study_datasets or []
     result_path = os.path.join(path_out, run_id, test_mode)
+    prepare_cv_splits(
+        response_data=response_data,
+        result_path=result_path,
+        test_mode=test_mode,
+        n_cv_splits=n_cv_splits,
+        overwrite=overwrite,
+    )
+
+    main_stage_inputs = {
+        "test_mode": test_mode,
+        "metric": metric,
+        "multiprocessing": multiprocessing,
+        "n_tuning_jobs": n_tuning_jobs,
+        "tuning_strategy": tuning_strategy,
+        "n_tuning_trials": n_tuning_trials,
+        "warm_start_tuning": warm_start_tuning,
+        "ray_path": os.path.abspath(os.path.join(result_path, "raytune")),
+    }
+    jobs = []
+    if batch_single_drug_models:
+        jobs += make_single_drug_main_jobs(
+            models=models + baselines,
+            response_data=response_data,
+            result_path=result_path,
+            path_data=path_data,
+            response_transformation=response_transformation,
+            main_stage_inputs=main_stage_inputs,
+        )
+    drug_ids = [str(drug_id) for drug_id in np.unique(response_data.drug_ids)]
+    drug_datasets_cache: dict[int, dict] = {}
+    run_posthoc = randomization_mode is not None or n_trials_robustness > 0
+    for model_class in models + baselines:
+        model_name = model_class.model_name
+        has_other_stages = bool(cross_study_datasets) or (run_posthoc and model_class not in baselines)
+        if batch_single_drug_models and issubclass(model_class, SingleDrugModel) and not has_other_stages:
+            # the batched main jobs are the only jobs of the model
+            continue
+        for split_index, drug_id, datasets in _iter_stage_datasets(
+            response_data.cv_splits, model_class, drug_ids, drug_datasets_cache
+        ):
+            train_dataset, validation_dataset, early_stopping_dataset, test_dataset = datasets
+            stage_inputs = {
+                "model_name": model_name,
+                "drug_id": drug_id,
+                "split_index": split_index,
+                "train_dataset": train_dataset,
+                "validation_dataset": validation_dataset,
+                "early_stopping_dataset": early_stopping_dataset,
+                "test_dataset": test_dataset,
+                "result_path": result_path,
+                "path_data": path_data,
+                "response_transformation": response_transformation,
+            }
+            main_key = (model_name, drug_id, split_index, "main")
+            if batch_single_drug_models and drug_id is not None:
+                # the main stage of the drug is part of the batched job of the split
+                main_key = (model_name, None, split_index, "main")
+            else:
+                jobs.append(
+                    Job(
+                        key=main_key,
+                        function=run_main_stage,
+                        kwargs={**stage_inputs, **main_stage_inputs},
+                        # with warm starts, a split is tuned after the previous split of the same model
+                        depends_on=(
+                            ((model_name, drug_id, split_index - 1, "main"),)
+                            if warm_start_tuning and split_index > 0
+                            else ()
+                        ),
+                    )
+                )
+            for cross_study_dataset in cross_study_datasets:
+                jobs.append(
+                    Job(
+                        key=(model_name, drug_id, split_index, f"cross_study_{cross_study_dataset.dataset_name}"),
+                        function=run_cross_study_stage,
+                        kwargs={**stage_inputs, "test_mode": test_mode, "cross_study_dataset": cross_study_dataset},
+                        depends_on=(main_key,),
+                    )
+                )
+            # no randomization or robustness tests for the baselines
+            if model_class in baselines:
+                continue
+            if run_posthoc:
+                jobs.append(
+                    Job(
+                        key=(model_name, drug_id, split_index, "posthoc"),
+                        function=run_posthoc_stage,
+                        kwargs={
+                            **stage_inputs,
+                            "randomization_mode": randomization_mode,
+                            "randomization_type": randomization_type,
+                            "n_trials_robustness": n_trials_robustness,
+                        },
+                        depends_on=(main_key,),
+                    )
+                )
+    jobs = resume_jobs(jobs, result_path=result_path)
+    print(f"Running {len(jobs)} jobs with {n_workers} worker(s)")
+    run_jobs(jobs, n_workers=n_workers, threads_per_job=threads_per_job)
+
+    consolidate_single_drug_model_predictions(
+        models=models,
+        n_cv_splits=n_cv_splits,
+        results_path=result_path,
+        cross_study_datasets=cross_study_datasets,
+        randomization_mode=randomization_mode,
+        n_trials_robustness=n_trials_robustness,
+        out_path=result_path,
+    )
+    print(f"Feature registry: {FEATURE_REGISTRY.stats()}")
+    print("Done!")
+
+
+def prepare_cv_splits(
+    response_data: DrugResponseDataset, result_path: str, test_mode: str, n_cv_splits: int, overwrite: bool
+) -> None:
+    """
+    Loads the CV splits of an existing experiment or creates and saves them.
+
+    :param response_data: drug response dataset, its cv_splits are set
+    :param result_path: path to the results of the test mode, the splits are saved in result_path/splits
+    :param test_mode: test mode one of "LPO", "LCO", "LDO"
+    :param n_cv_splits: number of cross-validation splits
+    :param overwrite: whether to delete existing results and create new splits
+    """
     split_path = os.path.join(result_path, "splits")
     result_folder_exists = os.path.exists(result_path)
-    randomization_test_views = []
     if result_folder_exists and overwrite:
         # if results exists, delete them if overwrite is True
         print(f"Overwriting existing results at {result_path}")
@@ -117,165 +297,768 @@ def drug_response_experiment(
         )
         response_data.save_splits(path=split_path)
 
-    model_list = make_model_list(models + baselines, response_data)
-    for model_name in model_list.keys():
-        print(f"Running {model_name}")
-        model_name, drug_id = get_model_name_and_drug_id(model_name)
 
-        model_class = MODEL_FACTORY[model_name]
-        if model_class in baselines:
-            print("- Only Baseline Tests -")
-            is_baseline = True
-        else:
-            print("- Full Test -")
-            is_baseline = False
+def make_single_drug_main_jobs(
+    models: list[type[DRPModel]],
+    response_data: DrugResponseDataset,
+    result_path: str,
+    path_data: str,
+    response_transformation: Optional[TransformerMixin],
+    main_stage_inputs: dict[str, Any],
+) -> list[Job]:
+    """
+    Creates one main job per single drug model and CV split that trains the models of all drugs of the split, see
+    run_single_drug_main_stages.
 
-        predictions_path = generate_data_saving_path(
-            model_name=model_name,
-            drug_id=drug_id,
-            result_path=result_path,
-            suffix="predictions",
+    The jobs have the key (model_name, None, split_index, "main"). Global models get no jobs.
+    :param models: model classes of the experiment
+    :param response_data: drug response dataset with the CV splits
+    :param result_path: path to the results of the test mode
+    :param path_data: path to the data directory, usually data/
+    :param response_transformation: normalizer to use for the response data
+    :param main_stage_inputs: further keyword arguments of run_main_stage, e.g., test_mode and metric
+    :return: the jobs
+    """
+    drug_ids = [str(drug_id) for drug_id in np.unique(response_data.drug_ids)]
+    jobs = []
+    for model_class in models:
+        if not issubclass(model_class, SingleDrugModel):
+            continue
+        for split_index, split in enumerate(response_data.cv_splits):
+            train_dataset, validation_dataset, early_stopping_dataset, test_dataset = get_fold_datasets(
+                split, model_class
+            )
+            jobs.append(
+                Job(
+                    key=(model_class.model_name, None, split_index, "main"),
+                    function=run_single_drug_main_stages,
+                    kwargs={
+                        "model_name": model_class.model_name,
+                        "drug_ids": drug_ids,
+                        "split_index": split_index,
+                        "train_dataset": train_dataset,
+                        "validation_dataset": validation_dataset,
+                        "early_stopping_dataset": early_stopping_dataset,
+                        "test_dataset": test_dataset,
+                        "result_path": result_path,
+                        "path_data": path_data,
+                        "response_transformation": response_transformation,
+                        **main_stage_inputs,
+                    },
+                    # with warm starts, a split is tuned after the previous split of the same model
+                    depends_on=(
+                        ((model_class.model_name, None, split_index - 1, "main"),)
+                        if main_stage_inputs["warm_start_tuning"] and split_index > 0
+                        else ()
+                    ),
+                )
+            )
+    return jobs
+
+
+def _iter_stage_datasets(
+    cv_splits: list[dict[str, DrugResponseDataset]],
+    model_class: type[DRPModel],
+    drug_ids: list[str],
+    drug_datasets_cache: Optional[dict[int, dict]] = None,
+) -> Iterator[tuple[int, Optional[str], tuple]]:
+    """
+    Yields the datasets of the stages of a model, per CV split and, for single drug models, per drug.
+
+    The datasets of a split are partitioned by drug once for all drugs, see _partition_by_drug.
+    :param cv_splits: cross validation splits
+    :param model_class: model class
+    :param drug_ids: drugs of the single drug models
+    :param drug_datasets_cache: optional cache of _partition_by_drug, so that the datasets of a split are grouped by
+        drug only once for all single drug models
+    :return: iterator over (split index, drug id or None for global models, (train, validation, early stopping,
+        test dataset))
+    """
+    for split_index, split in enumerate(cv_splits):
+        datasets = get_fold_datasets(split, model_class)
+        if not issubclass(model_class, SingleDrugModel):
+            yield split_index, None, datasets
+            continue
+        drug_datasets = [_partition_by_drug(dataset, drug_ids, drug_datasets_cache) for dataset in datasets]
+        for drug_id in drug_ids:
+            yield split_index, drug_id, tuple(datasets_of_drug[drug_id] for datasets_of_drug in drug_datasets)
+
+
+def resume_jobs(jobs: list[Job], result_path: str) -> list[Job]:
+    """
+    Drops the jobs that finished in a previous run of the experiment according to the job manifest of the result path.
+
+    The remaining jobs record their status, the hash of their inputs and the files they wrote in the manifest. Jobs
+    whose inputs changed since the previous run are run again.
+    :param jobs: the jobs of the experiment
+    :param result_path: path to the results of the test mode, where the manifest is stored
+    :return: the jobs that still have to be run
+    """
+    manifest = JobManifest(os.path.join(result_path, MANIFEST_FILE_NAME))
+    tracked_jobs, n_done = track_jobs(
+        jobs,
+        manifest=manifest,
+        # paths and parallelization settings do not change the results
+        untracked_inputs=frozenset({"result_path", "path_data", "ray_path", "n_tuning_jobs"}),
+    )
+    if n_done > 0:
+        print(f"Skipping {n_done} jobs that finished in a previous run, see {manifest.path}")
+    return tracked_jobs
+
+
+def check_tuning_arguments(
+    multiprocessing: bool,
+    n_workers: int,
+    n_tuning_jobs: int,
+    tuning_strategy: str,
+    warm_start_tuning: bool,
+    threads_per_job: Optional[int] = None,
+    n_tuning_trials: int = 20,
+) -> None:
+    """
+    Checks that the parallelization and tuning arguments of an experiment are valid and fit together.
+
+    :param multiprocessing: whether to tune the hyperparameters with raytune
+    :param n_workers: number of jobs to run in parallel
+    :param n_tuning_jobs: number of hyperparameter combinations to evaluate in parallel
+    :param tuning_strategy: hyperparameter tuning strategy
+    :param warm_start_tuning: whether to seed the tuning of a split with the scores of the previous splits
+    :param threads_per_job: maximum number of threads per job, None means no limit
+    :param n_tuning_trials: number of combinations to train with the "tpe" tuning strategy
+    :raises AssertionError: if a number is smaller than 1, the tuning strategy is unknown or raytune is combined with
+        other parallelization or tuning strategies
+    """
+    if n_workers < 1:
+        raise AssertionError("Number of workers must be at least 1")
+    if threads_per_job is not None and threads_per_job < 1:
+        raise AssertionError("Number of threads per job must be at least 1")
+    if n_tuning_trials < 1:
+        raise AssertionError("Number of tuning trials must be at least 1")
+    if n_tuning_jobs < 1:
+        raise AssertionError("Number of tuning jobs must be at least 1")
+    if tuning_strategy not in TUNING_STRATEGIES:
+        raise AssertionError(
+            f"Invalid tuning strategy: {tuning_strategy}. Available strategies are {TUNING_STRATEGIES}"
+        )
+    if multiprocessing and n_workers > 1:
+        raise AssertionError("Ray-based multiprocessing cannot be combined with n_workers > 1. Choose one of them.")
+    if multiprocessing and n_tuning_jobs > 1:
+        raise AssertionError("Ray-based multiprocessing cannot be combined with n_tuning_jobs > 1. Choose one of them.")
+    if multiprocessing and tuning_strategy != "grid":
+        raise AssertionError("Ray-based multiprocessing only supports the grid tuning strategy.")
+    if multiprocessing and warm_start_tuning:
+        raise AssertionError("Ray-based multiprocessing does not support warm starts.")
+
+
+def run_main_stage(
+    model_name: str,
+    drug_id: Optional[str],
+    split_index: int,
+    train_dataset: DrugResponseDataset,
+    validation_dataset: DrugResponseDataset,
+    early_stopping_dataset: Optional[DrugResponseDataset],
+    test_dataset: DrugResponseDataset,
+    result_path: str,
+    path_data: str,
+    response_transformation: Optional[TransformerMixin],
+    test_mode: str,
+    metric: str,
+    multiprocessing: bool,
+    ray_path: str = "raytune",
+    n_tuning_jobs: int = 1,
+    tuning_strategy: str = "grid",
+    n_tuning_trials: int = 20,
+    warm_start_tuning: bool = False,
+    cl_features: Optional[FeatureDataset] = None,
+    drug_features: Optional[FeatureDataset] = None,
+) -> list[str]:
+    """
+    Tunes the hyperparameters of a model on one CV split, trains it on the train and validation set and predicts the
+    test set. Save results and, if the model supports it, the final model to disc. Skipped if the predictions already
+    exist.
+
+    :param model_name: name of the model in the MODEL_FACTORY
+    :param drug_id: drug id for single drug models, None for global models
+    :param split_index: index of the CV split
+    :param train_dataset: training dataset of the split
+    :param validation_dataset: validation dataset of the split
+    :param early_stopping_dataset: early stopping dataset of the split or None
+    :param test_dataset: test dataset of the split
+    :param result_path: path to the results of the test mode
+    :param path_data: path to the data directory, usually data/
+    :param response_transformation: normalizer to use for the response data
+    :param test_mode: test mode one of "LPO", "LCO", "LDO"
+    :param metric: metric to use for hyperparameter optimization
+    :param multiprocessing: whether to tune the hyperparameters with raytune
+    :param ray_path: storage path of raytune
+    :param n_tuning_jobs: number of hyperparameter combinations to evaluate in parallel if raytune is not used
+    :param tuning_strategy: tuning strategy if raytune is not used, see hpam_tune
+    :param n_tuning_trials: number of combinations to train with the "tpe" tuning strategy
+    :param warm_start_tuning: whether to seed the tuning with the scores of the previous splits, see hpam_tune
+    :param cl_features: optional. Loaded cell line features, loaded from path_data if None
+    :param drug_features: optional. Loaded drug features, loaded from path_data if None
+    :return: paths of the files written
+    """
+    model_class = MODEL_FACTORY[model_name]
+    predictions_path = generate_data_saving_path(
+        model_name=model_name, drug_id=drug_id, result_path=result_path, suffix="predictions"
+    )
+    hpam_path = generate_data_saving_path(
+        model_name=model_name, drug_id=drug_id, result_path=result_path, suffix="best_hpams"
+    )
+    prediction_file = os.path.join(predictions_path, f"predictions_split_{split_index}.csv")
+    if os.path.isfile(prediction_file):
+        print(f"Split {split_index} of {_get_run_name(model_name, drug_id)} already exists. Skipping.")
+        return [prediction_file]
+    print(f"################# {_get_run_name(model_name, drug_id)}: FOLD {split_index+1} #################")
+
+    train_dataset, validation_dataset, early_stopping_dataset, test_dataset = _copy_datasets(
+        train_dataset, validation_dataset, early_stopping_dataset, test_dataset
+    )
+    model = model_class()
+    outputs = []
+    tuning_inputs = {
+        "model": model,
+        "train_dataset": train_dataset,
+        "validation_dataset": validation_dataset,
+        "early_stopping_dataset": early_stopping_dataset,
+        "hpam_set": model_class.get_hyperparameter_set(),
+        "response_transformation": response_transformation,
+        "metric": metric,
+        "path_data": path_data,
+    }
+    if multiprocessing:
+        tuning_inputs["ray_path"] = ray_path
+        best_hpams = hpam_tune_raytune(**tuning_inputs)
+    else:
+        best_hpams, hpam_scores = hpam_tune(
+            **tuning_inputs,
+            n_jobs=n_tuning_jobs,
+            strategy=tuning_strategy,
+            hpam_space=model_class.get_hyperparameter_space(),
+            n_trials=n_tuning_trials,
+            warm_start_scores=(
+                load_hpam_scores(hpam_path=hpam_path, split_indices=range(split_index)) if warm_start_tuning else None
+            ),
+            return_scores=True,
+            cl_features=cl_features,
+            drug_features=drug_features,
         )
-        hpam_path = generate_data_saving_path(
+        outputs.append(os.path.join(hpam_path, f"hpam_scores_split_{split_index}.json"))
+        _save_json(hpam_scores, outputs[-1])
+
+    print(f"Best hyperparameters: {best_hpams}")
+    print("Training model on full train and validation set to predict test set")
+    # save best hyperparameters as json
+    outputs.append(os.path.join(hpam_path, f"best_hpams_split_{split_index}.json"))
+    _save_json(best_hpams, outputs[-1])
+
+    train_dataset.add_rows(validation_dataset)  # use full train val set data for final training
+    train_dataset.shuffle(random_state=42)
+
+    test_dataset = train_and_predict(
+        model=model,
+        hpams=best_hpams,
+        path_data=path_data,
+        train_dataset=train_dataset,
+        prediction_dataset=test_dataset,
+        early_stopping_dataset=(early_stopping_dataset if model.early_stopping else None),
+        response_transformation=response_transformation,
+        cl_features=cl_features,
+        drug_features=drug_features,
+    )
+
+    outputs += save_final_model(
+        model=model,
+        path=get_final_model_path(
+            model_name=model_name, drug_id=drug_id, result_path=result_path, split_index=split_index
+        ),
+    )
+    test_dataset.save(prediction_file)
+    return outputs + [prediction_file]
+
+
+def run_single_drug_main_stages(
+    model_name: str,
+    drug_ids: list[str],
+    split_index: int,
+    train_dataset: DrugResponseDataset,
+    validation_dataset: DrugResponseDataset,
+    early_stopping_dataset: Optional[DrugResponseDataset],
+    test_dataset: DrugResponseDataset,
+    result_path: str,
+    path_data: str,
+    response_transformation: Optional[TransformerMixin],
+    **main_stage_inputs,
+) -> list[str]:
+    """
+    Runs the main stage of a single drug model for all drugs of one CV split in one job.
+
+    The features are loaded once for all drugs and every dataset of the split is partitioned by drug with one
+    group-by instead of one mask per drug. The results are saved per drug like the results of run_main_stage, drugs
+    whose predictions already exist are skipped.
+    :param model_name: name of the model in the SINGLE_DRUG_MODEL_FACTORY
+    :param drug_ids: drugs to train a model for
+    :param split_index: index of the CV split
+    :param train_dataset: training dataset of the split with all drugs
+    :param validation_dataset: validation dataset of the split with all drugs
+    :param early_stopping_dataset: early stopping dataset of the split with all drugs or None
+    :param test_dataset: test dataset of the split with all drugs
+    :param result_path: path to the results of the test mode
+    :param path_data: path to the data directory, usually data/
+    :param response_transformation: normalizer to use for the response data
+    :param main_stage_inputs: further keyword arguments of run_main_stage, e.g., test_mode and metric
+    :return: paths of the files written
+    """
+    # loading the features does not depend on the hyperparameters
+    cl_features, drug_features = load_features(MODEL_FACTORY[model_name](), path_data, train_dataset)
+    train_datasets, validation_datasets, early_stopping_datasets, test_datasets = (
+        _partition_by_drug(dataset, drug_ids)
+        for dataset in (train_dataset, validation_dataset, early_stopping_dataset, test_dataset)
+    )
+    outputs = []
+    for drug_id in drug_ids:
+        outputs += run_main_stage(
             model_name=model_name,
             drug_id=drug_id,
+            split_index=split_index,
+            train_dataset=train_datasets[drug_id],
+            validation_dataset=validation_datasets[drug_id],
+            early_stopping_dataset=early_stopping_datasets[drug_id],
+            test_dataset=test_datasets[drug_id],
             result_path=result_path,
-            suffix="best_hpams",
+            path_data=path_data,
+            response_transformation=response_transformation,
+            # copy-on-write copies, the models of the other drugs never see changes of the features
+            cl_features=cl_features.copy() if cl_features is not None else None,
+            drug_features=drug_features.copy() if drug_features is not None else None,
+            **main_stage_inputs,
         )
-        parent_dir = os.path.dirname(predictions_path)
+    return outputs
 
-        model_hpam_set = model_class.get_hyperparameter_set()
 
-        for split_index, split in enumerate(response_data.cv_splits):
-            print(f"################# FOLD {split_index+1}/{len(response_data.cv_splits)} " f"#################")
-
-            prediction_file = os.path.join(predictions_path, f"predictions_split_{split_index}.csv")
-
-            hpam_filename = f"best_hpams_split_{split_index}.json"
-            hpam_save_path = os.path.join(hpam_path, hpam_filename)
-
-            (
-                train_dataset,
-                validation_dataset,
-                early_stopping_dataset,
-                test_dataset,
-            ) = get_datasets_from_cv_split(split, model_class, model_name, drug_id)
-
-            model = model_class()
-
-            if not os.path.isfile(
-                prediction_file
-            ):  # if this split has not been run yet (or for a single drug model, this drug_id)
-
-                tuning_inputs = {
-                    "model": model,
-                    "train_dataset": train_dataset,
-                    "validation_dataset": validation_dataset,
-                    "early_stopping_dataset": early_stopping_dataset,
-                    "hpam_set": model_hpam_set,
-                    "response_transformation": response_transformation,
-                    "metric": metric,
-                    "path_data": path_data,
-                }
+def _partition_by_drug(
+    dataset: Optional[DrugResponseDataset], drug_ids: list[str], cache: Optional[dict[int, dict]] = None
+) -> dict[str, Optional[DrugResponseDataset]]:
+    """
+    Partitions a dataset by drug with one group-by. The datasets of the drugs are views of one sorted copy.
+
+    :param dataset: dataset or None
+    :param drug_ids: drugs of the partition
+    :param cache: optional dictionary id(dataset) -> dictionary drug id -> dataset of the drug to group datasets
+        shared by many calls only once. The datasets must not change while the cache is used.
+    :return: dictionary drug id -> rows of the drug (empty if the drug is not in the dataset) or None if the dataset is
+        None
+    """
+    if dataset is None:
+        return {drug_id: None for drug_id in drug_ids}
+    if cache is None:
+        cache = {}
+    if id(dataset) not in cache:
+        cache[id(dataset)] = dict(dataset.groupby_drug())
+    drug_datasets = cache[id(dataset)]
+    return {drug_id: drug_datasets[drug_id] if drug_id in drug_datasets else dataset.subset([]) for drug_id in drug_ids}
+
+
+def run_posthoc_stage(
+    model_name: str,
+    drug_id: Optional[str],
+    split_index: int,
+    train_dataset: DrugResponseDataset,
+    validation_dataset: DrugResponseDataset,
+    early_stopping_dataset: Optional[DrugResponseDataset],
+    test_dataset: DrugResponseDataset,
+    result_path: str,
+    path_data: str,
+    response_transformation: Optional[TransformerMixin],
+    randomization_mode: Optional[list[str]],
+    randomization_type: str,
+    n_trials_robustness: int,
+) -> list[str]:
+    """
+    Runs the randomization and robustness tests of a model on one CV split with the best hyperparameters of the split.
+
+    The fold is prepared once (see PreparedFold) and shared by all tests of the split.
+    :param model_name: name of the model in the MODEL_FACTORY
+    :param drug_id: drug id for single drug models, None for global models
+    :param split_index: index of the CV split
+    :param train_dataset: training dataset of the split
+    :param validation_dataset: validation dataset of the split
+    :param early_stopping_dataset: early stopping dataset of the split or None
+    :param test_dataset: test dataset of the split
+    :param result_path: path to the results of the test mode
+    :param path_data: path to the data directory, usually data/
+    :param response_transformation: normalizer to use for the response data
+    :param randomization_mode: list of randomization modes, see drug_response_experiment. None for no randomization
+        tests.
+    :param randomization_type: type of randomization to use, see drug_response_experiment
+    :param n_trials_robustness: number of trials of the robustness test, 0 for no robustness test
+    :return: paths of the randomization and robustness test files
+    """
+    print(f"Preparing post-hoc tests for {_get_run_name(model_name, drug_id)}, split {split_index}")
+    prepared_fold = prepare_final_fold(
+        model_name=model_name,
+        drug_id=drug_id,
+        split_index=split_index,
+        train_dataset=train_dataset,
+        validation_dataset=validation_dataset,
+        early_stopping_dataset=early_stopping_dataset,
+        test_dataset=test_dataset,
+        result_path=result_path,
+        path_data=path_data,
+        response_transformation=response_transformation,
+    )
+    path_out = get_model_path(model_name=model_name, drug_id=drug_id, result_path=result_path)
+
+    outputs = []
+    if randomization_mode is not None:
+        # if this line changes, it also needs to be changed in pipeline:
+        # randomization_split.py
+        randomization_test_views = get_randomization_test_views(
+            model=prepared_fold.model, randomization_mode=randomization_mode
+        )
+        outputs += randomization_test(
+            randomization_test_views=randomization_test_views,
+            prepared_fold=prepared_fold,
+            path_out=path_out,
+            split_index=split_index,
+            randomization_type=randomization_type,
+        )
+    if n_trials_robustness > 0:
+        outputs += robustness_test(
+            n_trials=n_trials_robustness,
+            prepared_fold=prepared_fold,
+            path_out=path_out,
+            split_index=split_index,
+        )
+    return outputs
 
-                if multiprocessing:
-                    tuning_inputs["ray_path"] = os.path.abspath(os.path.join(result_path, "raytune"))
-                    best_hpams = hpam_tune_raytune(**tuning_inputs)
-                else:
-                    best_hpams = hpam_tune(**tuning_inputs)
-
-                print(f"Best hyperparameters: {best_hpams}")
-                print("Training model on full train and validation set to predict test set")
-                # save best hyperparameters as json
-                with open(
-                    hpam_save_path,
-                    "w",
-                    encoding="utf-8",
-                ) as f:
-                    json.dump(best_hpams, f)
-
-                train_dataset.add_rows(validation_dataset)  # use full train val set data for final training
-                train_dataset.shuffle(random_state=42)
-
-                test_dataset = train_and_predict(
-                    model=model,
-                    hpams=best_hpams,
-                    path_data=path_data,
-                    train_dataset=train_dataset,
-                    prediction_dataset=test_dataset,
-                    early_stopping_dataset=(early_stopping_dataset if model.early_stopping else None),
-                    response_transformation=response_transformation,
-                )
 
-                for cross_study_dataset in cross_study_datasets:
-                    print(f"Cross study prediction on {cross_study_dataset.dataset_name}")
-                    cross_study_dataset.remove_nan_responses()
-                    cross_study_prediction(
-                        dataset=cross_study_dataset,
-                        model=model,
-                        test_mode=test_mode,
-                        train_dataset=train_dataset,
-                        path_data=path_data,
-                        early_stopping_dataset=(early_stopping_dataset if model.early_stopping else None),
-                        response_transformation=response_transformation,
-                        path_out=parent_dir,
-                        split_index=split_index,
-                        single_drug_id=(drug_id if model_name in SINGLE_DRUG_MODEL_FACTORY else None),
-                    )
+def run_cross_study_stage(
+    model_name: str,
+    drug_id: Optional[str],
+    split_index: int,
+    train_dataset: DrugResponseDataset,
+    validation_dataset: DrugResponseDataset,
+    early_stopping_dataset: Optional[DrugResponseDataset],
+    test_dataset: DrugResponseDataset,
+    result_path: str,
+    path_data: str,
+    response_transformation: Optional[TransformerMixin],
+    test_mode: str,
+    cross_study_dataset: DrugResponseDataset,
+) -> list[str]:
+    """
+    Predicts a cross-study dataset with the final model of one CV split. Skipped if the predictions already exist.
+
+    The final model is loaded if the main stage saved it. Otherwise, it is trained again with the best hyperparameters
+    of the split, without hyperparameter tuning.
+    :param model_name: name of the model in the MODEL_FACTORY
+    :param drug_id: drug id for single drug models, None for global models
+    :param split_index: index of the CV split
+    :param train_dataset: training dataset of the split
+    :param validation_dataset: validation dataset of the split
+    :param early_stopping_dataset: early stopping dataset of the split or None
+    :param test_dataset: test dataset of the split
+    :param result_path: path to the results of the test mode
+    :param path_data: path to the data directory, usually data/
+    :param response_transformation: normalizer to use for the response data
+    :param test_mode: test mode one of "LPO", "LCO", "LDO"
+    :param cross_study_dataset: dataset to predict
+    :return: path of the predictions or an empty list if the features of the dataset could not be loaded
+    """
+    path_out = get_model_path(model_name=model_name, drug_id=drug_id, result_path=result_path)
+    cross_study_file = os.path.join(
+        path_out, "cross_study", f"cross_study_{cross_study_dataset.dataset_name}_split_{split_index}.csv"
+    )
+    if os.path.isfile(cross_study_file):
+        print(f"Cross study prediction {cross_study_file} already exists. Skipping.")
+        return [cross_study_file]
+    print(
+        f"Cross study prediction on {cross_study_dataset.dataset_name} with {_get_run_name(model_name, drug_id)}, "
+        f"split {split_index}"
+    )
+    prepared_fold = prepare_final_fold(
+        model_name=model_name,
+        drug_id=drug_id,
+        split_index=split_index,
+        train_dataset=train_dataset,
+        validation_dataset=validation_dataset,
+        early_stopping_dataset=early_stopping_dataset,
+        test_dataset=test_dataset,
+        result_path=result_path,
+        path_data=path_data,
+        response_transformation=response_transformation,
+    )
+    final_model_path = get_final_model_path(
+        model_name=model_name, drug_id=drug_id, result_path=result_path, split_index=split_index
+    )
+    if os.path.exists(final_model_path):
+        print(f"Loading the final model from {final_model_path}")
+        prepared_fold.model.load(final_model_path)
+    else:
+        print("The final model was not saved, training it with the best hyperparameters")
+        prepared_fold.train()
 
-                test_dataset.save(prediction_file)
-            else:
-                print(f"Split {split_index} already exists. Skipping.")
-                with open(
-                    hpam_save_path,
-                    encoding="utf-8",
-                ) as f:
-                    best_hpams = json.load(f)
-            if not is_baseline:
-                if randomization_mode is not None:
-                    print(f"Randomization tests for {model_class.model_name}")
-                    # if this line changes, it also needs to be changed in pipeline:
-                    # randomization_split.py
-                    randomization_test_views = get_randomization_test_views(
-                        model=model, randomization_mode=randomization_mode
-                    )
-                    randomization_test(
-                        randomization_test_views=randomization_test_views,
-                        model=model,
-                        hpam_set=best_hpams,
-                        path_data=path_data,
-                        train_dataset=train_dataset,
-                        test_dataset=test_dataset,
-                        early_stopping_dataset=(early_stopping_dataset if model.early_stopping else None),
-                        path_out=parent_dir,
-                        split_index=split_index,
-                        randomization_type=randomization_type,
-                        response_transformation=response_transformation,
-                    )
-                if n_trials_robustness > 0:
-                    print(f"Robustness test for {model_class.model_name}")
-                    robustness_test(
-                        n_trials=n_trials_robustness,
-                        model=model,
-                        hpam_set=best_hpams,
-                        path_data=path_data,
-                        train_dataset=train_dataset,
-                        test_dataset=test_dataset,
-                        early_stopping_dataset=(early_stopping_dataset if model.early_stopping else None),
-                        path_out=parent_dir,
-                        split_index=split_index,
-                        response_transformation=response_transformation,
-                    )
-    consolidate_single_drug_model_predictions(
-        models=models,
-        n_cv_splits=n_cv_splits,
-        results_path=result_path,
-        cross_study_datasets=cross_study_datasets,
-        randomization_mode=randomization_mode,
-        n_trials_robustness=n_trials_robustness,
-        out_path=result_path,
+    cross_study_dataset = cross_study_dataset.copy()
+    cross_study_dataset.remove_nan_responses()
+    train_dataset, early_stopping_dataset = _copy_datasets(
+        prepared_fold.train_dataset, prepared_fold.early_stopping_dataset
     )
-    print("Done!")
+    cross_study_file = cross_study_prediction(
+        dataset=cross_study_dataset,
+        model=prepared_fold.model,
+        test_mode=test_mode,
+        train_dataset=train_dataset,
+        path_data=path_data,
+        early_stopping_dataset=early_stopping_dataset,
+        response_transformation=response_transformation,
+        path_out=path_out,
+        split_index=split_index,
+        single_drug_id=(drug_id if model_name in SINGLE_DRUG_MODEL_FACTORY else None),
+    )
+    return [cross_study_file] if cross_study_file is not None else []
+
+
+def prepare_final_fold(
+    model_name: str,
+    drug_id: Optional[str],
+    split_index: int,
+    train_dataset: DrugResponseDataset,
+    validation_dataset: DrugResponseDataset,
+    early_stopping_dataset: Optional[DrugResponseDataset],
+    test_dataset: DrugResponseDataset,
+    result_path: str,
+    path_data: str,
+    response_transformation: Optional[TransformerMixin],
+) -> "PreparedFold":
+    """
+    Prepares a CV split like for its final model: the best hyperparameters of the split and the train and validation
+    set as training dataset. The datasets of the split are not changed.
+
+    :param model_name: name of the model in the MODEL_FACTORY
+    :param drug_id: drug id for single drug models, None for global models
+    :param split_index: index of the CV split
+    :param train_dataset: training dataset of the split
+    :param validation_dataset: validation dataset of the split
+    :param early_stopping_dataset: early stopping dataset of the split or None
+    :param test_dataset: test dataset of the split
+    :param result_path: path to the results of the test mode
+    :param path_data: path to the data directory, usually data/
+    :param response_transformation: normalizer to use for the response data
+    :return: the prepared fold
+    """
+    model = MODEL_FACTORY[model_name]()
+    hpam_path = generate_data_saving_path(
+        model_name=model_name, drug_id=drug_id, result_path=result_path, suffix="best_hpams"
+    )
+    with open(os.path.join(hpam_path, f"best_hpams_split_{split_index}.json"), encoding="utf-8") as f:
+        best_hpams = json.load(f)
+    train_dataset, validation_dataset, early_stopping_dataset, test_dataset = _copy_datasets(
+        train_dataset, validation_dataset, early_stopping_dataset, test_dataset
+    )
+    # same as for the final model in run_main_stage
+    train_dataset.add_rows(validation_dataset)
+    train_dataset.shuffle(random_state=42)
+    return PreparedFold(
+        model=model,
+        hyperparameters=best_hpams,
+        path_data=path_data,
+        train_dataset=train_dataset,
+        test_dataset=test_dataset,
+        early_stopping_dataset=early_stopping_dataset if model.early_stopping else None,
+        response_transformation=response_transformation,
+    )
+
+
+def save_final_model(model: DRPModel, path: str) -> list[str]:
+    """
+    Saves the final model of a CV split, so that later stages can predict with it without retraining.
+
+    The model is saved to a temporary directory first, which is then renamed.
+    :param model: trained model
+    :param path: path of the saved model, see get_final_model_path
+    :return: the path or an empty list if the model does not support saving
+    """
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        model.save(tmp_path)
+    except NotImplementedError:
+        shutil.rmtree(tmp_path)
+        return []
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return [path]
+
+
+class PreparedFold:
+    """
+    Setup of the final model of a CV split that is shared by the randomization and robustness tests of the split.
+
+    Preparing a fold loads the features, reduces the datasets to the cell lines and drugs with features and fits the
+    response transformation. Every test then only builds and trains a new model on copies of the prepared datasets and
+    features. The feature copies are copy-on-write, so a test only materializes the views it randomizes or the model
+    transforms.
+    """
+
+    def __init__(
+        self,
+        model: DRPModel,
+        hyperparameters: dict,
+        path_data: str,
+        train_dataset: DrugResponseDataset,
+        test_dataset: DrugResponseDataset,
+        early_stopping_dataset: Optional[DrugResponseDataset] = None,
+        response_transformation: Optional[TransformerMixin] = None,
+    ):
+        """
+        Prepares the fold. The datasets are reduced and transformed in place.
+
+        :param model: model to train
+        :param hyperparameters: hyperparameters of the model
+        :param path_data: path to the data directory, usually data/
+        :param train_dataset: training dataset, i.e., the train and validation set of the split
+        :param test_dataset: test dataset
+        :param early_stopping_dataset: early stopping dataset or None if the model does not use early stopping
+        :param response_transformation: normalizer to use for the response data, fitted on the training dataset
+        """
+        self.model = model
+        self.hyperparameters = hyperparameters
+        self.train_dataset = train_dataset
+        self.test_dataset = test_dataset
+        self.early_stopping_dataset = early_stopping_dataset
+        self.response_transformation = response_transformation
+
+        model.build_model(hyperparameters=hyperparameters)
+        print("Loading features ...")
+        self.cl_features, self.drug_features = load_features(model, path_data, train_dataset)
+        reduce_to_features(
+            cl_features=self.cl_features,
+            drug_features=self.drug_features,
+            train_dataset=train_dataset,
+            prediction_dataset=test_dataset,
+            early_stopping_dataset=early_stopping_dataset,
+        )
+        if response_transformation:
+            train_dataset.fit_transform(response_transformation)
+            test_dataset.transform(response_transformation)
+            if early_stopping_dataset is not None:
+                early_stopping_dataset.transform(response_transformation)
+
+    def copy_features(self) -> tuple[Optional[FeatureDataset], Optional[FeatureDataset]]:
+        """
+        Returns copy-on-write copies of the prepared features, e.g., to randomize a view.
+
+        :return: cell line features and drug features
+        """
+        return (
+            self.cl_features.copy() if self.cl_features is not None else None,
+            self.drug_features.copy() if self.drug_features is not None else None,
+        )
+
+    def train(self) -> DRPModel:
+        """
+        Trains a new model on the prepared training dataset, e.g., to predict other datasets with it.
+
+        :return: the trained model
+        """
+        cl_features, drug_features = self.copy_features()
+        train_dataset, early_stopping_dataset = _copy_datasets(self.train_dataset, self.early_stopping_dataset)
+        self._train(
+            train_dataset=train_dataset,
+            early_stopping_dataset=early_stopping_dataset,
+            cl_features=cl_features,
+            drug_features=drug_features,
+        )
+        return self.model
+
+    def _train(
+        self,
+        train_dataset: DrugResponseDataset,
+        early_stopping_dataset: Optional[DrugResponseDataset],
+        cl_features: Optional[FeatureDataset],
+        drug_features: Optional[FeatureDataset],
+    ) -> None:
+        """
+        Builds the model with the hyperparameters of the fold and trains it.
+
+        :param train_dataset: copy of the prepared training dataset
+        :param early_stopping_dataset: copy of the prepared early stopping dataset or None
+        :param cl_features: cell line features
+        :param drug_features: drug features
+        """
+        self.model.build_model(hyperparameters=self.hyperparameters)
+        print("Training model ...")
+        self.model.train(
+            output=train_dataset,
+            cell_line_input=cl_features,
+            drug_input=drug_features,
+            output_earlystopping=early_stopping_dataset,
+        )
+
+    def train_and_predict(
+        self,
+        cl_features: Optional[FeatureDataset] = None,
+        drug_features: Optional[FeatureDataset] = None,
+        random_state: Optional[int] = None,
+    ) -> DrugResponseDataset:
+        """
+        Trains a new model on the prepared training dataset and predicts the test dataset. The fold is not changed.
+
+        :param cl_features: cell line features, e.g., with a randomized view. Default is a copy of the prepared
+            features.
+        :param drug_features: drug features, e.g., with a randomized view. Default is a copy of the prepared features.
+        :param random_state: if given, the datasets are shuffled with this seed before training
+        :return: copy of the test dataset with the predictions, on the original response scale
+        """
+        if cl_features is None and drug_features is None:
+            cl_features, drug_features = self.copy_features()
+        train_dataset, early_stopping_dataset, test_dataset = _copy_datasets(
+            self.train_dataset, self.early_stopping_dataset, self.test_dataset
+        )
+        if random_state is not None:
+            for dataset in (train_dataset, early_stopping_dataset, test_dataset):
+                if dataset is not None:
+                    dataset.shuffle(random_state=random_state)
+
+        self._train(
+            train_dataset=train_dataset,
+            early_stopping_dataset=early_stopping_dataset,
+            cl_features=cl_features,
+            drug_features=drug_features,
+        )
+        test_dataset.predictions = self.model.predict(
+            cell_line_ids=test_dataset.cell_line_ids,
+            drug_ids=test_dataset.drug_ids,
+            cell_line_input=cl_features,
+            drug_input=drug_features,
+        )
+        if self.response_transformation:
+            test_dataset.inverse_transform(self.response_transformation)
+        return test_dataset
+
+
+def _copy_datasets(*datasets: Optional[DrugResponseDataset]) -> tuple[Optional[DrugResponseDataset], ...]:
+    """
+    Copies datasets, so that a stage does not modify the datasets of the CV split.
+
+    :param datasets: datasets or None
+    :return: copies of the datasets
+    """
+    return tuple(dataset.copy() if dataset is not None else None for dataset in datasets)
+
+
+def _get_run_name(model_name: str, drug_id: Optional[str]) -> str:
+    """
+    Returns the name of a model for printing.
+
+    :param model_name: model name
+    :param drug_id: drug id for single drug models, None for global models
+    :return: model_name or model_name.drug_id
+    """
+    return model_name if drug_id is None else f"{model_name}.{drug_id}"
 
 
 def consolidate_single_drug_model_predictions(
@@ -374,42 +1157,66 @@ def consolidate_single_drug_model_predictions(
                             )
 
                 # Save the consolidated predictions
-                pd.concat(predictions["main"], axis=0).to_csv(
+                _save_csv(
+                    pd.concat(predictions["main"], axis=0),
                     os.path.join(
                         out_path,
                         "predictions",
                         f"predictions_split_{split}.csv",
-                    )
+                    ),
                 )
 
                 for dataset_name, dataset_predictions in predictions["cross_study"].items():
-                    pd.concat(dataset_predictions, axis=0).to_csv(
+                    _save_csv(
+                        pd.concat(dataset_predictions, axis=0),
                         os.path.join(
                             out_path,
                             "cross_study",
                             f"cross_study_{dataset_name}_split_{split}.csv",
-                        )
+                        ),
                     )
 
                 for trial, trial_predictions in predictions["robustness"].items():
-                    pd.concat(trial_predictions, axis=0).to_csv(
+                    _save_csv(
+                        pd.concat(trial_predictions, axis=0),
                         os.path.join(
                             out_path,
                             "robustness",
                             f"robustness_{trial+1}_split_{split}.csv",
-                        )
+                        ),
                     )
 
                 for view, view_predictions in predictions["randomization"].items():
-                    pd.concat(view_predictions, axis=0).to_csv(
+                    _save_csv(
+                        pd.concat(view_predictions, axis=0),
                         os.path.join(
                             out_path,
                             "randomization",
                             f"randomization_{view}_split_{split}.csv",
-                        )
+                        ),
                     )
 
 
+def _save_csv(data: pd.DataFrame, path: str) -> None:
+    """
+    Saves a data frame with its index as csv via a temporary file, see atomic_write.
+
+    :param data: data frame
+    :param path: path of the csv file
+    """
+    atomic_write(path, write=lambda f: data.to_csv(f))
+
+
+def _save_json(data: Any, path: str) -> None:
+    """
+    Saves data as json via a temporary file, see atomic_write.
+
+    :param data: json serializable data
+    :param path: path of the json file
+    """
+    atomic_write(path, write=lambda f: f.write(json.dumps(data).encode("utf-8")))
+
+
 def handle_overwrite(path: str, overwrite: bool) -> None:
     """Handle overwrite logic for a given path."""
     if os.path.exists(path) and overwrite:
@@ -437,7 +1244,7 @@ def cross_study_prediction(
     path_out: str,
     split_index: int,
     single_drug_id: Optional[str] = None,
-) -> None:
+) -> Optional[str]:
     """
     Run the drug response prediction experiment on a cross-study dataset. Save results to disc.
 
@@ -448,6 +1255,7 @@ def cross_study_prediction(
     :param train_dataset: training dataset
     :param early_stopping_dataset: early stopping dataset
     :param single_drug_id: drug id to use for single drug models None for global models
+    :return: path of the predictions or None if the features of the dataset could not be loaded
     """
     dataset = dataset.copy()
     os.makedirs(os.path.join(path_out, "cross_study"), exist_ok=True)
@@ -459,7 +1267,7 @@ def cross_study_prediction(
         cl_features, drug_features = load_features(model, path_data, dataset)
     except ValueError as e:
         warnings.warn(e, stacklevel=2)
-        return
+        return None
 
     cell_lines_to_keep = cl_features.identifiers if cl_features is not None else None
 
@@ -481,24 +1289,11 @@ def cross_study_prediction(
         train_dataset.add_rows(early_stopping_dataset)
     # remove rows which overlap in the training. depends on the test mode
     if test_mode == "LPO":
-        train_pairs = {
-            f"{cl}_{drug}" for cl, drug in zip(train_dataset.cell_line_ids, train_dataset.drug_ids, strict=True)
-        }
-        dataset_pairs = [f"{cl}_{drug}" for cl, drug in zip(dataset.cell_line_ids, dataset.drug_ids, strict=True)]
-
-        dataset.remove_rows([i for i, pair in enumerate(dataset_pairs) if pair in train_pairs])
+        dataset.mask(~dataset.get_pair_mask(train_dataset))
     elif test_mode == "LCO":
-        train_cell_lines = set(train_dataset.cell_line_ids)
-        dataset.reduce_to(
-            cell_line_ids=[cl for cl in dataset.cell_line_ids if cl not in train_cell_lines],
-            drug_ids=None,
-        )
+        dataset.remove_cell_lines(train_dataset.cell_line_vocabulary[np.unique(train_dataset.cell_line_codes)])
     elif test_mode == "LDO":
-        train_drugs = set(train_dataset.drug_ids)
-        dataset.reduce_to(
-            cell_line_ids=None,
-            drug_ids=[drug for drug in dataset.drug_ids if drug not in train_drugs],
-        )
+        dataset.remove_drugs(train_dataset.drug_vocabulary[np.unique(train_dataset.drug_codes)])
     else:
         raise ValueError(f"Invalid test mode: {test_mode}. Choose from LPO, LCO, LDO")
     if len(dataset) > 0:
@@ -513,13 +1308,13 @@ def cross_study_prediction(
             dataset.response = response_transformation.inverse_transform(dataset.response)
     else:
         dataset.predictions = np.array([])
-    dataset.save(
-        os.path.join(
-            path_out,
-            "cross_study",
-            f"cross_study_{dataset.dataset_name}_split_{split_index}.csv",
-        )
+    cross_study_file = os.path.join(
+        path_out,
+        "cross_study",
+        f"cross_study_{dataset.dataset_name}_split_{split_index}.csv",
     )
+    dataset.save(cross_study_file)
+    return cross_study_file
 
 
 def get_randomization_test_views(model: DRPModel, randomization_mode: list[str]) -> dict[str, list[str]]:
@@ -551,36 +1346,23 @@ def get_randomization_test_views(model: DRPModel, randomization_mode: list[str])
 
 def robustness_test(
     n_trials: int,
-    model: DRPModel,
-    hpam_set: dict,
-    path_data: str,
-    train_dataset: DrugResponseDataset,
-    test_dataset: DrugResponseDataset,
-    early_stopping_dataset: Optional[DrugResponseDataset],
+    prepared_fold: PreparedFold,
     path_out: str,
     split_index: int,
-    response_transformation: Optional[TransformerMixin] = None,
-):
+) -> list[str]:
     """
     Run robustness tests for the given model and dataset.
 
     This will run the model n times with different random seeds to get a distribution of the results.
     :param n_trials: number of trials to run
-    :param model: model to evaluate
-    :param hpam_set: hyperparameters to use
-    :param train_dataset: training dataset
-    :param test_dataset: test dataset
-    :param early_stopping_dataset: early stopping dataset
+    :param prepared_fold: the prepared fold with the model, its hyperparameters, the datasets and the features
     :param path_out: path to the output directory
     :param split_index: index of the split
-    :param test_mode: test mode one of "LPO", "LCO", "LDO" (leave-pair-out, leave-cell-line-out,
-    leave-drug-out)
-    :param response_transformation: sklearn.preprocessing scaler like StandardScaler or
-    MinMaxScaler to use to scale the target
-    :return: None (save results to disk)
+    :return: paths of the result files of the trials
     """
     robustness_test_path = os.path.join(path_out, "robustness")
     os.makedirs(robustness_test_path, exist_ok=True)
+    trial_files = []
     for trial in range(n_trials):
         print(f"Running robustness test trial {trial+1}/{n_trials}")
         trial_file = os.path.join(
@@ -588,73 +1370,31 @@ def robustness_test(
             f"robustness_{trial+1}_split_{split_index}.csv",
         )
         if not os.path.isfile(trial_file):
-            robustness_train_predict(
-                trial=trial,
-                trial_file=trial_file,
-                train_dataset=train_dataset,
-                test_dataset=test_dataset,
-                early_stopping_dataset=early_stopping_dataset,
-                model=model,
-                hpam_set=hpam_set,
-                path_data=path_data,
-                response_transformation=response_transformation,
-            )
+            robustness_train_predict(trial=trial, trial_file=trial_file, prepared_fold=prepared_fold)
+        trial_files.append(trial_file)
+    return trial_files
 
 
-def robustness_train_predict(
-    trial: int,
-    trial_file: str,
-    train_dataset: DrugResponseDataset,
-    test_dataset: DrugResponseDataset,
-    early_stopping_dataset: Optional[DrugResponseDataset],
-    model: DRPModel,
-    hpam_set: dict,
-    path_data: str,
-    response_transformation: Optional[TransformerMixin] = None,
-):
+def robustness_train_predict(trial: int, trial_file: str, prepared_fold: PreparedFold):
     """
     Train and predict for the robustness test.
 
-    :param trial:
-    :param trial_file:
-    :param train_dataset:
-    :param test_dataset:
-    :param early_stopping_dataset:
-    :param model:
-    :param hpam_set:
-    :param path_data:
-    :param response_transformation:
-    :return:
+    The datasets of the fold are shuffled with the trial as seed, so that every trial trains on a different order.
+    :param trial: index of the trial, used as random seed
+    :param trial_file: path of the predictions of the trial
+    :param prepared_fold: the prepared fold
     """
-    train_dataset.shuffle(random_state=trial)
-    test_dataset.shuffle(random_state=trial)
-    if early_stopping_dataset is not None:
-        early_stopping_dataset.shuffle(random_state=trial)
-    test_dataset = train_and_predict(
-        model=model,
-        hpams=hpam_set,
-        path_data=path_data,
-        train_dataset=train_dataset,
-        prediction_dataset=test_dataset,
-        early_stopping_dataset=early_stopping_dataset,
-        response_transformation=response_transformation,
-    )
+    test_dataset = prepared_fold.train_and_predict(random_state=trial)
     test_dataset.save(trial_file)
 
 
 def randomization_test(
     randomization_test_views: dict[str, list[str]],
-    model: DRPModel,
-    hpam_set: dict,
-    path_data: str,
-    train_dataset: DrugResponseDataset,
-    test_dataset: DrugResponseDataset,
-    early_stopping_dataset: Optional[DrugResponseDataset],
+    prepared_fold: PreparedFold,
     path_out: str,
     split_index: int,
     randomization_type: str = "permutation",
-    response_transformation=Optional[TransformerMixin],
-) -> None:
+) -> list[str]:
     """
     Run randomization tests for the given model and dataset.
 
@@ -662,24 +1402,18 @@ def randomization_test(
         Key is the name of the randomization test and the value is a list of views to randomize
         e.g. {"randomize_genomics": ["copy_number_var", "mutation"],
         "methylation_only": ["gene_expression", "copy_number_var", "mutation"]}"
-    :param model: model to evaluate
-    :param hpam_set: hyperparameters to use
-    :param train_dataset: training dataset
-    :param test_dataset: test dataset
-    :param early_stopping_dataset: early stopping dataset
+    :param prepared_fold: the prepared fold with the model, its hyperparameters, the datasets and the features
     :param path_out: path to the output directory
     :param split_index: index of the split
-    :param test_mode: test mode one of "LPO", "LCO", "LDO"
     :param randomization_type: type of randomization to use. Choose from "permutation", "invariant".
         Default is "permutation" which permutes the features over the instances, keeping the
         distribution of the features the same but dissolving the relationship to the target.
         invariant randomization is done in a way that a key characteristic of the feature is preserved.
         In case of matrices, this is the mean and standard deviation of the feature view for this
         instance, for networks it is the degree distribution.
-    :param response_transformation: sklearn.preprocessing scaler like StandardScaler or MinMaxScaler
-        to use to scale the target
-    :return: None (save results to disk)
+    :return: paths of the result files of the randomization tests
     """
+    randomization_test_files = []
     for test_name, views in randomization_test_views.items():
         randomization_test_path = os.path.join(path_out, "randomization")
         os.makedirs(randomization_test_path, exist_ok=True)
@@ -696,16 +1430,12 @@ def randomization_test(
                     test_name=test_name,
                     randomization_type=randomization_type,
                     randomization_test_file=randomization_test_file,
-                    model=model,
-                    hpam_set=hpam_set,
-                    path_data=path_data,
-                    train_dataset=train_dataset,
-                    test_dataset=test_dataset,
-                    early_stopping_dataset=early_stopping_dataset,
-                    response_transformation=response_transformation,
+                    prepared_fold=prepared_fold,
                 )
         else:
             print(f"Randomization test {test_name} already exists. Skipping.")
+        randomization_test_files.append(randomization_test_file)
+    return randomization_test_files
 
 
 def randomize_train_predict(
@@ -713,57 +1443,33 @@ def randomize_train_predict(
     test_name: str,
     randomization_type: str,
     randomization_test_file: str,
-    model: DRPModel,
-    hpam_set: dict,
-    path_data: str,
-    train_dataset: DrugResponseDataset,
-    test_dataset: DrugResponseDataset,
-    early_stopping_dataset: Optional[DrugResponseDataset],
-    response_transformation: Optional[TransformerMixin],
+    prepared_fold: PreparedFold,
 ):
     """
     Randomize the features for a given view and run the model.
 
-    :param view:
-    :param test_name:
-    :param randomization_type:
-    :param randomization_test_file:
-    :param model:
-    :param hpam_set:
-    :param path_data:
-    :param train_dataset:
-    :param test_dataset:
-    :param early_stopping_dataset:
-    :param response_transformation:
-    :return:
+    :param view: view to randomize
+    :param test_name: name of the randomization test
+    :param randomization_type: type of randomization, see randomization_test
+    :param randomization_test_file: path of the predictions
+    :param prepared_fold: the prepared fold. Only a copy of its features is randomized.
     """
-    cl_features, drug_features = load_features(model, path_data, train_dataset)
+    cl_features_rand, drug_features_rand = prepared_fold.copy_features()
+    cl_views = cl_features_rand.get_view_names() if cl_features_rand is not None else []
+    drug_views = drug_features_rand.get_view_names() if drug_features_rand is not None else []
 
-    if (view not in cl_features.get_view_names()) and (view not in drug_features.get_view_names()):
+    if view in cl_views:
+        cl_features_rand.randomize_features(view, randomization_type=randomization_type)
+    elif view in drug_views:
+        drug_features_rand.randomize_features(view, randomization_type=randomization_type)
+    else:
         warnings.warn(
             f"View {view} not found in features. Skipping randomization test {test_name} " f"which includes this view.",
             stacklevel=2,
         )
         return
-    cl_features_rand = cl_features.copy() if cl_features is not None else None
-    drug_features_rand = drug_features.copy() if drug_features is not None else None
-
-    if view in cl_features.get_view_names():
-        cl_features_rand.randomize_features(view, randomization_type=randomization_type)
-    elif view in drug_features.get_view_names():
-        drug_features_rand.randomize_features(view, randomization_type=randomization_type)
 
-    test_dataset_rand = train_and_predict(
-        model=model,
-        hpams=hpam_set,
-        path_data=path_data,
-        train_dataset=train_dataset,
-        prediction_dataset=test_dataset,
-        early_stopping_dataset=early_stopping_dataset,
-        response_transformation=response_transformation,
-        cl_features=cl_features_rand,
-        drug_features=drug_features_rand,
-    )
+    test_dataset_rand = prepared_fold.train_and_predict(cl_features=cl_features_rand, drug_features=drug_features_rand)
     test_dataset_rand.save(randomization_test_file)
 
 
@@ -824,21 +1530,14 @@ def train_and_predict(
         print("Loading drug features ...")
         drug_features = model.load_drug_features(data_path=path_data, dataset_name=train_dataset.dataset_name)
 
-    cell_lines_to_keep = cl_features.identifiers if cl_features is not None else None
-    drugs_to_keep = drug_features.identifiers if drug_features is not None else None
-
     # making sure there are no missing features:
-    len_train_before = len(train_dataset)
-    len_pred_before = len(prediction_dataset)
-    train_dataset.reduce_to(cell_line_ids=cell_lines_to_keep, drug_ids=drugs_to_keep)
-    prediction_dataset.reduce_to(cell_line_ids=cell_lines_to_keep, drug_ids=drugs_to_keep)
-    print(f"Reduced training dataset from {len_train_before} to {len(train_dataset)}")
-    print(f"Reduced prediction dataset from {len_pred_before} to {len(prediction_dataset)}")
-
-    if early_stopping_dataset is not None:
-        len_es_before = len(early_stopping_dataset)
-        early_stopping_dataset.reduce_to(cell_line_ids=cell_lines_to_keep, drug_ids=drugs_to_keep)
-        print(f"Reduced early stopping dataset from {len_es_before} to {len(early_stopping_dataset)}")
+    reduce_to_features(
+        cl_features=cl_features,
+        drug_features=drug_features,
+        train_dataset=train_dataset,
+        prediction_dataset=prediction_dataset,
+        early_stopping_dataset=early_stopping_dataset,
+    )
 
     if response_transformation:
         train_dataset.fit_transform(response_transformation)
@@ -865,6 +1564,38 @@ def train_and_predict(
     return prediction_dataset
 
 
+def reduce_to_features(
+    cl_features: Optional[FeatureDataset],
+    drug_features: Optional[FeatureDataset],
+    train_dataset: DrugResponseDataset,
+    prediction_dataset: DrugResponseDataset,
+    early_stopping_dataset: Optional[DrugResponseDataset] = None,
+) -> None:
+    """
+    Reduces the datasets in place to the cell lines and drugs with features.
+
+    :param cl_features: cell line features or None if the model does not use any
+    :param drug_features: drug features or None if the model does not use any
+    :param train_dataset: training dataset
+    :param prediction_dataset: dataset to predict
+    :param early_stopping_dataset: early stopping dataset or None
+    """
+    cell_lines_to_keep = cl_features.identifiers if cl_features is not None else None
+    drugs_to_keep = drug_features.identifiers if drug_features is not None else None
+
+    len_train_before = len(train_dataset)
+    len_pred_before = len(prediction_dataset)
+    train_dataset.reduce_to(cell_line_ids=cell_lines_to_keep, drug_ids=drugs_to_keep)
+    prediction_dataset.reduce_to(cell_line_ids=cell_lines_to_keep, drug_ids=drugs_to_keep)
+    print(f"Reduced training dataset from {len_train_before} to {len(train_dataset)}")
+    print(f"Reduced prediction dataset from {len_pred_before} to {len(prediction_dataset)}")
+
+    if early_stopping_dataset is not None:
+        len_es_before = len(early_stopping_dataset)
+        early_stopping_dataset.reduce_to(cell_line_ids=cell_lines_to_keep, drug_ids=drugs_to_keep)
+        print(f"Reduced early stopping dataset from {len_es_before} to {len(early_stopping_dataset)}")
+
+
 def train_and_evaluate(
     model: DRPModel,
     hpams: dict[str, list],
@@ -874,6 +1605,8 @@ def train_and_evaluate(
     early_stopping_dataset: Optional[DrugResponseDataset] = None,
     response_transformation: Optional[TransformerMixin] = None,
     metric: str = "rmse",
+    cl_features: Optional[FeatureDataset] = None,
+    drug_features: Optional[FeatureDataset] = None,
 ) -> dict[str, float]:
     """
     Train and evaluate the model.
@@ -886,6 +1619,8 @@ def train_and_evaluate(
     :param early_stopping_dataset:
     :param response_transformation:
     :param metric:
+    :param cl_features: optional. Loaded cell line features, loaded from path_data if None
+    :param drug_features: optional. Loaded drug features, loaded from path_data if None
     :return:
     """
     validation_dataset = train_and_predict(
@@ -896,6 +1631,8 @@ def train_and_evaluate(
         prediction_dataset=validation_dataset,
         early_stopping_dataset=early_stopping_dataset,
         response_transformation=response_transformation,
+        cl_features=cl_features,
+        drug_features=drug_features,
     )
     return evaluate(validation_dataset, metric=[metric])
 
@@ -909,10 +1646,20 @@ def hpam_tune(
     response_transformation: Optional[TransformerMixin] = None,
     metric: str = "RMSE",
     path_data: str = "data",
-) -> dict:
+    n_jobs: int = 1,
+    strategy: str = "grid",
+    hpam_space: Optional[dict[str, Union[list, HyperparameterRange]]] = None,
+    n_trials: int = 20,
+    warm_start_scores: Optional[list[list[dict]]] = None,
+    return_scores: bool = False,
+    cl_features: Optional[FeatureDataset] = None,
+    drug_features: Optional[FeatureDataset] = None,
+) -> Union[dict, tuple[dict, list[dict]]]:
     """
     Tune the hyperparameters for the given model.
 
+    With n_jobs > 1, the hyperparameter combinations are evaluated in parallel worker processes (joblib). The
+    features are loaded once; their matrices are passed to the workers as memory maps instead of being copied.
     :param model:
     :param train_dataset:
     :param validation_dataset:
@@ -921,29 +1668,402 @@ def hpam_tune(
     :param response_transformation:
     :param metric:
     :param path_data:
-    :return:
+    :param n_jobs: number of hyperparameter combinations to evaluate in parallel
+    :param strategy: tuning strategy, one of TUNING_STRATEGIES. "grid" trains every combination on the full budget,
+        "successive_halving" trains all combinations on a small budget and only continues with the best ones, "tpe"
+        trains n_trials combinations proposed by a tree-structured Parzen estimator.
+    :param hpam_space: search space for "tpe", which may contain continuous ranges. Default is the values in
+        hpam_set.
+    :param n_trials: number of combinations to train for "tpe"
+    :param warm_start_scores: tuning scores of previous CV splits as returned with return_scores, see
+        warm_start_hpam_set. Not used by "tpe".
+    :param return_scores: whether to also return the validation scores of the combinations trained on the full budget
+    :param cl_features: optional. Loaded cell line features shared by all combinations, loaded from path_data if None
+    :param drug_features: optional. Loaded drug features shared by all combinations, loaded from path_data if None
+    :return: the best hyperparameter combination and, if return_scores, a list of
+        {"hyperparameters": ..., "score": ...} records
+    :raises AssertionError: if hpam_set is empty or the strategy is unknown
     """
     if len(hpam_set) == 0:
         raise AssertionError("hpam_set must contain at least one hyperparameter configuration")
-    if len(hpam_set) == 1:
-        return hpam_set[0]
+    if strategy not in TUNING_STRATEGIES:
+        raise AssertionError(f"Invalid tuning strategy: {strategy}. Available strategies are {TUNING_STRATEGIES}")
+    if hpam_space is None:
+        hpam_space = {name: _unique_values([hpams[name] for hpams in hpam_set]) for name in hpam_set[0]}
+    if warm_start_scores and strategy != "tpe":
+        hpam_set = warm_start_hpam_set(hpam_set=hpam_set, previous_scores=warm_start_scores, metric=metric)
+    if len(hpam_set) == 1 and all(not isinstance(values, HyperparameterRange) for values in hpam_space.values()):
+        return (hpam_set[0], []) if return_scores else hpam_set[0]
+
+    evaluation_inputs = {
+        "model": model,
+        "path_data": path_data,
+        "train_dataset": train_dataset,
+        "validation_dataset": validation_dataset,
+        "early_stopping_dataset": early_stopping_dataset,
+        "metric": metric,
+        "response_transformation": response_transformation,
+        "cl_features": cl_features,
+        "drug_features": drug_features,
+    }
+    if n_jobs > 1 and cl_features is None and drug_features is None:
+        model.build_model(hyperparameters=hpam_set[0])
+        evaluation_inputs["cl_features"], evaluation_inputs["drug_features"] = load_features(
+            model, path_data, train_dataset
+        )
 
-    best_hyperparameters = None
-    mode = get_mode(metric)
-    best_score = float("inf") if mode == "min" else float("-inf")
+    hpam_set, scores = _run_tuning_strategy(
+        strategy=strategy,
+        hpam_set=hpam_set,
+        hpam_space=hpam_space,
+        evaluation_inputs=evaluation_inputs,
+        n_trials=n_trials,
+        n_jobs=n_jobs,
+    )
+    best_hyperparameters = get_best_hyperparameters(hpam_set=hpam_set, scores=scores, metric=metric)
+    if return_scores:
+        return best_hyperparameters, [
+            {"hyperparameters": hyperparameter, "score": float(score)}
+            for hyperparameter, score in zip(hpam_set, scores)
+        ]
+    return best_hyperparameters
+
+
+def _run_tuning_strategy(
+    strategy: str,
+    hpam_set: list[dict],
+    hpam_space: dict[str, Union[list, HyperparameterRange]],
+    evaluation_inputs: dict,
+    n_trials: int,
+    n_jobs: int,
+) -> tuple[list[dict], list[float]]:
+    """
+    Trains and evaluates hyperparameter combinations with the given tuning strategy.
+
+    The grid strategy fits all combinations along a path if the model supports it and no early stopping dataset is
+    given. The path is fitted in this process, n_jobs is not used for it.
+    :param strategy: one of TUNING_STRATEGIES
+    :param hpam_set: hyperparameter combinations
+    :param hpam_space: search space for "tpe"
+    :param evaluation_inputs: keyword arguments of train_and_evaluate except hpams
+    :param n_trials: number of combinations to train for "tpe"
+    :param n_jobs: number of combinations to evaluate in parallel processes
+    :return: the combinations trained on the full budget and their validation scores
+    """
+    if strategy == "successive_halving":
+        return successive_halving(hpam_set=hpam_set, evaluation_inputs=evaluation_inputs, n_jobs=n_jobs)
+    if strategy == "tpe":
+        return tpe_search(hpam_space=hpam_space, evaluation_inputs=evaluation_inputs, n_trials=n_trials, n_jobs=n_jobs)
+    early_stopping = evaluation_inputs.get("early_stopping_dataset") is not None
+    if evaluation_inputs["model"].supports_hyperparameter_path and not early_stopping:
+        return hpam_set, evaluate_hyperparameter_path(hpam_set=hpam_set, evaluation_inputs=evaluation_inputs)
+    return hpam_set, evaluate_hyperparameters(hpam_set=hpam_set, evaluation_inputs=evaluation_inputs, n_jobs=n_jobs)
+
+
+def evaluate_hyperparameters(hpam_set: list[dict], evaluation_inputs: dict, n_jobs: int = 1) -> list[float]:
+    """
+    Trains the model with every hyperparameter combination and evaluates it on the validation dataset.
+
+    :param hpam_set: hyperparameter combinations
+    :param evaluation_inputs: keyword arguments of train_and_evaluate except hpams
+    :param n_jobs: number of combinations to evaluate in parallel processes
+    :return: validation score of every combination
+    """
+    metric = evaluation_inputs["metric"]
+    if n_jobs > 1:
+        print(f"Training {len(hpam_set)} hyperparameter combinations in {n_jobs} processes")
+        scores = Parallel(n_jobs=n_jobs, max_nbytes="1M", mmap_mode="r")(
+            delayed(train_and_evaluate)(hpams=hyperparameter, **evaluation_inputs) for hyperparameter in hpam_set
+        )
+        return [score[metric] for score in scores]
+
+    scores = []
     for hyperparameter in hpam_set:
         print(f"Training model with hyperparameters: {hyperparameter}")
-        score = train_and_evaluate(
-            model=model,
-            hpams=hyperparameter,
-            path_data=path_data,
-            train_dataset=train_dataset,
-            validation_dataset=validation_dataset,
-            early_stopping_dataset=early_stopping_dataset,
-            metric=metric,
-            response_transformation=response_transformation,
-        )[metric]
+        scores.append(train_and_evaluate(hpams=hyperparameter, **evaluation_inputs)[metric])
+    return scores
+
+
+def evaluate_hyperparameter_path(hpam_set: list[dict], evaluation_inputs: dict) -> list[float]:
+    """
+    Evaluates all hyperparameter combinations with one call to the model's predict_hyperparameter_path.
+
+    Mirrors train_and_predict and train_and_evaluate, but fits the combinations together, e.g., along a
+    regularization path, and does not change the datasets in evaluation_inputs.
+    :param hpam_set: hyperparameter combinations
+    :param evaluation_inputs: keyword arguments of train_and_evaluate except hpams
+    :return: validation score of every combination
+    """
+    model = evaluation_inputs["model"]
+    metric = evaluation_inputs["metric"]
+    response_transformation = evaluation_inputs["response_transformation"]
+    train_dataset = evaluation_inputs["train_dataset"].copy()
+    validation_dataset = evaluation_inputs["validation_dataset"].copy()
+    model.build_model(hyperparameters=hpam_set[0])
+    cl_features = evaluation_inputs.get("cl_features")
+    drug_features = evaluation_inputs.get("drug_features")
+    if cl_features is None:
+        cl_features = model.load_cell_line_features(
+            data_path=evaluation_inputs["path_data"], dataset_name=train_dataset.dataset_name
+        )
+    if drug_features is None:
+        drug_features = model.load_drug_features(
+            data_path=evaluation_inputs["path_data"], dataset_name=train_dataset.dataset_name
+        )
+
+    cell_lines_to_keep = cl_features.identifiers if cl_features is not None else None
+    drugs_to_keep = drug_features.identifiers if drug_features is not None else None
+    train_dataset.reduce_to(cell_line_ids=cell_lines_to_keep, drug_ids=drugs_to_keep)
+    validation_dataset.reduce_to(cell_line_ids=cell_lines_to_keep, drug_ids=drugs_to_keep)
+    if response_transformation:
+        train_dataset.fit_transform(response_transformation)
+        validation_dataset.transform(response_transformation)
+
+    print(f"Training {len(hpam_set)} hyperparameter combinations along a path")
+    predictions = model.predict_hyperparameter_path(
+        hpam_set=hpam_set,
+        output=train_dataset,
+        drug_ids=validation_dataset.drug_ids,
+        cell_line_ids=validation_dataset.cell_line_ids,
+        drug_input=drug_features,
+        cell_line_input=cl_features,
+    )
+    scores = []
+    for hyperparameter_predictions in predictions:
+        evaluated_dataset = validation_dataset.copy()
+        evaluated_dataset.predictions = hyperparameter_predictions
+        if response_transformation:
+            evaluated_dataset.inverse_transform(response_transformation)
+        scores.append(evaluate(evaluated_dataset, metric=[metric])[metric])
+    return scores
+
+
+def successive_halving(
+    hpam_set: list[dict], evaluation_inputs: dict, n_jobs: int = 1, reduction_factor: int = 3
+) -> tuple[list[dict], list[float]]:
+    """
+    Successive halving over a hyperparameter grid.
+
+    All combinations are trained on a small budget, the best 1 / reduction_factor of them are trained again on a
+    reduction_factor times larger budget, and so on until the remaining combinations are trained on the full budget.
+    With reduction_factor 3, 27 combinations are trained on 1/27, 9 on 1/9, 3 on 1/3 and 1 on the full budget,
+    which costs about as much as training 4 combinations on the full budget. See apply_budget for what the budget is.
+    :param hpam_set: hyperparameter combinations
+    :param evaluation_inputs: keyword arguments of train_and_evaluate except hpams
+    :param n_jobs: number of combinations to evaluate in parallel processes
+    :param reduction_factor: factor by which the number of combinations shrinks and the budget grows per round
+    :return: the combinations trained on the full budget and their validation scores
+    :raises AssertionError: if reduction_factor < 2
+    """
+    if reduction_factor < 2:
+        raise AssertionError(f"reduction_factor must be at least 2, but is {reduction_factor}")
+    metric = evaluation_inputs["metric"]
+    n_rounds = int(np.floor(np.log(len(hpam_set)) / np.log(reduction_factor) + 1e-9))
+    candidates = list(hpam_set)
+    for round_index in range(n_rounds + 1):
+        fraction = float(reduction_factor) ** (round_index - n_rounds)
+        budgeted_hpam_set, train_dataset = apply_budget(candidates, evaluation_inputs["train_dataset"], fraction)
+        print(
+            f"Successive halving: training {len(candidates)} combinations on {fraction:.3g} of the budget "
+            f"({len(train_dataset)} training rows)"
+        )
+        scores = evaluate_hyperparameters(
+            hpam_set=budgeted_hpam_set,
+            evaluation_inputs={**evaluation_inputs, "train_dataset": train_dataset},
+            n_jobs=n_jobs,
+        )
+        if round_index == n_rounds:
+            break
+        candidates = _get_top_hyperparameters(
+            hpam_set=candidates, scores=scores, metric=metric, n=int(np.ceil(len(candidates) / reduction_factor))
+        )
+    return candidates, scores
+
+
+def tpe_search(
+    hpam_space: dict[str, Union[list, HyperparameterRange]],
+    evaluation_inputs: dict,
+    n_trials: int,
+    n_jobs: int = 1,
+    random_state: int = 42,
+) -> tuple[list[dict], list[float]]:
+    """
+    Sequential model-based search with a tree-structured Parzen estimator.
+
+    Every round, n_jobs combinations are proposed based on the scores of the combinations trained so far, until
+    n_trials combinations were proposed. A combination that was already trained is not trained again.
+    :param hpam_space: search space with categorical values and ranges
+    :param evaluation_inputs: keyword arguments of train_and_evaluate except hpams
+    :param n_trials: number of combinations to propose
+    :param n_jobs: number of combinations to evaluate in parallel processes
+    :param random_state: seed of the optimizer
+    :return: the trained combinations and their validation scores
+    :raises AssertionError: if n_trials < 1
+    """
+    if n_trials < 1:
+        raise AssertionError(f"n_trials must be at least 1, but is {n_trials}")
+    metric = evaluation_inputs["metric"]
+    sign = 1 if get_mode(metric) == "min" else -1
+    optimizer = TreeParzenEstimator(space=hpam_space, random_state=random_state)
+    trained_hpams, trained_scores = [], []
+    n_proposed = 0
+    while n_proposed < n_trials:
+        proposals = [optimizer.ask() for _ in range(min(n_jobs, n_trials - n_proposed))]
+        n_proposed += len(proposals)
+        new_hpams = _unique_values([hpams for hpams in proposals if hpams not in trained_hpams])
+        print(f"TPE: training {len(new_hpams)} combinations, {n_proposed} of {n_trials} trials")
+        trained_scores += evaluate_hyperparameters(
+            hpam_set=new_hpams, evaluation_inputs=evaluation_inputs, n_jobs=n_jobs
+        )
+        trained_hpams += new_hpams
+        for hpams in proposals:
+            optimizer.tell(hpams, sign * trained_scores[trained_hpams.index(hpams)])
+    return trained_hpams, trained_scores
+
+
+def warm_start_hpam_set(
+    hpam_set: list[dict], previous_scores: list[list[dict]], metric: str, top_k: int = 3
+) -> list[dict]:
+    """
+    Orders and prunes the hyperparameter combinations of a CV split based on the tuning scores of previous splits.
+
+    The top_k combinations with the best mean rank over the previous splits come first. A combination that was worse
+    than all of them in every previous split it was evaluated in is dominated and dropped. Combinations without
+    previous scores are kept.
+    :param hpam_set: hyperparameter combinations
+    :param previous_scores: for every previous split, a list of {"hyperparameters": ..., "score": ...} records
+    :param metric: metric of the scores, decides whether lower or higher scores are better
+    :param top_k: number of best combinations of the previous splits to evaluate first
+    :return: the combinations to evaluate, the top_k best of the previous splits first
+    """
+    sign = 1 if get_mode(metric) == "min" else -1
+    # scores[split, combination]; NaN if the combination was not evaluated, inf if its score was NaN
+    scores = np.full((len(previous_scores), len(hpam_set)), np.nan)
+    for split_index, records in enumerate(previous_scores):
+        for record in records:
+            if record["hyperparameters"] in hpam_set:
+                score = sign * record["score"]
+                scores[split_index, hpam_set.index(record["hyperparameters"])] = np.inf if np.isnan(score) else score
+    evaluated = ~np.isnan(scores).all(axis=0)
+    if evaluated.sum() <= top_k:
+        return hpam_set
+
+    mean_rank = pd.DataFrame(scores).rank(axis=1, na_option="keep").mean(axis=0).to_numpy()
+    top = np.argsort(np.where(evaluated, mean_rank, np.inf), kind="stable")[:top_k]
+    with warnings.catch_warnings():
+        # splits in which none of the top combinations was evaluated prune nothing
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        threshold = np.nanmax(scores[:, top], axis=1)
+    beats_top = (scores < threshold[:, None]) | np.isnan(threshold)[:, None]
+    keep = ~evaluated | beats_top.any(axis=0)
+    keep[top] = False
+    warm_started = [hpam_set[i] for i in top] + [hpam_set[i] for i in np.flatnonzero(keep)]
+    print(f"Warm start: evaluating {len(warm_started)} of {len(hpam_set)} hyperparameter combinations")
+    return warm_started
+
+
+def load_hpam_scores(hpam_path: str, split_indices: Iterable[int]) -> list[list[dict]]:
+    """
+    Loads the tuning scores of CV splits that were saved by run_main_stage. Missing splits are skipped.
+
+    :param hpam_path: directory of the best_hpams_split_*.json and hpam_scores_split_*.json files
+    :param split_indices: indices of the splits
+    :return: for every split with saved scores, a list of {"hyperparameters": ..., "score": ...} records
+    """
+    hpam_scores = []
+    for split_index in split_indices:
+        path = os.path.join(hpam_path, f"hpam_scores_split_{split_index}.json")
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                hpam_scores.append(json.load(f))
+    return hpam_scores
+
+
+def _unique_values(values: list) -> list:
+    """
+    Removes duplicates from a list of possibly unhashable values, e.g., lists or dictionaries, keeping the order.
+
+    :param values: values
+    :return: values without duplicates
+    """
+    unique = []
+    for value in values:
+        if value not in unique:
+            unique.append(value)
+    return unique
+
+
+def apply_budget(
+    hpam_set: list[dict], train_dataset: DrugResponseDataset, fraction: float, random_state: int = 42
+) -> tuple[list[dict], DrugResponseDataset]:
+    """
+    Reduces the training budget of the hyperparameter combinations of a successive halving round.
+
+    The budget is the number of epochs (epochs, EPOCHS) for neural networks and the number of trees (n_estimators)
+    for ensembles. If a combination has no such hyperparameter, all combinations are trained on the same random
+    subsample of the training rows instead.
+    :param hpam_set: hyperparameter combinations with the full budget
+    :param train_dataset: training dataset
+    :param fraction: fraction of the full budget, in (0, 1]
+    :param random_state: seed for subsampling the training rows
+    :return: the hyperparameter combinations and the training dataset for the reduced budget
+    """
+    if fraction >= 1:
+        return hpam_set, train_dataset
+    budget_names = [_get_budget_hyperparameter(hyperparameters) for hyperparameters in hpam_set]
+    if None not in budget_names:
+        return [
+            {**hyperparameters, name: max(1, int(round(hyperparameters[name] * fraction)))}
+            for hyperparameters, name in zip(hpam_set, budget_names, strict=True)
+        ], train_dataset
+    n_rows = max(int(round(len(train_dataset) * fraction)), min(len(train_dataset), MIN_BUDGET_ROWS))
+    rows = np.random.default_rng(random_state).choice(len(train_dataset), size=n_rows, replace=False)
+    return hpam_set, train_dataset.subset(np.sort(rows))
+
+
+def _get_budget_hyperparameter(hyperparameters: dict) -> Optional[str]:
+    """
+    Returns the name of the hyperparameter that sets the training budget of a combination.
+
+    :param hyperparameters: hyperparameter combination
+    :return: the first of BUDGET_HYPERPARAMETERS with an integer value, None if there is none
+    """
+    for name in BUDGET_HYPERPARAMETERS:
+        if isinstance(hyperparameters.get(name), int):
+            return name
+    return None
 
+
+def _get_top_hyperparameters(hpam_set: list[dict], scores: list[float], metric: str, n: int) -> list[dict]:
+    """
+    Selects the n best hyperparameter combinations. NaN scores rank last, ties keep the original order.
+
+    :param hpam_set: hyperparameter combinations
+    :param scores: validation score of every combination
+    :param metric: metric of the scores, decides whether lower or higher scores are better
+    :param n: number of combinations to keep
+    :return: the n best combinations, best first
+    """
+    scores = np.asarray(scores, dtype=float)
+    if get_mode(metric) == "max":
+        scores = -scores
+    order = np.argsort(np.where(np.isnan(scores), np.inf, scores), kind="stable")
+    return [hpam_set[i] for i in order[:n]]
+
+
+def get_best_hyperparameters(hpam_set: list[dict], scores: list[float], metric: str) -> dict:
+    """
+    Selects the best hyperparameter combination. NaN scores are ignored, ties go to the first combination.
+
+    :param hpam_set: hyperparameter combinations
+    :param scores: validation score of every combination
+    :param metric: metric of the scores, decides whether lower or higher scores are better
+    :return: the best hyperparameter combination
+    """
+    best_hyperparameters = None
+    mode = get_mode(metric)
+    best_score = float("inf") if mode == "min" else float("-inf")
+    for hyperparameter, score in zip(hpam_set, scores, strict=True):
         if np.isnan(score):
             continue
 
@@ -954,7 +2074,7 @@ def hpam_tune(
 
     if best_hyperparameters is None:
         warnings.warn("all hpams lead to NaN respone. using last hpam combination.", stacklevel=2)
-        best_hyperparameters = hyperparameter
+        best_hyperparameters = hpam_set[-1]
 
     return best_hyperparameters
 
@@ -1003,7 +2123,8 @@ def hpam_tune_raytune(
             response_transformation=response_transformation,
         ),
         config=tune.grid_search(hpam_set),
-        mode="min",
+        metric=metric,
+        mode=get_mode(metric),
         num_samples=5,
         resources_per_trial=resources_per_trial,
         chdir_to_trial_dir=False,
@@ -1058,47 +2179,37 @@ def get_model_name_and_drug_id(model_name: str):
         return model_name, drug_id
 
 
-def get_datasets_from_cv_split(split, model_class, model_name, drug_id):
+def get_datasets_from_cv_split(split, model_class, model_name, drug_id, drug_datasets_cache=None):
     """
     Get dataset from cross validation split.
 
-    :param model_class:
-    :param model_name:
-    :param drug_id:
+    :param split: cross validation split
+    :param model_class: model class
+    :param model_name: model name
+    :param drug_id: drug of a single drug model, None otherwise
+    :param drug_datasets_cache: optional cache of _partition_by_drug, so that the datasets of a split are grouped by
+        drug only once for all single drug models
+    :return: train, validation, early stopping (None without early stopping) and test dataset
     """
-    train_dataset = split["train"]
-    validation_dataset = split["validation"]
-    test_dataset = split["test"]
+    datasets = get_fold_datasets(split, model_class)
+    if model_name in SINGLE_DRUG_MODEL_FACTORY.keys():
+        return tuple(_partition_by_drug(dataset, [drug_id], drug_datasets_cache)[drug_id] for dataset in datasets)
+    return datasets
 
-    if model_class.early_stopping:
-        validation_dataset = split["validation_es"]
-        early_stopping_dataset = split["early_stopping"]
-    else:
-        early_stopping_dataset = None
 
-    if model_name in SINGLE_DRUG_MODEL_FACTORY.keys():
-        output_mask = train_dataset.drug_ids == drug_id
-        train_cp = train_dataset.copy()
-        train_cp.mask(output_mask)
-        validation_mask = validation_dataset.drug_ids == drug_id
-        val_cp = validation_dataset.copy()
-        val_cp.mask(validation_mask)
-        test_mask = test_dataset.drug_ids == drug_id
-        test_cp = test_dataset.copy()
-        test_cp.mask(test_mask)
-        if early_stopping_dataset is not None:
-            es_mask = early_stopping_dataset.drug_ids == drug_id
-            es_cp = early_stopping_dataset.copy()
-            es_cp.mask(es_mask)
-            return train_cp, val_cp, es_cp, test_cp
-        return train_cp, val_cp, None, test_cp
-
-    return (
-        train_dataset,
-        validation_dataset,
-        early_stopping_dataset,
-        test_dataset,
-    )
+def get_fold_datasets(
+    split: dict[str, DrugResponseDataset], model_class: type[DRPModel]
+) -> tuple[DrugResponseDataset, DrugResponseDataset, Optional[DrugResponseDataset], DrugResponseDataset]:
+    """
+    Returns the datasets of a cross validation split a model is trained and evaluated on, for all drugs.
+
+    :param split: cross validation split
+    :param model_class: model class, models with early stopping use the validation set without the early stopping set
+    :return: train, validation, early stopping (None without early stopping) and test dataset
+    """
+    if model_class.early_stopping:
+        return split["train"], split["validation_es"], split["early_stopping"], split["test"]
+    return split["train"], split["validation"], None, split["test"]
 
 
 def generate_data_saving_path(model_name, drug_id, result_path, suffix):
@@ -1110,10 +2221,37 @@ def generate_data_saving_path(model_name, drug_id, result_path, suffix):
     :param result_path:
     :param suffix:
     """
-    is_single_drug_model = model_name in SINGLE_DRUG_MODEL_FACTORY
-    if is_single_drug_model:
-        model_path = os.path.join(result_path, model_name, "drugs", drug_id, suffix)
-    else:
-        model_path = os.path.join(result_path, model_name, suffix)
+    model_path = os.path.join(get_model_path(model_name=model_name, drug_id=drug_id, result_path=result_path), suffix)
     os.makedirs(model_path, exist_ok=True)
     return model_path
+
+
+def get_model_path(model_name: str, drug_id: Optional[str], result_path: str) -> str:
+    """
+    Returns the result directory of a model or, for single drug models, of one drug.
+
+    :param model_name: model name
+    :param drug_id: drug id for single drug models, None for global models
+    :param result_path: path to the results of the test mode
+    :return: result_path/model_name or result_path/model_name/drugs/drug_id
+    """
+    if model_name in SINGLE_DRUG_MODEL_FACTORY:
+        return os.path.join(result_path, model_name, "drugs", drug_id)
+    return os.path.join(result_path, model_name)
+
+
+def get_final_model_path(model_name: str, drug_id: Optional[str], result_path: str, split_index: int) -> str:
+    """
+    Returns the path of the final model of a CV split, see save_final_model.
+
+    :param model_name: model name
+    :param drug_id: drug id for single drug models, None for global models
+    :param result_path: path to the results of the test mode
+    :param split_index: index of the CV split
+    :return: path of the saved model
+    """
+    return os.path.join(
+        get_model_path(model_name=model_name, drug_id=drug_id, result_path=result_path),
+        "final_models",
+        f"split_{split_index}",
+    )
@@ -0,0 +1,323 @@
+"""
+Hyperparameter search spaces and a sequential model-based optimizer.
+
+A search space maps every hyperparameter to either a list of values (categorical, as in the grids of the
+hyperparameters.yaml files) or a HyperparameterRange (continuous or integer, optionally log-uniform). The
+TreeParzenEstimator proposes hyperparameter combinations from such a space based on the scores of the combinations
+evaluated so far.
+"""
+
+from typing import Any, Union
+
+import numpy as np
+
+
+class HyperparameterRange:
+    """Continuous or integer range of a hyperparameter, uniform or log-uniform."""
+
+    def __init__(self, low: float, high: float, log: bool = False, integer: bool = False, grid_points: int = 5):
+        """
+        Initializes the range.
+
+        :param low: lower bound, inclusive
+        :param high: upper bound, inclusive
+        :param log: whether to search the range on a log scale, e.g., for regularization strengths or learning rates
+        :param integer: whether the hyperparameter is an integer
+        :param grid_points: number of values used if the range is part of a grid search
+        :raises AssertionError: if the bounds are invalid
+        """
+        if low >= high:
+            raise AssertionError(
+                f"The lower bound {low} of a hyperparameter range must be below the upper bound {high}"
+            )
+        if log and low <= 0:
+            raise AssertionError(f"The lower bound of a log-uniform hyperparameter range must be positive, not {low}")
+        if grid_points < 2:
+            raise AssertionError(f"A hyperparameter range needs at least 2 grid points, not {grid_points}")
+        self.low = low
+        self.high = high
+        self.log = log
+        self.integer = integer
+        self.grid_points = grid_points
+
+    @classmethod
+    def from_dict(cls, specification: dict[str, Any]) -> "HyperparameterRange":
+        """
+        Creates the range from its specification in a hyperparameters.yaml file, e.g.,
+
+        alpha:
+          low: 0.001
+          high: 100
+          log: true
+
+        :param specification: dictionary with the keys low and high and optionally log, integer and grid_points
+        :return: the range
+        :raises AssertionError: if keys are missing or unknown
+        """
+        allowed_keys = {"low", "high", "log", "integer", "grid_points"}
+        if not {"low", "high"} <= specification.keys() <= allowed_keys:
+            raise AssertionError(
+                f"A hyperparameter range needs the keys low and high and may have the keys {sorted(allowed_keys)}, "
+                f"got {sorted(specification)}"
+            )
+        return cls(**specification)
+
+    def __repr__(self):
+        """Overwrites the default repr method."""
+        return (
+            f"HyperparameterRange(low={self.low}, high={self.high}, log={self.log}, integer={self.integer}, "
+            f"grid_points={self.grid_points})"
+        )
+
+    @property
+    def bounds(self) -> tuple[float, float]:
+        """
+        Returns the bounds on the search scale, i.e., the log of the bounds for log-uniform ranges.
+
+        :return: lower and upper bound
+        """
+        if self.log:
+            return float(np.log(self.low)), float(np.log(self.high))
+        return float(self.low), float(self.high)
+
+    def to_search_scale(self, value: float) -> float:
+        """
+        Maps a value to the search scale.
+
+        :param value: hyperparameter value
+        :return: the value on the search scale
+        """
+        return float(np.log(value)) if self.log else float(value)
+
+    def from_search_scale(self, value: float) -> Union[int, float]:
+        """
+        Maps a value from the search scale back to the range, rounding integers.
+
+        :param value: value on the search scale
+        :return: the hyperparameter value
+        """
+        value = float(np.exp(value)) if self.log else float(value)
+        value = min(max(value, self.low), self.high)
+        return int(round(value)) if self.integer else value
+
+    def grid(self) -> list[Union[int, float]]:
+        """
+        Returns evenly spaced values (on the search scale) for a grid search.
+
+        :return: grid_points values between the bounds, without duplicates for integer ranges
+        """
+        values = [self.from_search_scale(value) for value in np.linspace(*self.bounds, num=self.grid_points)]
+        return list(dict.fromkeys(values))
+
+
+def parse_hyperparameter_space(hyperparameters: dict[str, Any]) -> dict[str, Union[list, HyperparameterRange]]:
+    """
+    Parses the hyperparameters of a model from a hyperparameters.yaml file into a search space.
+
+    Lists are categorical hyperparameters, dictionaries with the keys low and high are ranges (see
+    HyperparameterRange.from_dict) and all other values, including other dictionaries, are fixed.
+    :param hyperparameters: hyperparameters as loaded from the yaml file
+    :return: search space
+    """
+    space = {}
+    for name, values in hyperparameters.items():
+        if isinstance(values, dict) and {"low", "high"} <= values.keys():
+            space[name] = HyperparameterRange.from_dict(values)
+        elif isinstance(values, list):
+            space[name] = values
+        else:
+            space[name] = [values]
+    return space
+
+
+def get_grid(space: dict[str, Union[list, HyperparameterRange]]) -> dict[str, list]:
+    """
+    Replaces the ranges of a search space by evenly spaced values for a grid search.
+
+    :param space: search space
+    :return: dictionary hyperparameter name -> list of values, e.g., for sklearn's ParameterGrid
+    """
+    return {
+        name: values.grid() if isinstance(values, HyperparameterRange) else values for name, values in space.items()
+    }
+
+
+class TreeParzenEstimator:
+    """
+    Tree-structured Parzen estimator (Bergstra et al., 2011) for hyperparameter optimization.
+
+    The first n_startup_trials combinations are sampled at random from the search space. Afterwards, the evaluated
+    combinations are split into the best gamma fraction ("good") and the rest ("bad"). For every hyperparameter, a
+    Parzen estimator (Gaussian kernels for ranges, smoothed frequencies for categorical values) models the density of
+    the good values l(x) and of the bad values g(x). Candidates are sampled from l and the candidate maximizing
+    l(x) / g(x) is proposed next. Hyperparameters are modelled independently of each other.
+    """
+
+    def __init__(
+        self,
+        space: dict[str, Union[list, HyperparameterRange]],
+        n_startup_trials: int = 10,
+        gamma: float = 0.25,
+        n_candidates: int = 24,
+        random_state: int = 42,
+    ):
+        """
+        Initializes the optimizer.
+
+        :param space: search space, see parse_hyperparameter_space
+        :param n_startup_trials: number of random combinations before the Parzen estimators are used
+        :param gamma: fraction of the evaluated combinations that counts as good
+        :param n_candidates: number of candidates sampled from the good density per proposal
+        :param random_state: seed of the random number generator
+        """
+        self.space = space
+        self.n_startup_trials = n_startup_trials
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+        self.rng = np.random.default_rng(random_state)
+        self.observations: list[tuple[dict, float]] = []
+
+    def ask(self) -> dict:
+        """
+        Proposes the next hyperparameter combination.
+
+        :return: hyperparameter combination
+        """
+        if len(self.observations) < self.n_startup_trials:
+            return {name: self._sample_prior(values) for name, values in self.space.items()}
+
+        scores = np.array([score for _, score in self.observations])
+        order = np.argsort(np.where(np.isnan(scores), np.inf, scores), kind="stable")
+        n_good = max(1, int(np.ceil(self.gamma * len(order))))
+        good = [self.observations[i][0] for i in order[:n_good]]
+        bad = [self.observations[i][0] for i in order[n_good:]]
+
+        candidates = [{} for _ in range(self.n_candidates)]
+        log_ratio = np.zeros(self.n_candidates)
+        for name, values in self.space.items():
+            if isinstance(values, HyperparameterRange):
+                samples, ratio = self._propose_range(
+                    values, [hpams[name] for hpams in good], [hpams[name] for hpams in bad]
+                )
+            else:
+                samples, ratio = self._propose_categorical(
+                    values, [hpams[name] for hpams in good], [hpams[name] for hpams in bad]
+                )
+            log_ratio += ratio
+            for candidate, sample in zip(candidates, samples):
+                candidate[name] = sample
+        return candidates[int(np.argmax(log_ratio))]
+
+    def tell(self, hyperparameters: dict, score: float) -> None:
+        """
+        Records the score of an evaluated hyperparameter combination. Lower scores are better, NaN is worst.
+
+        :param hyperparameters: the evaluated combination
+        :param score: its score
+        """
+        self.observations.append((hyperparameters, float(score)))
+
+    def _sample_prior(self, values: Union[list, HyperparameterRange]) -> Any:
+        """
+        Samples a value uniformly (on the search scale) from a hyperparameter's values.
+
+        :param values: categorical values or range
+        :return: the sampled value
+        """
+        if isinstance(values, HyperparameterRange):
+            return values.from_search_scale(self.rng.uniform(*values.bounds))
+        return values[self.rng.integers(len(values))]
+
+    def _propose_range(
+        self, hyperparameter_range: HyperparameterRange, good: list[float], bad: list[float]
+    ) -> tuple[list, np.ndarray]:
+        """
+        Samples candidates from the good density of a range and computes log l(x) - log g(x).
+
+        :param hyperparameter_range: the range
+        :param good: values of the good combinations
+        :param bad: values of the bad combinations
+        :return: candidate values and their log density ratios
+        """
+        low, high = hyperparameter_range.bounds
+        good_points = np.array([hyperparameter_range.to_search_scale(value) for value in good])
+        bad_points = np.array([hyperparameter_range.to_search_scale(value) for value in bad])
+        good_sigma = self._bandwidth(good_points, low, high)
+
+        # the last mixture component is the uniform prior
+        components = self.rng.integers(len(good_points) + 1, size=self.n_candidates)
+        is_prior = components == len(good_points)
+        samples = np.empty(self.n_candidates)
+        samples[is_prior] = self.rng.uniform(low, high, size=is_prior.sum())
+        samples[~is_prior] = self.rng.normal(good_points[components[~is_prior]], good_sigma)
+        samples = np.clip(samples, low, high)
+        values = [hyperparameter_range.from_search_scale(sample) for sample in samples]
+        # score the rounded values that are actually proposed
+        samples = np.array([hyperparameter_range.to_search_scale(value) for value in values])
+
+        log_ratio = self._log_parzen_density(samples, good_points, good_sigma, low, high) - self._log_parzen_density(
+            samples, bad_points, self._bandwidth(bad_points, low, high), low, high
+        )
+        return values, log_ratio
+
+    def _propose_categorical(self, values: list, good: list, bad: list) -> tuple[list, np.ndarray]:
+        """
+        Samples candidates from the good frequencies of a categorical hyperparameter and computes log l(x) - log g(x).
+
+        :param values: categorical values
+        :param good: values of the good combinations
+        :param bad: values of the bad combinations
+        :return: candidate values and their log density ratios
+        """
+        good_probabilities = self._smoothed_frequencies(values, good)
+        bad_probabilities = self._smoothed_frequencies(values, bad)
+        indices = self.rng.choice(len(values), size=self.n_candidates, p=good_probabilities)
+        log_ratio = np.log(good_probabilities[indices]) - np.log(bad_probabilities[indices])
+        return [values[i] for i in indices], log_ratio
+
+    @staticmethod
+    def _smoothed_frequencies(values: list, observed: list) -> np.ndarray:
+        """
+        Computes the frequencies of the categorical values with one pseudo count per value.
+
+        :param values: categorical values
+        :param observed: observed values
+        :return: probability of every value
+        """
+        counts = np.ones(len(values))
+        for value in observed:
+            counts[values.index(value)] += 1
+        return counts / counts.sum()
+
+    @staticmethod
+    def _bandwidth(points: np.ndarray, low: float, high: float) -> float:
+        """
+        Computes the kernel bandwidth with Scott's rule, bounded to [(high - low) / 20, high - low].
+
+        :param points: observed points on the search scale
+        :param low: lower bound on the search scale
+        :param high: upper bound on the search scale
+        :return: bandwidth
+        """
+        width = high - low
+        if len(points) < 2:
+            return width
+        return float(np.clip(1.06 * np.std(points) * len(points) ** (-1 / 5), width / 20, width))
+
+    @staticmethod
+    def _log_parzen_density(x: np.ndarray, points: np.ndarray, sigma: float, low: float, high: float) -> np.ndarray:
+        """
+        Evaluates the log density of a mixture of Gaussian kernels around the points and a uniform prior.
+
+        :param x: where to evaluate the density, on the search scale
+        :param points: kernel centers on the search scale
+        :param sigma: kernel bandwidth
+        :param low: lower bound on the search scale
+        :param high: upper bound on the search scale
+        :return: log density at x
+        """
+        density = np.full(len(x), 1 / (high - low))
+        if len(points) > 0:
+            kernels = np.exp(-0.5 * ((x[:, None] - points[None, :]) / sigma) ** 2) / (sigma * np.sqrt(2 * np.pi))
+            density += kernels.sum(axis=1)
+        return np.log(density / (len(points) + 1))
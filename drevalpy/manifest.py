@@ -0,0 +1,260 @@
+"""
+Job manifest for resuming experiments.
+
+The manifest is a SQLite database in the result directory of an experiment. It records for every job its status
+("running", "done" or "failed"), a hash of its inputs, its start and end time and the files it wrote. When an
+experiment is restarted, jobs that are done with the same inputs are not scheduled again, without checking the result
+directories. Jobs that were running when the experiment was interrupted or that failed are run again; since results
+are written to a temporary file first and then renamed, they never left a truncated result file behind.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+
+from .datasets.dataset import DrugResponseDataset
+from .scheduler import Job
+
+MANIFEST_FILE_NAME = "manifest.sqlite"
+
+
+class JobManifest:
+    """SQLite database with the status of the jobs of an experiment. It is safe to use from several processes."""
+
+    def __init__(self, path: str):
+        """
+        Opens the manifest and creates it if it does not exist.
+
+        :param path: path to the SQLite file
+        """
+        self.path = path
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "key TEXT PRIMARY KEY, status TEXT NOT NULL, inputs_hash TEXT NOT NULL, "
+                "started REAL, finished REAL, outputs TEXT, error TEXT)"
+            )
+
+    def __repr__(self):
+        """Overwrites the default repr method."""
+        return f"JobManifest({self.path!r})"
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection. Every operation uses its own connection, so that the manifest can be sent to workers.
+
+        :return: the connection
+        """
+        return sqlite3.connect(self.path, timeout=60)
+
+    def get(self, key: Hashable) -> Optional[dict[str, Any]]:
+        """
+        Returns the record of a job.
+
+        :param key: job key
+        :return: dictionary with status, inputs_hash, started, finished, outputs and error or None if the job is unknown
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT status, inputs_hash, started, finished, outputs, error FROM jobs WHERE key = ?",
+                (_encode_key(key),),
+            ).fetchone()
+        if row is None:
+            return None
+        status, inputs_hash, started, finished, outputs, error = row
+        return {
+            "status": status,
+            "inputs_hash": inputs_hash,
+            "started": started,
+            "finished": finished,
+            "outputs": json.loads(outputs) if outputs is not None else [],
+            "error": error,
+        }
+
+    def is_done(self, key: Hashable, inputs_hash: str) -> bool:
+        """
+        Checks whether a job finished with the same inputs.
+
+        :param key: job key
+        :param inputs_hash: hash of the inputs of the job, see hash_inputs
+        :return: whether the job is done
+        """
+        record = self.get(key)
+        return record is not None and record["status"] == "done" and record["inputs_hash"] == inputs_hash
+
+    def start(self, key: Hashable, inputs_hash: str) -> None:
+        """
+        Marks a job as running.
+
+        :param key: job key
+        :param inputs_hash: hash of the inputs of the job
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO jobs (key, status, inputs_hash, started, finished, outputs, error) "
+                "VALUES (?, 'running', ?, ?, NULL, NULL, NULL)",
+                (_encode_key(key), inputs_hash, time.time()),
+            )
+
+    def finish(self, key: Hashable, outputs: Optional[list[str]] = None) -> None:
+        """
+        Marks a job as done.
+
+        :param key: job key
+        :param outputs: paths of the files the job wrote
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'done', finished = ?, outputs = ? WHERE key = ?",
+                (time.time(), json.dumps(outputs or []), _encode_key(key)),
+            )
+
+    def fail(self, key: Hashable, error: str) -> None:
+        """
+        Marks a job as failed.
+
+        :param key: job key
+        :param error: error message
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE key = ?",
+                (time.time(), error, _encode_key(key)),
+            )
+
+    def status_counts(self) -> dict[str, int]:
+        """
+        Counts the jobs per status.
+
+        :return: dictionary status -> number of jobs
+        """
+        with closing(self._connect()) as connection:
+            return dict(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def hash_inputs(inputs: dict[str, Any], cache: Optional[dict[int, str]] = None) -> str:
+    """
+    Hashes the inputs of a job. Drug response datasets are hashed by their content.
+
+    :param inputs: keyword arguments of the job
+    :param cache: optional dictionary id(dataset) -> hash to hash datasets shared by many jobs only once. The datasets
+        must not change while the cache is used.
+    :return: hex digest
+    """
+    sha = hashlib.sha256()
+    for name in sorted(inputs):
+        sha.update(name.encode("utf-8"))
+        sha.update(_hash_value(inputs[name], cache if cache is not None else {}).encode("utf-8"))
+    return sha.hexdigest()
+
+
+def _hash_value(value: Any, cache: dict[int, str]) -> str:
+    """
+    Hashes one input of a job.
+
+    :param value: input value
+    :param cache: dictionary id(dataset) -> hash
+    :return: hex digest for datasets, lists of datasets and callables, repr otherwise
+    """
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_hash_value(element, cache) for element in value) + "]"
+    if isinstance(value, DrugResponseDataset):
+        if id(value) not in cache:
+            sha = hashlib.sha256(str(value.dataset_name).encode("utf-8"))
+            # the ids, not the codes: the vocabularies of CV splits loaded from disk are ordered differently. The
+            # responses are rounded because the csv round trip of the splits can change the last bit.
+            sha.update(np.round(np.asarray(value.response, dtype=np.float64), 10).tobytes())
+            for ids in (value.cell_line_ids, value.drug_ids):
+                sha.update("\0".join(map(str, ids)).encode("utf-8"))
+            cache[id(value)] = sha.hexdigest()
+        return cache[id(value)]
+    if callable(value) and hasattr(value, "__qualname__"):
+        return f"{value.__module__}.{value.__qualname__}"
+    return repr(value)
+
+
+def track_jobs(
+    jobs: list[Job], manifest: JobManifest, untracked_inputs: frozenset[str] = frozenset()
+) -> tuple[list[Job], int]:
+    """
+    Drops the jobs that are done according to the manifest and wraps the others, so that they record their progress.
+
+    Dependencies on dropped jobs are removed because their results already exist.
+    :param jobs: the jobs, their functions return the paths of the files they wrote
+    :param manifest: the manifest
+    :param untracked_inputs: keyword arguments that do not change the results, e.g., the number of parallel workers
+    :return: the jobs to run and the number of dropped jobs
+    """
+    cache: dict[int, str] = {}
+    tracked_jobs = []
+    done = set()
+    for job in jobs:
+        inputs_hash = hash_inputs(
+            {name: value for name, value in job.kwargs.items() if name not in untracked_inputs}, cache=cache
+        )
+        # dependencies that are run again invalidate the job
+        if manifest.is_done(job.key, inputs_hash) and all(key in done for key in job.depends_on):
+            done.add(job.key)
+            continue
+        tracked_jobs.append(
+            Job(
+                key=job.key,
+                function=run_tracked,
+                kwargs={
+                    "manifest": manifest,
+                    "key": job.key,
+                    "inputs_hash": inputs_hash,
+                    "function": job.function,
+                    "kwargs": job.kwargs,
+                },
+                depends_on=tuple(key for key in job.depends_on if key not in done),
+            )
+        )
+    return tracked_jobs, len(done)
+
+
+def run_tracked(
+    manifest: JobManifest, key: Hashable, inputs_hash: str, function: Callable, kwargs: dict[str, Any]
+) -> Any:
+    """
+    Runs a job function and records its status in the manifest.
+
+    Files of a previous run of the job with different inputs are deleted first, so that the function does not skip
+    them as already computed.
+    :param manifest: the manifest
+    :param key: job key
+    :param inputs_hash: hash of the inputs of the job
+    :param function: job function, returns the paths of the files it wrote
+    :param kwargs: keyword arguments of the function
+    :return: the return value of the function
+    :raises Exception: the exception of the function, after the job is marked as failed
+    """
+    record = manifest.get(key)
+    if record is not None and record["inputs_hash"] != inputs_hash:
+        for path in record["outputs"]:
+            if os.path.isfile(path):
+                os.remove(path)
+    manifest.start(key, inputs_hash)
+    try:
+        outputs = function(**kwargs)
+    except BaseException as exc:
+        manifest.fail(key, repr(exc))
+        raise
+    manifest.finish(key, outputs=outputs)
+    return outputs
+
+
+def _encode_key(key: Hashable) -> str:
+    """
+    Encodes a job key, e.g., a tuple (model_name, drug_id, split_index, stage), as a string.
+
+    :param key: job key
+    :return: json string
+    """
+    return json.dumps(list(key) if isinstance(key, tuple) else key)
@@ -1,3 +1,4 @@
+import torch
 import torch.optim as optim
 from torch.utils.data import DataLoader
 import time
@@ -13,6 +14,7 @@ import joblib
 
 from .Model import *
 from .Data import *
+from ..utils import load_model_config, save_model_config
 
 class DIPK_Model(DRPModel):
     
@@ -20,7 +22,13 @@ class DIPK_Model(DRPModel):
     cell_line_views = ["gene_expression_features", "biological_network_features"]
     drug_views = ["drug_feature_embedding"]
 
+    def __init__(self):
+        super().__init__()
+        self.model = None
+        self.hyperparameters = None
+
     def build_model(self, hyperparameters: Dict[str, Any], *args, **kwargs):
+        self.hyperparameters = hyperparameters
         self.DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = Predictor(hyperparameters["embedding_dim"], hyperparameters["heads"], hyperparameters["fc_layer_num"], hyperparameters["fc_layer_dim"], hyperparameters["dropout_rate"]).to(self.DEVICE)
         self.EPOCHS = hyperparameters["EPOCHS"]
@@ -84,6 +92,24 @@ class DIPK_Model(DRPModel):
                
         return test_pre
         
+    def save(self, path):
+        """
+        Saves the hyperparameters and the weights of the predictor.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        save_model_config(path, {"hyperparameters": self.hyperparameters})
+        torch.save(self.model.state_dict(), os.path.join(path, "model.pt"))
+
+    def load(self, path):
+        """
+        Loads the model saved with save.
+
+        :param path: directory of the saved model
+        """
+        self.build_model(load_model_config(path)["hyperparameters"])
+        self.model.load_state_dict(torch.load(os.path.join(path, "model.pt"), map_location=self.DEVICE))
+
     def load_cell_line_features(self, data_path: str, dataset_name: str) -> FeatureDataset:
          
         return load_expression_and_network_features(
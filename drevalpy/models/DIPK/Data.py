@@ -6,26 +6,74 @@ from torch_geometric.data import Batch
 from torch_geometric.data import Data
 from torch_geometric.data import Dataset
 from drevalpy.datasets.dataset import DrugResponseDataset, FeatureDataset
+from drevalpy.datasets.feature_cache import get_source_key, load_cached_arrays, load_cached_table
+from drevalpy.datasets.feature_registry import FEATURE_REGISTRY
 import os
 
 import numpy as np
 import pandas as pd
 
-def load_expression_and_network_features(feature_type1: str, feature_type2: str, data_path: str, dataset_name: str) -> FeatureDataset:
-    expression = pd.read_csv(f"{data_path}/{dataset_name}/DIPK_features/GEF.csv", index_col=0)
-    network = pd.read_csv(f"{data_path}/{dataset_name}/DIPK_features/BNF.csv", index_col=0, sep='\t')
 
-    return FeatureDataset(
-        features={celllines: {feature_type1: np.array(expression.loc[celllines].values.astype(float)), feature_type2: np.array(network.loc[celllines].values.astype(float))} for celllines in expression.index}
+def _load_expression_and_network_features(
+    feature_type1: str, feature_type2: str, data_path: str, dataset_name: str
+) -> FeatureDataset:
+    expression_path = f"{data_path}/{dataset_name}/DIPK_features/GEF.csv"
+    network_path = f"{data_path}/{dataset_name}/DIPK_features/BNF.csv"
+    cell_lines, _, expression = load_cached_table(
+        data_path=data_path, dataset_name=dataset_name, name="DIPK_GEF", sources=[expression_path],
+        build=lambda: pd.read_csv(expression_path, index_col=0),
+    )
+    network_cell_lines, _, network = load_cached_table(
+        data_path=data_path, dataset_name=dataset_name, name="DIPK_BNF", sources=[network_path],
+        build=lambda: pd.read_csv(network_path, index_col=0, sep='\t'),
+    )
+    network_rows = pd.Index(network_cell_lines).get_indexer(cell_lines)
+    if np.any(network_rows < 0):
+        raise KeyError(
+            f"Cell lines {list(cell_lines[network_rows < 0])} are missing from the biological network features."
+        )
+
+    return FeatureDataset.from_matrices(
+        identifiers=cell_lines, matrices={feature_type1: expression, feature_type2: network[network_rows]}
+    )
+
+
+def load_expression_and_network_features(feature_type1: str, feature_type2: str, data_path: str, dataset_name: str) -> FeatureDataset:
+    sources = [f"{data_path}/{dataset_name}/DIPK_features/GEF.csv", f"{data_path}/{dataset_name}/DIPK_features/BNF.csv"]
+    return FEATURE_REGISTRY.get_or_load(
+        key=(
+            "load_expression_and_network_features",
+            dataset_name,
+            None,
+            (feature_type1, feature_type2),
+            get_source_key(sources),
+        ),
+        load=lambda: _load_expression_and_network_features(feature_type1, feature_type2, data_path, dataset_name),
     )
 
+
 def load_drug_feature_from_MolGNet(feature_type: str, feature_subtype1: str, feature_subtype2: str, feature_subtype3: str, data_path: str, dataset_name: str) -> FeatureDataset:
     drug_list = os.listdir(f"{data_path}/{dataset_name}/DIPK_features/Drugs")
-    
+
+    def read_drug(drug: str) -> dict:
+        drug_path = f"{data_path}/{dataset_name}/DIPK_features/Drugs/{drug}"
+        sources = {
+            feature_subtype1: f"{drug_path}/MolGNet_{drug}.csv",
+            feature_subtype2: f"{drug_path}/Edge_Index_{drug}.csv",
+            feature_subtype3: f"{drug_path}/Edge_Attr_{drug}.csv",
+        }
+        return load_cached_arrays(
+            data_path=data_path, dataset_name=dataset_name, name=f"DIPK_drug_{drug}", sources=list(sources.values()),
+            build=lambda: {
+                subtype: np.array(pd.read_csv(source, index_col=0, sep='\t')) for subtype, source in sources.items()
+            },
+        )
+
     return FeatureDataset(
-        features={drugs: {feature_type: {feature_subtype1: np.array(pd.read_csv(f"{data_path}/{dataset_name}/DIPK_features/Drugs/{drugs}/MolGNet_{drugs}.csv", index_col=0, sep='\t')), feature_subtype2: np.array(pd.read_csv(f"{data_path}/{dataset_name}/DIPK_features/Drugs/{drugs}/Edge_Index_{drugs}.csv", index_col=0, sep='\t')), feature_subtype3: np.array(pd.read_csv(f"{data_path}/{dataset_name}/DIPK_features/Drugs/{drugs}/Edge_Attr_{drugs}.csv", index_col=0, sep='\t'))}} for drugs in drug_list}
+        features={drugs: {feature_type: read_drug(drugs)} for drugs in drug_list}
     )
 
+
 def GetTestData(cell_id, drug_id, cell_line_features, drug_features):
     
     Cell = cell_id
@@ -43,6 +91,7 @@ def GetTestData(cell_id, drug_id, cell_line_features, drug_features):
 
     return Graph
  
+
 def GetTrainData(cell_id, drug_id, ic50, cell_line_features, drug_features):    
     
     Cell = cell_id
@@ -62,6 +111,7 @@ def GetTrainData(cell_id, drug_id, ic50, cell_line_features, drug_features):
 
     return Graph
 
+
 class CollateFn_Train:
     def __init__(self, follow_batch=None, exclude_keys=None):
         self.follow_batch = follow_batch
@@ -75,6 +125,7 @@ class CollateFn_Train:
         
         return pyg_batch, GeneFt, BionicFt
     
+
 class CollateFn_Test:
     def __init__(self, follow_batch=None, exclude_keys=None):
         self.follow_batch = follow_batch
@@ -88,6 +139,7 @@ class CollateFn_Test:
         
         return pyg_batch, GeneFt, BionicFt
  
+
 class MyDataSet(Dataset, ABC):
     def __init__(self, graphs):
         self._graphs = graphs
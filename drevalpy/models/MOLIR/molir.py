@@ -5,15 +5,19 @@ Code adapted from their Github: https://github.com/hosseinshn/MOLI
 and Hauptmann et al. (2023, 10.1186/s12859-023-05166-7) https://github.com/kramerlab/Multi-Omics_analysis
 """
 
+import os
 from typing import Any, Optional
 
+import joblib
 import numpy as np
+import torch
 from sklearn.feature_selection import VarianceThreshold
+from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import StandardScaler
 
 from ...datasets.dataset import DrugResponseDataset, FeatureDataset
 from ..drp_model import SingleDrugModel
-from ..utils import load_and_reduce_gene_features
+from ..utils import load_and_reduce_gene_features, load_model_config, save_model_config
 from .utils import MOLIModel, get_dimensions_of_omics_data
 
 
@@ -37,6 +41,7 @@ class MOLIR(SingleDrugModel):
         super().__init__()
         self.model = None
         self.hyperparameters = None
+        self.gene_expression_transformer = None
 
     def build_model(self, hyperparameters: dict[str, Any]) -> None:
         """
@@ -51,17 +56,13 @@ class MOLIR(SingleDrugModel):
         drug_input: Optional[FeatureDataset] = None,
         output_earlystopping: Optional[DrugResponseDataset] = None,
     ) -> None:
-        selector_gex = VarianceThreshold(0.05)
-        cell_line_input.fit_transform_features(
+        # the transformation is fitted on a copy of the features, predict applies it to the prediction inputs
+        self.gene_expression_transformer = make_pipeline(VarianceThreshold(0.05), StandardScaler())
+        cell_line_input = cell_line_input.fit_transform_features(
             train_ids=np.unique(output.cell_line_ids),
-            transformer=selector_gex,
-            view="gene_expression",
-        )
-        scaler_gex = StandardScaler()
-        cell_line_input.fit_transform_features(
-            train_ids=np.unique(output.cell_line_ids),
-            transformer=scaler_gex,
+            transformer=self.gene_expression_transformer,
             view="gene_expression",
+            inplace=False,
         )
         if self.early_stopping and len(output_earlystopping) < 2:
             output_earlystopping = None
@@ -91,7 +92,7 @@ class MOLIR(SingleDrugModel):
             cell_line_input=cell_line_input,
             drug_input=drug_input,
         )
-        gene_expression = input_data["gene_expression"]
+        gene_expression = self.gene_expression_transformer.transform(input_data["gene_expression"])
         mutations = input_data["mutations"]
         cnvs = input_data["copy_number_variation_gistic"]
         return self.model.predict(gene_expression, mutations, cnvs)
@@ -104,7 +105,7 @@ class MOLIR(SingleDrugModel):
             dataset_name=dataset_name,
         )
         # log transformation
-        all_data._apply(function=np.log, view="gene_expression")
+        all_data._apply(function=np.log, view="gene_expression", batched=True)
         # in Toy_Data, everything is already in the dataset
         # TODO: implement this in models/utils.py
         mut_data = load_and_reduce_gene_features(
@@ -124,7 +125,25 @@ class MOLIR(SingleDrugModel):
         return all_data
 
     def load(self, path):
-        raise NotImplementedError
+        """
+        Loads the model saved with save.
+
+        :param path: directory of the saved model
+        """
+        config = load_model_config(path)
+        self.hyperparameters = config["hyperparameters"]
+        self.model = MOLIModel(hpams=self.hyperparameters, **config["input_dims"])
+        self.model.load_state_dict(torch.load(os.path.join(path, "model.pt"), map_location="cpu"))
+        self.gene_expression_transformer = joblib.load(os.path.join(path, "gene_expression_transformer.joblib"))
 
     def save(self, path):
-        raise NotImplementedError
+        """
+        Saves the hyperparameters, the weights of the best checkpoint and the fitted gene expression transformation.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        best_model = self.model.get_best_model()
+        input_dims = {name: best_model.hparams[name] for name in ("input_dim_expr", "input_dim_mut", "input_dim_cnv")}
+        save_model_config(path, {"hyperparameters": self.hyperparameters, "input_dims": input_dims})
+        torch.save(best_model.state_dict(), os.path.join(path, "model.pt"))
+        joblib.dump(self.gene_expression_transformer, os.path.join(path, "gene_expression_transformer.joblib"))
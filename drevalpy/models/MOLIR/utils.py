@@ -96,8 +96,9 @@ def make_ranges(output: DrugResponseDataset) -> tuple[float, float]:
     """
     Compute the positive and negative range for the triplet loss.
     """
-    positive_range = np.std(output.response) * 0.1
-    negative_range = np.std(output.response)
+    # python floats, numpy scalars in the hyperparameters of a checkpoint cannot be loaded with weights_only
+    positive_range = float(np.std(output.response) * 0.1)
+    negative_range = float(np.std(output.response))
     return positive_range, negative_range
 
 
@@ -248,11 +249,7 @@ class MOLIModel(pl.LightningModule):
         """
         Perform prediction on given input data.
         """
-        # load best model
-        if self.checkpoint_callback.best_model_path:
-            best_model = MOLIModel.load_from_checkpoint(self.checkpoint_callback.best_model_path)
-        else:
-            best_model = self
+        best_model = self.get_best_model()
         # convert to torch tensors
         gene_expression = torch.from_numpy(gene_expression).float().to(best_model.device)
         mutations = torch.from_numpy(mutations).float().to(best_model.device)
@@ -263,6 +260,15 @@ class MOLIModel(pl.LightningModule):
             preds = best_model.regressor(z)
         return preds.squeeze().cpu().detach().numpy()
 
+    def get_best_model(self) -> "MOLIModel":
+        """
+        Returns the model with the best checkpoint of the training or this model if there is no checkpoint, e.g.,
+        because it was loaded from a state dict.
+        """
+        if self.checkpoint_callback is not None and self.checkpoint_callback.best_model_path:
+            return MOLIModel.load_from_checkpoint(self.checkpoint_callback.best_model_path)
+        return self
+
     def encode_and_concatenate(
         self, gene_expression: torch.Tensor, mutations: torch.Tensor, copy_number: torch.Tensor
     ) -> torch.Tensor:
@@ -1,3 +1,5 @@
+import os
+
 import numpy as np
 import pandas as pd
 from numpy.typing import ArrayLike
@@ -229,16 +231,25 @@ class SRMF(DRPModel):
 
     def load(self, path):
         """
-        Loads the model from a given path.
+        Loads the latent factors of the drugs and cell lines from a given path.
 
-        :param path: Path to the model
+        :param path: directory of the saved model
         """
-        raise NotImplementedError("SRMF does not support loading yet ...")
+        with np.load(os.path.join(path, "model.npz")) as arrays:
+            self.best_u = pd.DataFrame(arrays["best_u"], index=arrays["drug_ids"])
+            self.best_v = pd.DataFrame(arrays["best_v"], index=arrays["cell_line_ids"])
 
     def save(self, path):
         """
-        Saves the model to a given path.
+        Saves the latent factors of the drugs and cell lines to a given path.
 
-        :param path: Path to save the model
+        :param path: directory to save the model to, created if it does not exist
         """
-        raise NotImplementedError("SRMF does not support saving yet ...")
+        os.makedirs(path, exist_ok=True)
+        np.savez(
+            os.path.join(path, "model.npz"),
+            best_u=self.best_u.to_numpy(),
+            drug_ids=self.best_u.index.to_numpy(dtype=str),
+            best_v=self.best_v.to_numpy(),
+            cell_line_ids=self.best_v.index.to_numpy(dtype=str),
+        )
@@ -5,15 +5,18 @@ Code adapted from their Github: https://github.com/DMCB-GIST/Super.FELT
 and Hauptmann et al. (2023, 10.1186/s12859-023-05166-7) https://github.com/kramerlab/Multi-Omics_analysis
 """
 
+import os
 from typing import Optional
 
+import joblib
 import numpy as np
+import torch
 from sklearn.feature_selection import VarianceThreshold
 
 from ...datasets.dataset import DrugResponseDataset, FeatureDataset
 from ..drp_model import SingleDrugModel
 from ..MOLIR.utils import get_dimensions_of_omics_data, make_ranges
-from ..utils import load_and_reduce_gene_features
+from ..utils import load_and_reduce_gene_features, load_model_config, save_model_config
 from .utils import SuperFELTEncoder, SuperFELTRegressor, train_superfeltr_model
 
 
@@ -42,6 +45,7 @@ class SuperFELTR(SingleDrugModel):
         self.hyperparameters = None
         self.ranges = None
         self.best_checkpoint = None
+        self.feature_selectors = None
 
     def build_model(self, hyperparameters):
         """
@@ -90,14 +94,7 @@ class SuperFELTR(SingleDrugModel):
             encoders["copy_number_variation_gistic"],
         )
 
-        self.regressor = SuperFELTRegressor(
-            input_size=self.hyperparameters["out_dim_expr_encoder"]
-            + self.hyperparameters["out_dim_mutation_encoder"]
-            + self.hyperparameters["out_dim_cnv_encoder"],
-            hpams=self.hyperparameters,
-            encoders=(self.expr_encoder, self.mut_encoder, self.cnv_encoder),
-            ranges=self.ranges,
-        )
+        self.regressor = self._make_regressor()
         self.best_checkpoint = train_superfeltr_model(
             model=self.regressor,
             hpams=self.hyperparameters,
@@ -106,6 +103,38 @@ class SuperFELTR(SingleDrugModel):
             output_earlystopping=output_earlystopping,
             patience=5,
         )
+        # load the best regressor once instead of in every call of predict
+        self.regressor = SuperFELTRegressor.load_from_checkpoint(
+            self.best_checkpoint.best_model_path,
+            input_size=self._get_regressor_input_size(),
+            hpams=self.hyperparameters,
+            encoders=(self.expr_encoder, self.mut_encoder, self.cnv_encoder),
+            ranges=self.ranges,
+        )
+
+    def _get_regressor_input_size(self) -> int:
+        """
+        Returns the input size of the regressor, the sum of the output sizes of the encoders.
+
+        :return: input size
+        """
+        return sum(
+            self.hyperparameters[key]
+            for key in ("out_dim_expr_encoder", "out_dim_mutation_encoder", "out_dim_cnv_encoder")
+        )
+
+    def _make_regressor(self) -> SuperFELTRegressor:
+        """
+        Creates an untrained regressor on top of the encoders.
+
+        :return: the regressor
+        """
+        return SuperFELTRegressor(
+            input_size=self._get_regressor_input_size(),
+            hpams=self.hyperparameters,
+            encoders=(self.expr_encoder, self.mut_encoder, self.cnv_encoder),
+            ranges=self.ranges,
+        )
 
     def predict(
         self,
@@ -124,34 +153,25 @@ class SuperFELTR(SingleDrugModel):
             drug_input=drug_input,
         )
         gene_expression, mutations, cnvs = (
-            input_data["gene_expression"],
-            input_data["mutations"],
-            input_data["copy_number_variation_gistic"],
-        )
-        best_regressor = SuperFELTRegressor.load_from_checkpoint(
-            self.best_checkpoint.best_model_path,
-            input_size=self.hyperparameters["out_dim_expr_encoder"]
-            + self.hyperparameters["out_dim_mutation_encoder"]
-            + self.hyperparameters["out_dim_cnv_encoder"],
-            hpams=self.hyperparameters,
-            encoders=(self.expr_encoder, self.mut_encoder, self.cnv_encoder),
-            ranges=self.ranges,
+            self.feature_selectors[view].transform(input_data[view]) for view in self.cell_line_views
         )
-        return best_regressor.predict(gene_expression, mutations, cnvs)
+        return self.regressor.predict(gene_expression, mutations, cnvs)
 
     def feature_selection(self, output: DrugResponseDataset, cell_line_input: FeatureDataset) -> FeatureDataset:
         """
-        Feature selection for all omics data.
+        Feature selection for all omics data. The selection is applied to a copy of the features and stored for
+        predict.
         """
         thresholds = {
             "gene_expression": self.hyperparameters["expression_var_threshold"][output.dataset_name],
             "mutations": self.hyperparameters["mutation_var_threshold"][output.dataset_name],
             "copy_number_variation_gistic": self.hyperparameters["cnv_var_threshold"][output.dataset_name],
         }
+        cell_line_input = cell_line_input.copy()
+        self.feature_selectors = {}
         for view in self.cell_line_views:
-            selector = VarianceThreshold(thresholds[view])
-            cell_line_input.fit_transform_features(
-                train_ids=np.unique(output.cell_line_ids), transformer=selector, view=view
+            self.feature_selectors[view] = cell_line_input.fit_transform_features(
+                train_ids=np.unique(output.cell_line_ids), transformer=VarianceThreshold(thresholds[view]), view=view
             )
         return cell_line_input
 
@@ -163,7 +183,7 @@ class SuperFELTR(SingleDrugModel):
             dataset_name=dataset_name,
         )
         # log transformation
-        all_data._apply(function=np.log, view="gene_expression")
+        all_data._apply(function=np.log, view="gene_expression", batched=True)
         feature_types = ["mutations", "copy_number_variation_gistic"]
         # in Toy_Data, everything is already in the dataset
         # TODO: implement this in models/utils.py
@@ -175,7 +195,43 @@ class SuperFELTR(SingleDrugModel):
         return all_data
 
     def load(self, path):
-        raise NotImplementedError
+        """
+        Loads the model saved with save.
+
+        :param path: directory of the saved model
+        """
+        config = load_model_config(path)
+        self.hyperparameters = config["hyperparameters"]
+        self.ranges = tuple(config["ranges"])
+        encoders = []
+        for omic_type, input_size in config["encoder_input_sizes"].items():
+            encoder = SuperFELTEncoder(
+                input_size=input_size, hpams=self.hyperparameters, omic_type=omic_type, ranges=self.ranges
+            )
+            encoder.load_state_dict(torch.load(os.path.join(path, f"encoder_{omic_type}.pt"), map_location="cpu"))
+            encoders.append(encoder)
+        self.expr_encoder, self.mut_encoder, self.cnv_encoder = encoders
+        self.regressor = self._make_regressor()
+        self.regressor.load_state_dict(torch.load(os.path.join(path, "regressor.pt"), map_location="cpu"))
+        self.feature_selectors = joblib.load(os.path.join(path, "feature_selectors.joblib"))
 
     def save(self, path):
-        raise NotImplementedError
+        """
+        Saves the hyperparameters, the weights of the encoders and of the best regressor and the fitted feature
+        selection.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        encoders = (self.expr_encoder, self.mut_encoder, self.cnv_encoder)
+        save_model_config(
+            path,
+            {
+                "hyperparameters": self.hyperparameters,
+                "ranges": list(self.ranges),
+                "encoder_input_sizes": {encoder.omic_type: encoder.hparams["input_size"] for encoder in encoders},
+            },
+        )
+        for encoder in encoders:
+            torch.save(encoder.state_dict(), os.path.join(path, f"encoder_{encoder.omic_type}.pt"))
+        torch.save(self.regressor.state_dict(), os.path.join(path, "regressor.pt"))
+        joblib.dump(self.feature_selectors, os.path.join(path, "feature_selectors.joblib"))
@@ -6,6 +6,7 @@ __all__ = [
     "NaivePredictor",
     "NaiveDrugMeanPredictor",
     "NaiveCellLineMeanPredictor",
+    "NaiveMeanEffectsPredictor",
     "ElasticNetModel",
     "RandomForest",
     "SVMRegressor",
@@ -13,6 +14,7 @@ __all__ = [
     "MultiOmicsNeuralNetwork",
     "MultiOmicsRandomForest",
     "SingleDrugRandomForest",
+    "MultiOutputRandomForest",
     "SRMF",
     "GradientBoosting",
     "MOLIR",
@@ -24,7 +26,13 @@ __all__ = [
 ]
 
 from .baselines.multi_omics_random_forest import MultiOmicsRandomForest
-from .baselines.naive_pred import NaiveCellLineMeanPredictor, NaiveDrugMeanPredictor, NaivePredictor
+from .baselines.multi_output_random_forest import MultiOutputRandomForest
+from .baselines.naive_pred import (
+    NaiveCellLineMeanPredictor,
+    NaiveDrugMeanPredictor,
+    NaiveMeanEffectsPredictor,
+    NaivePredictor,
+)
 from .baselines.singledrug_random_forest import SingleDrugRandomForest
 from .baselines.sklearn_models import ElasticNetModel, GradientBoosting, RandomForest, SVMRegressor
 from .MOLIR.molir import MOLIR
@@ -44,12 +52,14 @@ MULTI_DRUG_MODEL_FACTORY = {
     "NaivePredictor": NaivePredictor,
     "NaiveDrugMeanPredictor": NaiveDrugMeanPredictor,
     "NaiveCellLineMeanPredictor": NaiveCellLineMeanPredictor,
+    "NaiveMeanEffectsPredictor": NaiveMeanEffectsPredictor,
     "ElasticNet": ElasticNetModel,
     "RandomForest": RandomForest,
     "SVR": SVMRegressor,
     "SimpleNeuralNetwork": SimpleNeuralNetwork,
     "MultiOmicsNeuralNetwork": MultiOmicsNeuralNetwork,
     "MultiOmicsRandomForest": MultiOmicsRandomForest,
+    "MultiOutputRandomForest": MultiOutputRandomForest,
     "GradientBoosting": GradientBoosting,
     "SRMF": SRMF,
     "DIPK": DIPK_Model,
@@ -2,6 +2,9 @@
 Contains the Multi-OMICS Random Forest model.
 """
 
+import os
+
+import joblib
 import numpy as np
 from numpy.typing import ArrayLike
 from sklearn.decomposition import PCA
@@ -37,6 +40,24 @@ class MultiOmicsRandomForest(RandomForest):
         super().build_model(hyperparameters)
         self.pca = PCA(n_components=hyperparameters["n_components"])
 
+    def save(self, path):
+        """
+        Saves the fitted random forest and the PCA of the methylation features.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        super().save(path)
+        joblib.dump(self.pca, os.path.join(path, "pca.joblib"))
+
+    def load(self, path):
+        """
+        Loads the fitted random forest and the PCA of the methylation features.
+
+        :param path: directory of the saved model
+        """
+        super().load(path)
+        self.pca = joblib.load(os.path.join(path, "pca.joblib"))
+
     def load_cell_line_features(self, data_path: str, dataset_name: str) -> FeatureDataset:
         """
         Loads the cell line features.
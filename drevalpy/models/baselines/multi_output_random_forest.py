@@ -0,0 +1,149 @@
+"""
+Contains the MultiOutputRandomForest class, a RandomForest that uses only gene expression features and predicts the
+response of all drugs at once.
+
+SingleDrugRandomForest fits one forest per drug on the same cell line features. MultiOutputRandomForest fits one
+multi-output forest on the cell line x drug response matrix instead: every split is chosen for all drugs together and
+every fold needs only one fit. The forest cannot fit missing entries of the matrix, so they are filled with the mean
+response of their drug. The more responses of a drug are missing, the more its predictions are biased toward its mean.
+"""
+
+import os
+import warnings
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from numpy.typing import ArrayLike
+
+from drevalpy.datasets.dataset import DrugResponseDataset, FeatureDataset
+
+from .sklearn_models import RandomForest
+
+
+class MultiOutputRandomForest(RandomForest):
+    """
+    RandomForest with one output per drug, trained on the cell line x drug response matrix.
+    """
+
+    cell_line_views = ["gene_expression"]
+    drug_views = []
+    model_name = "MultiOutputRandomForest"
+
+    def __init__(self):
+        super().__init__()
+        self.drug_ids = None
+
+    def train(
+        self,
+        output: DrugResponseDataset,
+        cell_line_input: FeatureDataset,
+        drug_input=None,
+        output_earlystopping=None,
+    ) -> None:
+        """
+        Trains the model on the response matrix of the training cell lines and drugs.
+
+        Replicates of a cell line-drug pair are averaged. The forest cannot fit missing entries of the matrix, they are
+        set to the mean response of the drug. This is not a masked objective: the filled entries are fitted like
+        observed ones and pull the predictions of the drug toward its mean.
+        :param output: training dataset containing the response output
+        :param cell_line_input: training dataset containing gene expression data
+        :param drug_input: not needed
+        :param output_earlystopping: not needed
+        """
+        cell_line_rows, cell_line_ids = pd.factorize(np.asarray(output.cell_line_ids))
+        drug_columns, drug_ids = pd.factorize(np.asarray(output.drug_ids))
+        response_matrix = _response_matrix(
+            response=output.response,
+            rows=cell_line_rows,
+            columns=drug_columns,
+            shape=(len(cell_line_ids), len(drug_ids)),
+        )
+        x = cell_line_input.get_feature_matrix(view="gene_expression", identifiers=cell_line_ids)
+        self.model.fit(x.astype(self.feature_dtype, copy=False), response_matrix)
+        self.drug_ids = np.asarray(drug_ids)
+
+    def predict(
+        self,
+        drug_ids: ArrayLike,
+        cell_line_ids: ArrayLike,
+        drug_input: Optional[FeatureDataset] = None,
+        cell_line_input: FeatureDataset = None,
+    ) -> np.ndarray:
+        """
+        Predicts the responses of all drugs once per unique cell line and selects the requested drugs.
+
+        Drugs that were not in the training set get the mean prediction over all drugs of their cell line.
+        :param drug_ids: drug ids
+        :param cell_line_ids: cell line ids
+        :param drug_input: not needed
+        :param cell_line_input: gene expression data
+        :return: predicted response
+        """
+        cell_line_rows, unique_cell_line_ids = pd.factorize(np.asarray(cell_line_ids))
+        x = cell_line_input.get_feature_matrix(view="gene_expression", identifiers=unique_cell_line_ids)
+        drug_predictions = self.model.predict(x.astype(self.feature_dtype, copy=False))
+        drug_predictions = drug_predictions.reshape(len(unique_cell_line_ids), len(self.drug_ids))
+
+        drug_columns = pd.Index(self.drug_ids).get_indexer(np.asarray(drug_ids))
+        known = drug_columns >= 0
+        if not np.all(known):
+            warnings.warn(
+                "MultiOutputRandomForest: Some drugs were not in the training set. Their prediction is the mean "
+                "prediction over all drugs.",
+                stacklevel=2,
+            )
+        return np.where(
+            known,
+            drug_predictions[cell_line_rows, np.maximum(drug_columns, 0)],
+            drug_predictions.mean(axis=1)[cell_line_rows],
+        )
+
+    def save(self, path):
+        """
+        Saves the fitted forest and the drugs of its outputs.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        super().save(path)
+        np.savez(os.path.join(path, "drugs.npz"), drug_ids=self.drug_ids.astype(str))
+
+    def load(self, path):
+        """
+        Loads the fitted forest and the drugs of its outputs.
+
+        :param path: directory of the saved model
+        """
+        super().load(path)
+        with np.load(os.path.join(path, "drugs.npz")) as arrays:
+            self.drug_ids = arrays["drug_ids"]
+
+    def load_drug_features(self, data_path: str, dataset_name: str) -> Optional[FeatureDataset]:
+        """
+        The model does not use drug features.
+
+        :param data_path: not needed
+        :param dataset_name: not needed
+        :return: None
+        """
+        return None
+
+
+def _response_matrix(response: np.ndarray, rows: np.ndarray, columns: np.ndarray, shape: tuple[int, int]) -> np.ndarray:
+    """
+    Builds the response matrix of the pairs. Replicates are averaged, missing entries are set to the column mean.
+
+    :param response: response of the pairs
+    :param rows: row of every pair
+    :param columns: column of every pair
+    :param shape: shape of the matrix
+    :return: the response matrix
+    """
+    sums = np.zeros(shape)
+    counts = np.zeros(shape)
+    np.add.at(sums, (rows, columns), response)
+    np.add.at(counts, (rows, columns), 1)
+    column_means = np.bincount(columns, weights=response, minlength=shape[1]) / np.bincount(columns, minlength=shape[1])
+    observed = counts > 0
+    return np.where(observed, sums / np.where(observed, counts, 1), column_means[None, :])
@@ -2,15 +2,19 @@
 Describes the naive predictor models. The naive predictor models are simple models that predict
 the mean of the response values. The NaivePredictor predicts the overall mean of the response,
 the NaiveCellLineMeanPredictor predicts the mean of the response per cell line, and the
-NaiveDrugMeanPredictor predicts the mean of the response per drug.
+NaiveDrugMeanPredictor predicts the mean of the response per drug. The NaiveMeanEffectsPredictor adds the drug and
+the cell line effects, i.e., their means minus the overall mean, to the overall mean.
 """
 
+import os
+
 import numpy as np
+import pandas as pd
 from numpy.typing import ArrayLike
 
 from drevalpy.datasets.dataset import DrugResponseDataset, FeatureDataset
 from drevalpy.models.drp_model import DRPModel
-from drevalpy.models.utils import load_cl_ids_from_csv, load_drug_ids_from_csv, unique
+from drevalpy.models.utils import load_cl_ids_from_csv, load_drug_ids_from_csv
 
 
 class NaivePredictor(DRPModel):
@@ -63,10 +67,22 @@ class NaivePredictor(DRPModel):
         return np.full(cell_line_ids.shape[0], self.dataset_mean)
 
     def save(self, path):
-        raise NotImplementedError("Naive predictor does not support saving yet ...")
+        """
+        Saves the dataset mean.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        os.makedirs(path, exist_ok=True)
+        np.savez(os.path.join(path, "model.npz"), dataset_mean=self.dataset_mean)
 
     def load(self, path):
-        raise NotImplementedError("Naive predictor does not support loading yet ...")
+        """
+        Loads the dataset mean.
+
+        :param path: directory of the saved model
+        """
+        with np.load(os.path.join(path, "model.npz")) as arrays:
+            self.dataset_mean = arrays["dataset_mean"].item()
 
     def load_cell_line_features(self, data_path: str, dataset_name: str) -> FeatureDataset:
         return load_cl_ids_from_csv(data_path, dataset_name)
@@ -103,19 +119,12 @@ class NaiveDrugMeanPredictor(DRPModel):
         Computes the mean per drug. If - later on - the drug is not in the training set,
         the overall mean is used.
         :param output: training dataset containing the response output
-        :param drug_input: drug id
+        :param drug_input: not needed
         :param cell_line_input: not needed
         :param output_earlystopping: not needed
         """
-        drug_ids = drug_input.get_feature_matrix(view="drug_id", identifiers=output.drug_ids)
         self.dataset_mean = np.mean(output.response)
-        self.drug_means = {}
-
-        for drug_response, drug_feature in zip(unique(output.drug_ids), unique(drug_ids), strict=True):
-            responses_drug = output.response[drug_feature == output.drug_ids]
-            if len(responses_drug) > 0:
-                # prevent nan response
-                self.drug_means[drug_response] = np.mean(responses_drug)
+        self.drug_means = _group_means(output.drug_ids, output.response)
 
     def predict(
         self,
@@ -133,7 +142,7 @@ class NaiveDrugMeanPredictor(DRPModel):
         :param cell_line_input: not needed
         :return: array of the same length as the input drug_id containing the drug mean
         """
-        return np.array([self.predict_drug(drug) for drug in drug_ids])
+        return _lookup_means(self.drug_means, drug_ids, default=self.dataset_mean)
 
     def predict_drug(self, drug_id: str):
         """
@@ -147,10 +156,28 @@ class NaiveDrugMeanPredictor(DRPModel):
         return self.dataset_mean
 
     def save(self, path):
-        raise NotImplementedError("Naive predictor does not support saving yet ...")
+        """
+        Saves the drug means and the dataset mean.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        os.makedirs(path, exist_ok=True)
+        np.savez(
+            os.path.join(path, "model.npz"),
+            dataset_mean=self.dataset_mean,
+            drug_ids=np.array(list(self.drug_means), dtype=str),
+            drug_means=np.array(list(self.drug_means.values()), dtype=float),
+        )
 
     def load(self, path):
-        raise NotImplementedError("Naive predictor does not support loading yet ...")
+        """
+        Loads the drug means and the dataset mean.
+
+        :param path: directory of the saved model
+        """
+        with np.load(os.path.join(path, "model.npz")) as arrays:
+            self.dataset_mean = arrays["dataset_mean"].item()
+            self.drug_means = dict(zip(arrays["drug_ids"].tolist(), arrays["drug_means"].tolist(), strict=True))
 
     def load_cell_line_features(self, data_path: str, dataset_name: str) -> FeatureDataset:
         return load_cl_ids_from_csv(data_path, dataset_name)
@@ -187,21 +214,12 @@ class NaiveCellLineMeanPredictor(DRPModel):
         Computes the mean per cell line. If - later on - the cell line is not in the training
         set, the overall mean is used.
         :param output: training dataset containing the response output
-        :param cell_line_input: cell line inputs
+        :param cell_line_input: not needed
         :param drug_input: not needed
         :param output_earlystopping: not needed
         """
-        cell_line_ids = cell_line_input.get_feature_matrix(view="cell_line_id", identifiers=output.cell_line_ids)
         self.dataset_mean = np.mean(output.response)
-        self.cell_line_means = {}
-
-        for cell_line_response, cell_line_feature in zip(
-            unique(output.cell_line_ids), unique(cell_line_ids), strict=True
-        ):
-            responses_cl = output.response[cell_line_feature == output.cell_line_ids]
-            if len(responses_cl) > 0:
-                # prevent nan response
-                self.cell_line_means[cell_line_response] = np.mean(responses_cl)
+        self.cell_line_means = _group_means(output.cell_line_ids, output.response)
 
     def predict(
         self,
@@ -219,7 +237,7 @@ class NaiveCellLineMeanPredictor(DRPModel):
         :param cell_line_input: not needed
         :return: array of the same length as the input cell_line_id containing the cell line mean
         """
-        return np.array([self.predict_cl(cl) for cl in cell_line_ids])
+        return _lookup_means(self.cell_line_means, cell_line_ids, default=self.dataset_mean)
 
     def predict_cl(self, cl_id: str):
         """
@@ -233,13 +251,156 @@ class NaiveCellLineMeanPredictor(DRPModel):
         return self.dataset_mean
 
     def save(self, path):
-        raise NotImplementedError("Naive predictor does not support saving yet ...")
+        """
+        Saves the cell line means and the dataset mean.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        os.makedirs(path, exist_ok=True)
+        np.savez(
+            os.path.join(path, "model.npz"),
+            dataset_mean=self.dataset_mean,
+            cell_line_ids=np.array(list(self.cell_line_means), dtype=str),
+            cell_line_means=np.array(list(self.cell_line_means.values()), dtype=float),
+        )
+
+    def load(self, path):
+        """
+        Loads the cell line means and the dataset mean.
+
+        :param path: directory of the saved model
+        """
+        with np.load(os.path.join(path, "model.npz")) as arrays:
+            self.dataset_mean = arrays["dataset_mean"].item()
+            self.cell_line_means = dict(
+                zip(arrays["cell_line_ids"].tolist(), arrays["cell_line_means"].tolist(), strict=True)
+            )
+
+    def load_cell_line_features(self, data_path: str, dataset_name: str) -> FeatureDataset:
+        return load_cl_ids_from_csv(data_path, dataset_name)
+
+    def load_drug_features(self, data_path: str, dataset_name: str) -> FeatureDataset:
+        return load_drug_ids_from_csv(data_path, dataset_name)
+
+
+class NaiveMeanEffectsPredictor(DRPModel):
+    """
+    Naive predictor model that adds the drug effect and the cell line effect to the overall mean of the response.
+
+    The effect of a drug or cell line is its mean response minus the overall mean, drugs and cell lines that are not in
+    the training set have no effect.
+    """
+
+    model_name = "NaiveMeanEffectsPredictor"
+    cell_line_views = ["cell_line_id"]
+    drug_views = ["drug_id"]
+
+    def __init__(self):
+        super().__init__()
+        self.dataset_mean = None
+        self.drug_means = None
+        self.cell_line_means = None
+
+    def build_model(self, hyperparameters: dict):
+        pass
+
+    def train(
+        self,
+        output: DrugResponseDataset,
+        cell_line_input=None,
+        drug_input=None,
+        output_earlystopping=None,
+    ) -> None:
+        """
+        Computes the overall mean, the mean per drug and the mean per cell line.
+        :param output: training dataset containing the response output
+        :param cell_line_input: not needed
+        :param drug_input: not needed
+        :param output_earlystopping: not needed
+        """
+        self.dataset_mean = np.mean(output.response)
+        self.drug_means = _group_means(output.drug_ids, output.response)
+        self.cell_line_means = _group_means(output.cell_line_ids, output.response)
+
+    def predict(
+        self,
+        drug_ids: ArrayLike,
+        cell_line_ids: ArrayLike,
+        drug_input=None,
+        cell_line_input=None,
+    ) -> np.ndarray:
+        """
+        Predicts the overall mean plus the drug effect plus the cell line effect for each drug-cell line combination.
+        :param drug_ids: drug ids
+        :param cell_line_ids: cell line ids
+        :param drug_input: not needed
+        :param cell_line_input: not needed
+        :return: array of the same length as the input drug_id containing the predictions
+        """
+        drug_means = _lookup_means(self.drug_means, drug_ids, default=self.dataset_mean)
+        cell_line_means = _lookup_means(self.cell_line_means, cell_line_ids, default=self.dataset_mean)
+        return drug_means + cell_line_means - self.dataset_mean
+
+    def save(self, path):
+        """
+        Saves the dataset mean, the drug means and the cell line means.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        os.makedirs(path, exist_ok=True)
+        np.savez(
+            os.path.join(path, "model.npz"),
+            dataset_mean=self.dataset_mean,
+            drug_ids=np.array(list(self.drug_means), dtype=str),
+            drug_means=np.array(list(self.drug_means.values()), dtype=float),
+            cell_line_ids=np.array(list(self.cell_line_means), dtype=str),
+            cell_line_means=np.array(list(self.cell_line_means.values()), dtype=float),
+        )
 
     def load(self, path):
-        raise NotImplementedError("Naive predictor does not support loading yet ...")
+        """
+        Loads the dataset mean, the drug means and the cell line means.
+
+        :param path: directory of the saved model
+        """
+        with np.load(os.path.join(path, "model.npz")) as arrays:
+            self.dataset_mean = arrays["dataset_mean"].item()
+            self.drug_means = dict(zip(arrays["drug_ids"].tolist(), arrays["drug_means"].tolist(), strict=True))
+            self.cell_line_means = dict(
+                zip(arrays["cell_line_ids"].tolist(), arrays["cell_line_means"].tolist(), strict=True)
+            )
 
     def load_cell_line_features(self, data_path: str, dataset_name: str) -> FeatureDataset:
         return load_cl_ids_from_csv(data_path, dataset_name)
 
     def load_drug_features(self, data_path: str, dataset_name: str) -> FeatureDataset:
         return load_drug_ids_from_csv(data_path, dataset_name)
+
+
+def _group_means(ids: ArrayLike, response: np.ndarray) -> dict:
+    """
+    Computes the mean response per ID with one factorization of the IDs and one weighted bincount.
+
+    :param ids: ID of every response, e.g., the drug ids
+    :param response: response values
+    :return: dictionary ID -> mean response, in order of first occurrence
+    """
+    codes, unique_ids = pd.factorize(np.asarray(ids))
+    sums = np.bincount(codes, weights=response, minlength=len(unique_ids))
+    counts = np.bincount(codes, minlength=len(unique_ids))
+    return dict(zip(unique_ids.tolist(), (sums / counts).tolist(), strict=True))
+
+
+def _lookup_means(means: dict, ids: ArrayLike, default: float) -> np.ndarray:
+    """
+    Looks up the means of the IDs in one vectorized hash lookup.
+
+    :param means: dictionary ID -> mean, see _group_means
+    :param ids: IDs to look up
+    :param default: value for IDs without a mean
+    :return: array with the mean of every ID
+    """
+    table = np.append(np.fromiter(means.values(), dtype=float, count=len(means)), default)
+    rows = pd.Index(list(means)).get_indexer(np.asarray(ids))
+    # unknown IDs (-1) select the default at the end of the table
+    return table[rows]
@@ -48,6 +48,7 @@ class SingleDrugRandomForest(SingleDrugModel, RandomForest):
             drug_ids_output=output.drug_ids,
             cell_line_input=cell_line_input,
             drug_input=None,
+            dtype=self.feature_dtype,
         )
         self.model.fit(x, output.response)
 
@@ -65,5 +66,6 @@ class SingleDrugRandomForest(SingleDrugModel, RandomForest):
             drug_ids_output=drug_ids,
             cell_line_input=cell_line_input,
             drug_input=None,
+            dtype=self.feature_dtype,
         )
         return self.model.predict(x)
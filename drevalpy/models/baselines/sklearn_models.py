@@ -1,9 +1,12 @@
 """Contains sklearn baseline models: ElasticNet, RandomForest, SVM."""
 
+import os
+
+import joblib
 import numpy as np
 from numpy.typing import ArrayLike
 from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
-from sklearn.linear_model import ElasticNet, Lasso, Ridge
+from sklearn.linear_model import ElasticNet, Lasso, Ridge, enet_path
 from sklearn.svm import SVR
 
 from drevalpy.datasets.dataset import DrugResponseDataset, FeatureDataset
@@ -19,6 +22,8 @@ class SklearnModel(DRPModel):
 
     cell_line_views = ["gene_expression"]
     drug_views = ["fingerprints"]
+    # dtype of the feature matrix passed to the sklearn model, None keeps the dtype of the features
+    feature_dtype = None
 
     def __init__(self):
         super().__init__()
@@ -55,6 +60,7 @@ class SklearnModel(DRPModel):
             drug_ids_output=output.drug_ids,
             cell_line_input=cell_line_input,
             drug_input=drug_input,
+            dtype=self.feature_dtype,
         )
         self.model.fit(x, output.response)
 
@@ -78,14 +84,26 @@ class SklearnModel(DRPModel):
             drug_ids_output=drug_ids,
             cell_line_input=cell_line_input,
             drug_input=drug_input,
+            dtype=self.feature_dtype,
         )
         return self.model.predict(x)
 
     def save(self, path):
-        raise NotImplementedError("ElasticNetModel does not support saving yet ...")
+        """
+        Saves the fitted sklearn model with joblib.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        os.makedirs(path, exist_ok=True)
+        joblib.dump(self.model, os.path.join(path, "model.joblib"))
 
     def load(self, path):
-        raise NotImplementedError("ElasticNetModel does not support loading yet ...")
+        """
+        Loads the fitted sklearn model.
+
+        :param path: directory of the saved model
+        """
+        self.model = joblib.load(os.path.join(path, "model.joblib"))
 
     def load_cell_line_features(self, data_path: str, dataset_name: str) -> FeatureDataset:
         """
@@ -111,6 +129,7 @@ class ElasticNetModel(SklearnModel):
     """
 
     model_name = "ElasticNet"
+    supports_hyperparameter_path = True
 
     def build_model(self, hyperparameters: dict):
         """
@@ -127,6 +146,83 @@ class ElasticNetModel(SklearnModel):
                 l1_ratio=hyperparameters["l1_ratio"],
             )
 
+    def predict_hyperparameter_path(
+        self,
+        hpam_set: list[dict],
+        output: DrugResponseDataset,
+        drug_ids: ArrayLike,
+        cell_line_ids: ArrayLike,
+        drug_input: FeatureDataset = None,
+        cell_line_input: FeatureDataset = None,
+    ) -> np.ndarray:
+        """
+        Fits the models of all alphas of an l1_ratio along one regularization path and predicts the response.
+
+        The feature matrices are built once. For l1_ratio 0 (Ridge), all alphas are solved from one SVD of the training
+        features. For the other l1_ratios, one warm-started coordinate descent path (enet_path) visits the alphas from
+        the largest to the smallest. The models are the same as the ones fitted by build_model and train, up to the
+        solver tolerance.
+        :param hpam_set: hyperparameter combinations with alpha and l1_ratio
+        :param output: training dataset containing the response output
+        :param drug_ids: drug ids to predict
+        :param cell_line_ids: cell line ids to predict
+        :param drug_input: fingerprints
+        :param cell_line_input: gene expression
+        :return: predictions of shape (len(hpam_set), len(drug_ids))
+        """
+        x_train = self.get_concatenated_features(
+            cell_line_view="gene_expression",
+            drug_view="fingerprints",
+            cell_line_ids_output=output.cell_line_ids,
+            drug_ids_output=output.drug_ids,
+            cell_line_input=cell_line_input,
+            drug_input=drug_input,
+            dtype=np.float64,
+        )
+        x_predict = self.get_concatenated_features(
+            cell_line_view="gene_expression",
+            drug_view="fingerprints",
+            cell_line_ids_output=cell_line_ids,
+            drug_ids_output=drug_ids,
+            cell_line_input=cell_line_input,
+            drug_input=drug_input,
+            dtype=np.float64,
+        )
+        # the sklearn models fit the intercept by centering
+        x_mean = x_train.mean(axis=0)
+        y_mean = output.response.mean()
+        x_train -= x_mean
+        y_train = output.response - y_mean
+
+        predictions = np.empty((len(hpam_set), len(x_predict)))
+        l1_ratios = np.array([hyperparameters["l1_ratio"] for hyperparameters in hpam_set], dtype=float)
+        alphas = np.array([hyperparameters["alpha"] for hyperparameters in hpam_set], dtype=float)
+        for l1_ratio in np.unique(l1_ratios):
+            # from the largest to the smallest alpha, i.e., from the sparsest to the densest model
+            indices = np.flatnonzero(l1_ratios == l1_ratio)
+            indices = indices[np.argsort(-alphas[indices], kind="stable")]
+            if l1_ratio == 0.0:
+                coefficients = _ridge_path(x_train, y_train, alphas[indices])
+            else:
+                _, coefficients, _ = enet_path(x_train, y_train, l1_ratio=l1_ratio, alphas=alphas[indices])
+            predictions[indices] = ((x_predict - x_mean) @ coefficients).T + y_mean
+        return predictions
+
+
+def _ridge_path(x: np.ndarray, y: np.ndarray, alphas: np.ndarray) -> np.ndarray:
+    """
+    Solves ridge regression for several alphas from one SVD of the centered features.
+
+    :param x: centered features
+    :param y: centered response
+    :param alphas: regularization strengths
+    :return: coefficients of shape (n_features, len(alphas))
+    """
+    u, singular_values, vt = np.linalg.svd(x, full_matrices=False)
+    uty = u.T @ y
+    shrinkage = singular_values[:, None] / (singular_values[:, None] ** 2 + alphas[None, :])
+    return vt.T @ (shrinkage * uty[:, None])
+
 
 class RandomForest(SklearnModel):
     """
@@ -134,6 +230,8 @@ class RandomForest(SklearnModel):
     """
 
     model_name = "RandomForest"
+    # the trees split on float32 features internally, gathering float32 saves sklearn the conversion
+    feature_dtype = np.float32
 
     def build_model(self, hyperparameters: dict):
         """
@@ -144,6 +242,7 @@ class RandomForest(SklearnModel):
             hyperparameters["max_depth"] = None
         self.model = RandomForestRegressor(
             n_estimators=hyperparameters["n_estimators"],
+            max_depth=hyperparameters["max_depth"],
             criterion=hyperparameters["criterion"],
             max_samples=hyperparameters["max_samples"],
             n_jobs=hyperparameters["n_jobs"],
@@ -176,6 +275,8 @@ class GradientBoosting(SklearnModel):
     """
 
     model_name = "GradientBoosting"
+    # the regression trees also work on float32 features
+    feature_dtype = np.float32
 
     def build_model(self, hyperparameters: dict):
         """
@@ -9,14 +9,18 @@ import inspect
 import os
 import warnings
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from typing import Any, Optional, Union
 
 import numpy as np
+import pandas as pd
 import yaml
+from joblib import Parallel, delayed
 from numpy.typing import ArrayLike
 from sklearn.model_selection import ParameterGrid
 
 from ..datasets.dataset import DrugResponseDataset, FeatureDataset
+from ..hyperparameter_search import HyperparameterRange, get_grid, parse_hyperparameter_space
+from .utils import load_model_config, save_model_config
 
 
 class DRPModel(ABC):
@@ -25,6 +29,8 @@ class DRPModel(ABC):
     """
 
     early_stopping = False
+    # whether the model implements predict_hyperparameter_path
+    supports_hyperparameter_path = False
 
     @abstractmethod
     def __init__(self, *args, **kwargs):
@@ -36,11 +42,16 @@ class DRPModel(ABC):
         """
 
     @classmethod
-    def get_hyperparameter_set(cls, hyperparameter_file: Optional[str] = None):
+    def get_hyperparameter_space(
+        cls, hyperparameter_file: Optional[str] = None
+    ) -> dict[str, Union[list, HyperparameterRange]]:
         """
-        Loads the hyperparameters from a yaml file.
+        Loads the hyperparameter search space from a yaml file.
+
+        A list in the yaml file is a set of categorical values, a dictionary with the keys low and high (and optionally
+        log, integer and grid_points) is a continuous or integer range, and any other value is fixed.
         :param hyperparameter_file: yaml file containing the hyperparameters
-        :return:
+        :return: dictionary hyperparameter name -> list of values or HyperparameterRange
         """
         if hyperparameter_file is None:
             hyperparameter_file = os.path.join(os.path.dirname(inspect.getfile(cls)), "hyperparameters.yaml")
@@ -54,12 +65,17 @@ class DRPModel(ABC):
                 raise KeyError(f"Model {cls.model_name} not found in hyperparameters.yaml") from key_exc
 
         if hpams is None:
-            return [{}]
-        # each param should be a list
-        for hp in hpams:
-            if not isinstance(hpams[hp], list):
-                hpams[hp] = [hpams[hp]]
-        grid = list(ParameterGrid(hpams))
+            return {}
+        return parse_hyperparameter_space(hpams)
+
+    @classmethod
+    def get_hyperparameter_set(cls, hyperparameter_file: Optional[str] = None):
+        """
+        Loads the hyperparameters from a yaml file. Ranges are replaced by evenly spaced grid points.
+        :param hyperparameter_file: yaml file containing the hyperparameters
+        :return:
+        """
+        grid = list(ParameterGrid(get_grid(cls.get_hyperparameter_space(hyperparameter_file))))
         return grid
 
     @property
@@ -122,20 +138,46 @@ class DRPModel(ABC):
 
         """
 
+    def predict_hyperparameter_path(
+        self,
+        hpam_set: list[dict],
+        output: DrugResponseDataset,
+        drug_ids: ArrayLike,
+        cell_line_ids: ArrayLike,
+        drug_input: FeatureDataset = None,
+        cell_line_input: FeatureDataset = None,
+    ) -> np.ndarray:
+        """
+        Trains the model for every hyperparameter combination and predicts the response for the given input.
+
+        Models that can fit many combinations at once faster than one by one, e.g., along a regularization path, set
+        supports_hyperparameter_path and implement this method. It is used to speed up the hyperparameter tuning.
+        :param hpam_set: hyperparameter combinations
+        :param output: training dataset containing the response output
+        :param drug_ids: drug ids to predict
+        :param cell_line_ids: cell line ids to predict
+        :param drug_input: drug features
+        :param cell_line_input: cell line features
+        :return: predictions of shape (len(hpam_set), len(drug_ids))
+        :raises NotImplementedError: if the model does not support hyperparameter paths
+        """
+        raise NotImplementedError(f"{self.model_name} does not support hyperparameter paths.")
+
     @abstractmethod
     def save(self, path):
         """
-        Saves the model.
+        Saves the trained model, including fitted feature transformations like scalers or PCAs.
 
-        :param path: path to save the model
+        :param path: directory to save the model to, created if it does not exist
         """
 
     @abstractmethod
     def load(self, path):
         """
-        Loads the model.
+        Loads a model saved with save. Afterward, the model predicts like the saved model without building or training
+        it first.
 
-        :param path: path to load the model
+        :param path: directory of the saved model
         """
 
     @abstractmethod
@@ -160,15 +202,20 @@ class DRPModel(ABC):
         drug_ids_output: ArrayLike,
         cell_line_input: Optional[FeatureDataset],
         drug_input: Optional[FeatureDataset],
+        dtype: Optional[np.dtype] = None,
     ):
         """
         Concatenates the features for the given cell line and drug view.
+
+        The features are gathered once per unique cell line and drug and then expanded to the response pairs directly
+        into one preallocated matrix.
         :param cell_line_view:
         :param drug_view:
         :param cell_line_ids_output:
         :param drug_ids_output:
         :param cell_line_input:
         :param drug_input:
+        :param dtype: dtype of X. If None, the common dtype of the feature views is used.
         :return: X, the feature matrix needed for, e.g., sklearn models
         """
         inputs = self.get_feature_matrices(
@@ -176,18 +223,22 @@ class DRPModel(ABC):
             drug_ids=drug_ids_output,
             cell_line_input=cell_line_input,
             drug_input=drug_input,
+            compact=True,
         )
-        cell_line_features = inputs.get(cell_line_view)
-        drug_features = inputs.get(drug_view)
-
-        if cell_line_features is not None and drug_features is not None:
-            x = np.concatenate((cell_line_features, drug_features), axis=1)
-        elif cell_line_features is not None:
-            x = cell_line_features
-        elif drug_features is not None:
-            x = drug_features
-        else:
+        compact_features = [inputs[view] for view in (cell_line_view, drug_view) if inputs.get(view) is not None]
+        if not compact_features:
             raise ValueError("No features provided.")
+        if dtype is None:
+            dtype = np.result_type(*[unique_matrix for unique_matrix, _ in compact_features])
+
+        n_features = sum(unique_matrix.shape[1] for unique_matrix, _ in compact_features)
+        x = np.empty((len(compact_features[0][1]), n_features), dtype=dtype)
+        start = 0
+        for unique_matrix, inverse in compact_features:
+            stop = start + unique_matrix.shape[1]
+            # the inverses are valid positions (see _expand_feature_matrix), clip avoids buffering the output
+            np.take(unique_matrix.astype(dtype, copy=False), inverse, axis=0, out=x[:, start:stop], mode="clip")
+            start = stop
         return x
 
     def get_feature_matrices(
@@ -196,34 +247,75 @@ class DRPModel(ABC):
         drug_ids: ArrayLike,
         cell_line_input: Optional[FeatureDataset],
         drug_input: Optional[FeatureDataset],
+        dtype: Optional[np.dtype] = None,
+        compact: bool = False,
     ):
         """
         Returns the feature matrices for the given cell line and drug ids by retrieving the
         correct views.
+
+        The features are looked up only once per unique cell line and drug.
         :param cell_line_ids:
         :param drug_ids:
         :param cell_line_input:
         :param drug_input:
-        :return:
+        :param dtype: dtype of the feature matrices. If None, the dtype of the feature views is kept.
+        :param compact: if True, each view is returned as a tuple (unique_matrix, inverse) with one row per unique id,
+            such that unique_matrix[inverse] is the full feature matrix.
+        :return: dictionary view -> feature matrix, or view -> (unique_matrix, inverse) if compact
         """
         cell_line_feature_matrices = {}
         if cell_line_input is not None:
+            cell_line_inverse, unique_cell_line_ids = pd.factorize(np.asarray(cell_line_ids), use_na_sentinel=False)
             for cell_line_view in self.cell_line_views:
                 if cell_line_view not in cell_line_input.get_view_names():
                     raise ValueError(f"Cell line input does not contain view {cell_line_view}")
-                cell_line_feature_matrices[cell_line_view] = cell_line_input.get_feature_matrix(
-                    view=cell_line_view, identifiers=cell_line_ids
+                cell_line_feature_matrices[cell_line_view] = _expand_feature_matrix(
+                    unique_matrix=cell_line_input.get_feature_matrix(
+                        view=cell_line_view, identifiers=unique_cell_line_ids
+                    ),
+                    inverse=cell_line_inverse,
+                    dtype=dtype,
+                    compact=compact,
                 )
         drug_feature_matrices = {}
         if drug_input is not None:
+            drug_inverse, unique_drug_ids = pd.factorize(np.asarray(drug_ids), use_na_sentinel=False)
             for drug_view in self.drug_views:
                 if drug_view not in drug_input.get_view_names():
                     raise ValueError(f"Drug input does not contain view {drug_view}")
-                drug_feature_matrices[drug_view] = drug_input.get_feature_matrix(view=drug_view, identifiers=drug_ids)
+                drug_feature_matrices[drug_view] = _expand_feature_matrix(
+                    unique_matrix=drug_input.get_feature_matrix(view=drug_view, identifiers=unique_drug_ids),
+                    inverse=drug_inverse,
+                    dtype=dtype,
+                    compact=compact,
+                )
 
         return {**cell_line_feature_matrices, **drug_feature_matrices}
 
 
+def _expand_feature_matrix(
+    unique_matrix: np.ndarray, inverse: np.ndarray, dtype: Optional[np.dtype], compact: bool
+) -> Union[np.ndarray, tuple[np.ndarray, np.ndarray]]:
+    """
+    Expands a feature matrix with one row per unique id to one row per requested id.
+
+    :param unique_matrix: feature matrix of the unique ids
+    :param inverse: position of each requested id in unique_matrix
+    :param dtype: dtype of the result. If None, the dtype of unique_matrix is kept.
+    :param compact: if True, (unique_matrix, inverse) is returned without expanding
+    :return: the expanded feature matrix or the tuple (unique_matrix, inverse)
+    :raises AssertionError: if an inverse is negative, i.e., the id was not found
+    """
+    if len(inverse) > 0 and inverse.min() < 0:
+        raise AssertionError("Some ids could not be matched to their features.")
+    if dtype is not None:
+        unique_matrix = unique_matrix.astype(dtype, copy=False)
+    if compact:
+        return unique_matrix, inverse
+    return np.take(unique_matrix, inverse, axis=0)
+
+
 class SingleDrugModel(DRPModel, ABC):
     """
     Abstract wrapper class for single drug response prediction models.
@@ -246,12 +338,24 @@ class CompositeDrugModel(DRPModel):
     drug_views = []
     model_name = "CompositeDrugModel"
 
-    def __init__(self, base_model: type[DRPModel], *args, **kwargs):
+    def __init__(self, base_model: type[DRPModel], *args, n_jobs: int = 1, backend: str = "threading", **kwargs):
         """
         Creates an instance of a single drug response prediction model.
-        :param model_name: model name for displaying results
+
+        The models of the drugs are independent, with n_jobs > 1 they are trained and applied in parallel with joblib.
+        The "threading" backend shares the cell line features with the workers and suits models that release the GIL,
+        e.g., scikit-learn forests. The "loky" backend runs worker processes, e.g., for Lightning models; the feature
+        matrices of the cell line features are passed to them as read-only memory maps instead of pickled copies.
+        :param base_model: single drug model class
+        :param n_jobs: number of drug models trained or applied in parallel
+        :param backend: "threading" or "loky"
+        :raises AssertionError: if the backend is unknown
         """
         super().__init__(*args, **kwargs)
+        if backend not in {"threading", "loky"}:
+            raise AssertionError(f"backend must be 'threading' or 'loky', but is {backend}")
+        self.n_jobs = n_jobs
+        self.backend = backend
         self.models = {}
         self.base_model = base_model
         self.cell_line_views = base_model.cell_line_views
@@ -267,6 +371,37 @@ class CompositeDrugModel(DRPModel):
             self.models[drug].drug_views = self.drug_views
             self.models[drug].build_model(hyperparameters[drug])
 
+    def save(self, path):
+        """
+        Saves the model of every drug to its own subdirectory.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        drugs = list(self.models)
+        save_model_config(path, {"drugs": drugs})
+        for i, drug in enumerate(drugs):
+            self.models[drug].save(os.path.join(path, f"drug_{i}"))
+
+    def load(self, path):
+        """
+        Loads the models of the drugs saved with save.
+
+        :param path: directory of the saved model
+        """
+        self.models = {}
+        for i, drug in enumerate(load_model_config(path)["drugs"]):
+            self.models[drug] = self.base_model()
+            self.models[drug].drug_views = self.drug_views
+            self.models[drug].load(os.path.join(path, f"drug_{i}"))
+
+    def _parallel(self) -> Parallel:
+        """
+        Returns the joblib executor for the models of the drugs. With n_jobs = 1, they run one after another.
+
+        :return: the executor
+        """
+        return Parallel(n_jobs=self.n_jobs, backend=self.backend, max_nbytes="1M", mmap_mode="r")
+
     def load_cell_line_features(self, data_path: str, dataset_name: str) -> FeatureDataset:
         return list(self.models.values())[0].load_cell_line_features(data_path=data_path, dataset_name=dataset_name)
 
@@ -288,28 +423,32 @@ class CompositeDrugModel(DRPModel):
         :param output_earlystopping: Optional. Training data associated with the early stopping
         output
         """
-        drugs = np.unique(output.drug_ids)
-        for i, drug in enumerate(drugs):
+        drug_outputs = dict(output.groupby_drug())
+        earlystopping_outputs = dict(output_earlystopping.groupby_drug()) if output_earlystopping is not None else {}
+        for drug in drug_outputs:
             if drug not in self.models:
                 raise AssertionError(
                     f"Drug {drug} not in models. Maybe the CompositeDrugModel was not built or drug "
                     f"missing from train data."
                 )
-            print(f"Training model for drug {drug} ({i+1}/{len(drugs)})")
-            output_mask = output.drug_ids == drug
-            output_drug = output.copy()
-            output_drug.mask(output_mask)
-            output_earlystopping_drug = None
-            if output_earlystopping is not None:
-                output_earlystopping_mask = output_earlystopping.drug_ids == drug
-                output_earlystopping_drug = output_earlystopping.copy()
-                output_earlystopping_drug.mask(output_earlystopping_mask)
-
-            self.models[drug].train(
+        if self.n_jobs > 1:
+            print(f"Training models for {len(drug_outputs)} drugs with {self.n_jobs} {self.backend} workers")
+        trained_models = self._parallel()(
+            delayed(_train_drug_model)(
+                model=self.models[drug],
+                message=f"Training model for drug {drug} ({i+1}/{len(drug_outputs)})",
                 output=output_drug,
                 cell_line_input=cell_line_input,
-                output_earlystopping=output_earlystopping_drug,
+                output_earlystopping=(
+                    earlystopping_outputs.get(drug, output_earlystopping.subset([]))
+                    if output_earlystopping is not None
+                    else None
+                ),
             )
+            for i, (drug, output_drug) in enumerate(drug_outputs.items())
+        )
+        # worker processes return trained copies of the models
+        self.models.update(zip(drug_outputs, trained_models))
 
     def predict(
         self,
@@ -326,17 +465,17 @@ class CompositeDrugModel(DRPModel):
         :param drug_input: not needed for the single drug models
         :return: predicted response
         """
-        prediction = np.zeros_like(drug_ids, dtype=float)
-        for drug in np.unique(drug_ids):
-            mask = drug_ids == drug
-            if drug not in self.models:
-                prediction[mask] = np.nan
-            else:
-                prediction[mask] = self.models[drug].predict(
-                    drug_ids=drug,
-                    cell_line_ids=cell_line_ids[mask],
-                    cell_line_input=cell_line_input,
-                )
+        prediction = np.full(len(drug_ids), np.nan)
+        pairs = DrugResponseDataset(response=prediction, cell_line_ids=cell_line_ids, drug_ids=drug_ids)
+        drug_rows = {drug: rows for drug, rows in pairs.group_row_indices("drug").items() if drug in self.models}
+        drug_predictions = self._parallel()(
+            delayed(self.models[drug].predict)(
+                drug_ids=drug, cell_line_ids=cell_line_ids[rows], cell_line_input=cell_line_input
+            )
+            for drug, rows in drug_rows.items()
+        )
+        for rows, drug_prediction in zip(drug_rows.values(), drug_predictions):
+            prediction[rows] = drug_prediction
         if np.any(np.isnan(prediction)):
             warnings.warn(
                 "SingleDRPModel Warning: Some drugs were not in the training set. Prediction is "
@@ -344,3 +483,25 @@ class CompositeDrugModel(DRPModel):
                 stacklevel=2,
             )
         return prediction
+
+
+def _train_drug_model(
+    model: DRPModel,
+    message: str,
+    output: DrugResponseDataset,
+    cell_line_input: FeatureDataset,
+    output_earlystopping: Optional[DrugResponseDataset],
+) -> DRPModel:
+    """
+    Trains the model of one drug of a CompositeDrugModel.
+
+    :param model: the built model of the drug
+    :param message: progress message
+    :param output: training data of the drug
+    :param cell_line_input: cell line features
+    :param output_earlystopping: early stopping data of the drug or None
+    :return: the trained model
+    """
+    print(message)
+    model.train(output=output, cell_line_input=cell_line_input, output_earlystopping=output_earlystopping)
+    return model
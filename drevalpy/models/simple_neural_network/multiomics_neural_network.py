@@ -2,17 +2,25 @@
 Contains the MultiOmicsNeuralNetwork model.
 """
 
+import os
 import warnings
 from typing import Optional
 
+import joblib
 import numpy as np
+import torch
 from numpy.typing import ArrayLike
 from sklearn.decomposition import PCA
 
 from drevalpy.datasets.dataset import DrugResponseDataset, FeatureDataset
 
 from ..drp_model import DRPModel
-from ..utils import get_multiomics_feature_dataset, load_drug_fingerprint_features
+from ..utils import (
+    get_multiomics_feature_dataset,
+    load_drug_fingerprint_features,
+    load_model_config,
+    save_model_config,
+)
 from .utils import FeedForwardNetwork
 
 
@@ -24,6 +32,7 @@ class MultiOmicsNeuralNetwork(DRPModel):
     units_per_layer: number of units per layer e.g. [100, 50] means 2 layers with 100 and 50
     units respectively and the output layer with one unit.
     dropout_prob: dropout probability for layers 1, 2, ..., n-1
+    epochs: maximum number of training epochs, 70 if not given
     """
 
     cell_line_views = [
@@ -39,6 +48,8 @@ class MultiOmicsNeuralNetwork(DRPModel):
     def __init__(self):
         super().__init__()
         self.model = None
+        self.epochs = None
+        self.hyperparameters = None
         self.pca = None
 
     def build_model(self, hyperparameters: dict):
@@ -49,6 +60,8 @@ class MultiOmicsNeuralNetwork(DRPModel):
             n_units_per_layer=hyperparameters["units_per_layer"],
             dropout_prob=hyperparameters["dropout_prob"],
         )
+        self.epochs = hyperparameters.get("epochs", 70)
+        self.hyperparameters = hyperparameters
         self.pca = PCA(n_components=hyperparameters["methylation_pca_components"])
 
     def train(
@@ -65,9 +78,8 @@ class MultiOmicsNeuralNetwork(DRPModel):
         :param drug_input: drug omics features
         :param output_earlystopping: optional early stopping dataset
         """
-        unique_methylation = np.stack(
-            [cell_line_input.features[id_]["methylation"] for id_ in np.unique(output.cell_line_ids)],
-            axis=0,
+        unique_methylation = cell_line_input.get_feature_matrix(
+            view="methylation", identifiers=np.unique(output.cell_line_ids)
         )
 
         self.pca.n_components = min(self.pca.n_components, len(unique_methylation))
@@ -85,6 +97,7 @@ class MultiOmicsNeuralNetwork(DRPModel):
                 cell_line_views=self.cell_line_views,
                 drug_views=self.drug_views,
                 output_earlystopping=output_earlystopping,
+                trainer_params={"max_epochs": self.epochs},
                 batch_size=16,
                 patience=5,
                 num_workers=1,
@@ -93,13 +106,25 @@ class MultiOmicsNeuralNetwork(DRPModel):
 
     def save(self, path: str):
         """
-        Saves the model.
-        :param path: path to save the model
+        Saves the hyperparameters, the weights of the network and the fitted PCA of the methylation features.
+
+        :param path: directory to save the model to, created if it does not exist
         """
-        raise NotImplementedError("save method not implemented")
+        save_model_config(path, {"hyperparameters": self.hyperparameters, "n_features": self.model.n_features})
+        torch.save(self.model.state_dict(), os.path.join(path, "model.pt"))
+        joblib.dump(self.pca, os.path.join(path, "pca.joblib"))
 
     def load(self, path: str):
-        raise NotImplementedError("load method not implemented")
+        """
+        Loads the model saved with save.
+
+        :param path: directory of the saved model
+        """
+        config = load_model_config(path)
+        self.build_model(config["hyperparameters"])
+        self.model.build_layers(n_features=config["n_features"])
+        self.model.load_state_dict(torch.load(os.path.join(path, "model.pt"), map_location="cpu"))
+        self.pca = joblib.load(os.path.join(path, "pca.joblib"))
 
     def predict(
         self,
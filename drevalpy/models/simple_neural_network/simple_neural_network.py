@@ -2,17 +2,25 @@
 Contains the SimpleNeuralNetwork model.
 """
 
+import os
 import warnings
 from typing import Optional
 
+import joblib
 import numpy as np
+import torch
 from numpy.typing import ArrayLike
 from sklearn.preprocessing import StandardScaler
 
 from drevalpy.datasets.dataset import DrugResponseDataset, FeatureDataset
 
 from ..drp_model import DRPModel
-from ..utils import load_and_reduce_gene_features, load_drug_fingerprint_features
+from ..utils import (
+    load_and_reduce_gene_features,
+    load_drug_fingerprint_features,
+    load_model_config,
+    save_model_config,
+)
 from .utils import FeedForwardNetwork
 
 
@@ -24,6 +32,7 @@ class SimpleNeuralNetwork(DRPModel):
     units_per_layer: number of units per layer e.g. [100, 50] means 2 layers with 100 and 50
     units respectively and the output layer with one unit.
     dropout_prob: dropout probability for layers 1, 2, ..., n-1
+    epochs: maximum number of training epochs, 70 if not given
     """
 
     cell_line_views = ["gene_expression"]
@@ -34,6 +43,8 @@ class SimpleNeuralNetwork(DRPModel):
     def __init__(self):
         super().__init__()
         self.model = None
+        self.epochs = None
+        self.hyperparameters = None
         self.gene_expression_scaler = StandardScaler()
 
     def build_model(self, hyperparameters: dict):
@@ -44,6 +55,8 @@ class SimpleNeuralNetwork(DRPModel):
             n_units_per_layer=hyperparameters["units_per_layer"],
             dropout_prob=hyperparameters["dropout_prob"],
         )
+        self.epochs = hyperparameters.get("epochs", 70)
+        self.hyperparameters = hyperparameters
 
     def train(
         self,
@@ -60,9 +73,12 @@ class SimpleNeuralNetwork(DRPModel):
         :param output_earlystopping: optional early stopping dataset
 
         """
-        # Apply arcsinh transformation and scaling to gene expression features
+        # Apply arcsinh transformation and scaling to a copy of the gene expression features, predict applies the
+        # same transformation
         if "gene_expression" in self.cell_line_views:
-            cell_line_input._apply(function=np.arcsinh, view="gene_expression")
+            cell_line_input = cell_line_input._apply(
+                function=np.arcsinh, view="gene_expression", inplace=False, batched=True
+            )
             self.gene_expression_scaler = cell_line_input.fit_transform_features(
                 train_ids=np.unique(output.cell_line_ids),
                 transformer=self.gene_expression_scaler,
@@ -81,16 +97,33 @@ class SimpleNeuralNetwork(DRPModel):
                 cell_line_views=self.cell_line_views,
                 drug_views=self.drug_views,
                 output_earlystopping=output_earlystopping,
+                trainer_params={"max_epochs": self.epochs},
                 batch_size=16,
                 patience=5,
                 num_workers=1,
             )
 
     def save(self, path: str):
-        raise NotImplementedError("save method not implemented")
+        """
+        Saves the hyperparameters, the weights of the network and the fitted gene expression scaler.
+
+        :param path: directory to save the model to, created if it does not exist
+        """
+        save_model_config(path, {"hyperparameters": self.hyperparameters, "n_features": self.model.n_features})
+        torch.save(self.model.state_dict(), os.path.join(path, "model.pt"))
+        joblib.dump(self.gene_expression_scaler, os.path.join(path, "gene_expression_scaler.joblib"))
 
     def load(self, path: str):
-        raise NotImplementedError("load method not implemented")
+        """
+        Loads the model saved with save.
+
+        :param path: directory of the saved model
+        """
+        config = load_model_config(path)
+        self.build_model(config["hyperparameters"])
+        self.model.build_layers(n_features=config["n_features"])
+        self.model.load_state_dict(torch.load(os.path.join(path, "model.pt"), map_location="cpu"))
+        self.gene_expression_scaler = joblib.load(os.path.join(path, "gene_expression_scaler.joblib"))
 
     def predict(
         self,
@@ -104,8 +137,9 @@ class SimpleNeuralNetwork(DRPModel):
         """
         # Apply transformation to gene expression features before prediction
         if "gene_expression" in self.cell_line_views:
-            cell_line_input = cell_line_input.copy()
-            cell_line_input._apply(function=np.arcsinh, view="gene_expression")
+            cell_line_input = cell_line_input._apply(
+                function=np.arcsinh, view="gene_expression", inplace=False, batched=True
+            )
             cell_line_input.transform_features(
                 ids=np.unique(cell_line_ids),
                 transformer=self.gene_expression_scaler,
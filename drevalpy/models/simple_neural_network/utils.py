@@ -93,6 +93,7 @@ class FeedForwardNetwork(pl.LightningModule):
         self.n_units_per_layer = n_units_per_layer
         self.dropout_prob = dropout_prob
         self.model_initialized = False
+        self.n_features = None
         self.loss = nn.MSELoss()
         self.checkpoint_callback = None
         self.fully_connected_layers = nn.ModuleList()
@@ -122,7 +123,7 @@ class FeedForwardNetwork(pl.LightningModule):
         :param cell_line_views: Cell line info needed for this model
         :param drug_views: Drug info needed for this model
         :param output_earlystopping: Response values for early stopping
-        :param trainer_params: custom parameters for the trainer
+        :param trainer_params: custom parameters for the trainer, the progress bar refresh rate defaults to 300
         :param batch_size:
         :param patience:
         :param checkpoint_path:
@@ -186,9 +187,8 @@ class FeedForwardNetwork(pl.LightningModule):
             filename=name,
         )
 
-        progress_bar = TQDMProgressBar(refresh_rate=trainer_params["progress_bar_refresh_rate"])
         trainer_params_copy = trainer_params.copy()
-        del trainer_params_copy["progress_bar_refresh_rate"]
+        progress_bar = TQDMProgressBar(refresh_rate=trainer_params_copy.pop("progress_bar_refresh_rate", 300))
 
         # Force initialize model with dummy data
         self.force_initialize(train_loader)
@@ -238,7 +238,14 @@ class FeedForwardNetwork(pl.LightningModule):
         :param x:
         :return:
         """
-        n_features = x.size(1)
+        self.build_layers(n_features=x.size(1))
+
+    def build_layers(self, n_features: int) -> None:
+        """
+        Builds the layers for inputs with n_features features, e.g., before loading a saved state dict.
+        :param n_features: number of input features
+        """
+        self.n_features = n_features
         self.fully_connected_layers.append(nn.Linear(n_features, self.n_units_per_layer[0]))
         self.batch_norm_layers.append(nn.BatchNorm1d(self.n_units_per_layer[0]))
 
@@ -2,6 +2,7 @@
 Utility functions for loading and processing data.
 """
 
+import json
 import os.path
 import warnings
 from typing import Optional
@@ -10,6 +11,11 @@ import numpy as np
 import pandas as pd
 
 from drevalpy.datasets.dataset import FeatureDataset
+from drevalpy.datasets.feature_cache import get_source_key, load_cached_table
+from drevalpy.datasets.feature_registry import FEATURE_REGISTRY
+
+# file of a saved model that contains its configuration, see save_model_config
+MODEL_CONFIG_FILE = "config.json"
 
 
 def load_cl_ids_from_csv(path: str, dataset_name: str) -> FeatureDataset:
@@ -19,8 +25,15 @@ def load_cl_ids_from_csv(path: str, dataset_name: str) -> FeatureDataset:
     :param dataset_name:
     :return:
     """
-    cl_names = pd.read_csv(f"{path}/{dataset_name}/cell_line_names.csv", index_col=1)
-    return FeatureDataset(features={cl: {"cell_line_id": np.array([cl])} for cl in cl_names.index})
+    source = f"{path}/{dataset_name}/cell_line_names.csv"
+
+    def read_cl_ids() -> FeatureDataset:
+        cl_names = pd.read_csv(source, index_col=1)
+        return FeatureDataset(features={cl: {"cell_line_id": np.array([cl])} for cl in cl_names.index})
+
+    return FEATURE_REGISTRY.get_or_load(
+        key=("load_cl_ids_from_csv", dataset_name, None, "cell_line_id", get_source_key([source])), load=read_cl_ids
+    )
 
 
 def load_and_reduce_gene_features(
@@ -31,50 +44,102 @@ def load_and_reduce_gene_features(
 ) -> FeatureDataset:
     """
     Load and reduce gene features.
+
+    The parsed and reduced features are kept in the binary feature cache of the dataset, so only the first load
+    parses the csv files.
     :param feature_type:
     :param gene_list:
     :param data_path:
     :param dataset_name:
     :return:
     """
+    sources = [f"{data_path}/{dataset_name}/{feature_type}.csv"]
+    if gene_list is not None:
+        sources.append(f"{data_path}/{dataset_name}/gene_lists/{gene_list}.csv")
+
+    def load() -> FeatureDataset:
+        identifiers, genes, matrix = load_cached_table(
+            data_path=data_path,
+            dataset_name=dataset_name,
+            name=feature_type if gene_list is None else f"{feature_type}__{gene_list}",
+            sources=sources,
+            build=lambda: _read_and_reduce_gene_features(feature_type, gene_list, data_path, dataset_name),
+        )
+        return FeatureDataset.from_matrices(
+            identifiers=identifiers,
+            matrices={feature_type: matrix},
+            meta_info={feature_type: genes},
+        )
+
+    return FEATURE_REGISTRY.get_or_load(
+        key=("load_and_reduce_gene_features", dataset_name, gene_list, feature_type, get_source_key(sources)),
+        load=load,
+    )
+
+
+def _read_and_reduce_gene_features(
+    feature_type: str,
+    gene_list: Optional[str],
+    data_path: str,
+    dataset_name: str,
+) -> pd.DataFrame:
+    """
+    Parses the gene features from csv and reduces them to the genes in the gene list.
+
+    :param feature_type:
+    :param gene_list:
+    :param data_path:
+    :param dataset_name:
+    :return: feature table with one row per cell line and one column per gene
+    :raises ValueError: if genes of the gene list are missing from the features
+    """
     ge = pd.read_csv(f"{data_path}/{dataset_name}/{feature_type}.csv", index_col=1)
     # remove column
     ge = ge.drop(columns=["cellosaurus_id"])
-    cl_features = FeatureDataset(
-        features=iterate_features(df=ge, feature_type=feature_type),
-        meta_info={feature_type: ge.columns.values},
-    )
-    if gene_list is None:
-        return cl_features
+    ge = _drop_duplicate_ids(df=ge, feature_type=feature_type)
+    if gene_list is not None:
+        gene_info = pd.read_csv(
+            f"{data_path}/{dataset_name}/gene_lists/{gene_list}.csv",
+            sep=",",
+        )
 
-    gene_info = pd.read_csv(
-        f"{data_path}/{dataset_name}/gene_lists/{gene_list}.csv",
-        sep=",",
-    )
+        genes_in_list = set(gene_info["Symbol"])
+        genes_in_features = set(ge.columns)
+        # Ensure that all genes from gene_list are in the dataset
+        missing_genes = genes_in_list - genes_in_features
+        if missing_genes:
+            missing_genes_list = list(missing_genes)
+            if len(missing_genes_list) > 10:
+                raise ValueError(
+                    f"The following genes are missing from the dataset {dataset_name} for {feature_type}: "
+                    f"{', '.join(missing_genes_list[:10])}, ... ({len(missing_genes)} genes in total)"
+                )
+            else:
+                raise ValueError(
+                    f"The following genes are missing from the dataset {dataset_name} for {feature_type}: "
+                    f"{', '.join(missing_genes_list)}"
+                )
 
-    genes_in_list = set(gene_info["Symbol"])
-    genes_in_features = set(cl_features.meta_info[feature_type])
-    # Ensure that all genes from gene_list are in the dataset
-    missing_genes = genes_in_list - genes_in_features
-    if missing_genes:
-        missing_genes_list = list(missing_genes)
-        if len(missing_genes_list) > 10:
-            raise ValueError(
-                f"The following genes are missing from the dataset {dataset_name} for {feature_type}: "
-                f"{', '.join(missing_genes_list[:10])}, ... ({len(missing_genes)} genes in total)"
-            )
-        else:
-            raise ValueError(
-                f"The following genes are missing from the dataset {dataset_name} for {feature_type}: "
-                f"{', '.join(missing_genes_list)}"
-            )
+        # Only proceed with genes that are available
+        ge = ge.loc[:, ge.columns.isin(genes_in_list)]
+
+    return ge
+
+
+def _drop_duplicate_ids(df: pd.DataFrame, feature_type: str) -> pd.DataFrame:
+    """
+    Keeps only the first row of identifiers that occur multiple times.
 
-    # Only proceed with genes that are available
-    gene_mask = np.array([gene in genes_in_list for gene in cl_features.meta_info[feature_type]])
-    cl_features.meta_info[feature_type] = cl_features.meta_info[feature_type][gene_mask]
-    for cell_line in cl_features.features.keys():
-        cl_features.features[cell_line][feature_type] = cl_features.features[cell_line][feature_type][gene_mask]
-    return cl_features
+    :param df: feature table, one row per identifier
+    :param feature_type: name of the feature view, used in the warning
+    :return: feature table with unique index
+    """
+    duplicated = df.index.duplicated(keep="first")
+    for identifier in pd.unique(df.index[duplicated]):
+        warnings.warn(
+            f"Multiple rows returned for {identifier} in feature {feature_type}, taking the first one.", stacklevel=3
+        )
+    return df[~duplicated]
 
 
 def iterate_features(df: pd.DataFrame, feature_type: str):
@@ -105,8 +170,15 @@ def load_drug_ids_from_csv(data_path: str, dataset_name: str) -> FeatureDataset:
     :param dataset_name:
     :return:
     """
-    drug_names = pd.read_csv(f"{data_path}/{dataset_name}/drug_names.csv", index_col=0)
-    return FeatureDataset(features={drug: {"drug_id": np.array([drug])} for drug in drug_names.index})
+    source = f"{data_path}/{dataset_name}/drug_names.csv"
+
+    def read_drug_ids() -> FeatureDataset:
+        drug_names = pd.read_csv(source, index_col=0)
+        return FeatureDataset(features={drug: {"drug_id": np.array([drug])} for drug in drug_names.index})
+
+    return FEATURE_REGISTRY.get_or_load(
+        key=("load_drug_ids_from_csv", dataset_name, None, "drug_id", get_source_key([source])), load=read_drug_ids
+    )
 
 
 def load_drug_fingerprint_features(data_path: str, dataset_name: str) -> FeatureDataset:
@@ -117,14 +189,29 @@ def load_drug_fingerprint_features(data_path: str, dataset_name: str) -> Feature
     :return:
     """
     if dataset_name == "Toy_Data":
-        fingerprints = pd.read_csv(os.path.join(data_path, dataset_name, "fingerprints.csv"), index_col=0)
+        source = os.path.join(data_path, dataset_name, "fingerprints.csv")
     else:
-        fingerprints = pd.read_csv(
-            os.path.join(data_path, dataset_name, "drug_fingerprints", "drug_name_to_demorgan_128_map.csv"),
-            index_col=0,
-        ).T
-    return FeatureDataset(
-        features={drug: {"fingerprints": fingerprints.loc[drug].values} for drug in fingerprints.index}
+        source = os.path.join(data_path, dataset_name, "drug_fingerprints", "drug_name_to_demorgan_128_map.csv")
+
+    def read_fingerprints() -> pd.DataFrame:
+        fingerprints = pd.read_csv(source, index_col=0)
+        if dataset_name != "Toy_Data":
+            fingerprints = fingerprints.T
+        return _drop_duplicate_ids(df=fingerprints, feature_type="fingerprints")
+
+    def load() -> FeatureDataset:
+        identifiers, _, matrix = load_cached_table(
+            data_path=data_path,
+            dataset_name=dataset_name,
+            name="fingerprints",
+            sources=[source],
+            build=read_fingerprints,
+        )
+        return FeatureDataset.from_matrices(identifiers=identifiers, matrices={"fingerprints": matrix})
+
+    return FEATURE_REGISTRY.get_or_load(
+        key=("load_drug_fingerprint_features", dataset_name, None, "fingerprints", get_source_key([source])),
+        load=load,
     )
 
 
@@ -177,3 +264,26 @@ def unique(array):
     """
     uniq, index = np.unique(array, return_index=True)
     return uniq[index.argsort()]
+
+
+def save_model_config(path: str, config: dict) -> None:
+    """
+    Saves the configuration of a trained model, e.g., its hyperparameters and input dimensions, to its model directory.
+
+    :param path: model directory, created if it does not exist
+    :param config: json serializable configuration
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, MODEL_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+
+def load_model_config(path: str) -> dict:
+    """
+    Loads the configuration of a saved model, see save_model_config.
+
+    :param path: model directory
+    :return: the configuration
+    """
+    with open(os.path.join(path, MODEL_CONFIG_FILE), encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,149 @@
+"""
+Task graph scheduler for running the jobs of an experiment in parallel.
+
+An experiment is split into jobs, e.g., the hyperparameter tuning and final training of one model on one CV split or
+the randomization tests of that model on that split. A job starts as soon as all jobs it depends on have finished.
+Jobs run on a local process pool; every worker limits the number of threads its numerical libraries use, so that
+n_workers * threads_per_job does not oversubscribe the machine.
+"""
+
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Hashable, Optional
+
+import torch
+from threadpoolctl import threadpool_limits
+
+
+class Job:
+    """A function call that runs after the jobs it depends on."""
+
+    def __init__(
+        self,
+        key: Hashable,
+        function: Callable,
+        kwargs: Optional[dict[str, Any]] = None,
+        depends_on: tuple[Hashable, ...] = (),
+    ):
+        """
+        Initializes the job.
+
+        :param key: unique key of the job, e.g., (model_name, drug_id, split_index, stage)
+        :param function: module-level function, it has to be picklable to run on the process pool
+        :param kwargs: keyword arguments of the function
+        :param depends_on: keys of the jobs that have to finish before this job starts
+        """
+        self.key = key
+        self.function = function
+        self.kwargs = kwargs or {}
+        self.depends_on = tuple(depends_on)
+
+    def __repr__(self):
+        """Overwrites the default repr method."""
+        return f"Job({self.key!r})"
+
+    def run(self) -> Any:
+        """
+        Runs the job.
+
+        :return: the return value of the function
+        """
+        return self.function(**self.kwargs)
+
+
+def run_jobs(jobs: list[Job], n_workers: int = 1, threads_per_job: Optional[int] = None) -> dict[Hashable, Any]:
+    """
+    Runs jobs respecting their dependencies.
+
+    With one worker, the jobs run one after another in the given order in this process. Otherwise, they run on a
+    process pool. The pool uses the spawn start method because forked workers can deadlock in torch and in BLAS
+    libraries that already started threads.
+    :param jobs: the jobs. A job may only depend on jobs listed before it.
+    :param n_workers: number of worker processes
+    :param threads_per_job: maximum number of threads a job may use (BLAS, OpenMP, torch). None means no limit.
+    :return: dictionary job key -> return value
+    :raises AssertionError: if keys are not unique, a dependency is unknown or listed after the job or n_workers < 1
+    :raises Exception: the first exception raised by a job. Jobs that did not start yet are cancelled.
+    """
+    if n_workers < 1:
+        raise AssertionError(f"n_workers must be at least 1, but is {n_workers}")
+    _check_dependencies(jobs)
+
+    results = {}
+    if n_workers == 1:
+        torch_threads = torch.get_num_threads()
+        if threads_per_job is not None:
+            torch.set_num_threads(threads_per_job)
+        try:
+            with threadpool_limits(limits=threads_per_job):
+                for job in jobs:
+                    results[job.key] = job.run()
+        finally:
+            torch.set_num_threads(torch_threads)
+        return results
+
+    return _run_on_pool(jobs=jobs, n_workers=n_workers, threads_per_job=threads_per_job)
+
+
+def _run_on_pool(jobs: list[Job], n_workers: int, threads_per_job: Optional[int]) -> dict[Hashable, Any]:
+    """
+    Runs jobs on a process pool. A job is submitted as soon as all jobs it depends on finished.
+
+    :param jobs: the jobs, dependencies are listed before the jobs depending on them
+    :param n_workers: number of worker processes
+    :param threads_per_job: maximum number of threads a job may use, None means no limit
+    :return: dictionary job key -> return value
+    """
+    results = {}
+    pending = list(jobs)
+    running: dict[Future, Job] = {}
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads_per_job,),
+    ) as executor:
+        while pending or running:
+            ready = [job for job in pending if all(key in results for key in job.depends_on)]
+            for job in ready:
+                pending.remove(job)
+                running[executor.submit(job.run)] = job
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job = running.pop(future)
+                if future.exception() is not None:
+                    for other in running:
+                        other.cancel()
+                    raise future.exception()
+                results[job.key] = future.result()
+    return results
+
+
+def _check_dependencies(jobs: list[Job]) -> None:
+    """
+    Checks that the job keys are unique and that every job only depends on jobs listed before it.
+
+    This also guarantees that the dependencies contain no cycles.
+    :param jobs: the jobs
+    :raises AssertionError: if the jobs violate one of the conditions
+    """
+    seen = set()
+    for job in jobs:
+        if job.key in seen:
+            raise AssertionError(f"Job key {job.key!r} is not unique.")
+        for key in job.depends_on:
+            if key not in seen:
+                raise AssertionError(f"{job!r} depends on {key!r}, which is unknown or listed after it.")
+        seen.add(job.key)
+
+
+def _init_worker(threads_per_job: Optional[int]) -> None:
+    """
+    Limits the threads of the numerical libraries in a worker process.
+
+    :param threads_per_job: maximum number of threads, None means no limit
+    """
+    if threads_per_job is None:
+        return
+    threadpool_limits(limits=threads_per_job)
+    torch.set_num_threads(threads_per_job)
@@ -1,13 +1,16 @@
 """Utility functions for the evaluation pipeline."""
 
 import argparse
+import os
+import warnings
+from typing import Optional
 
 from sklearn.preprocessing import MinMaxScaler, RobustScaler, StandardScaler
 
 from drevalpy.datasets import AVAILABLE_DATASETS
 from drevalpy.datasets.loader import load_dataset
 from drevalpy.evaluation import AVAILABLE_METRICS
-from drevalpy.experiment import drug_response_experiment
+from drevalpy.experiment import TUNING_STRATEGIES, check_tuning_arguments, drug_response_experiment
 from drevalpy.models import MODEL_FACTORY
 
 
@@ -153,6 +156,57 @@ def get_parser():
         default=False,
         help="Whether to use multiprocessing for the evaluation. Default is False",
     )
+    parser.add_argument(
+        "--n_workers",
+        type=int,
+        default=1,
+        help="Number of experiment jobs (model, drug, CV split, stage) to run in parallel processes. Cannot be "
+        "combined with --multiprocessing. Default is 1",
+    )
+    parser.add_argument(
+        "--threads_per_job",
+        type=int,
+        default=None,
+        help="Maximum number of threads (BLAS, OpenMP, torch) per job. Default is no limit",
+    )
+    parser.add_argument(
+        "--tuning_strategy",
+        type=str,
+        default="grid",
+        choices=TUNING_STRATEGIES,
+        help="Hyperparameter tuning strategy (without Ray). 'grid' trains every combination of the grid, "
+        "'successive_halving' trains all combinations on a small budget (epochs, trees or training rows) and only "
+        "continues with the best ones, 'tpe' trains --n_tuning_trials combinations proposed by a tree-structured "
+        "Parzen estimator, which also searches continuous ranges. Default is grid",
+    )
+    parser.add_argument(
+        "--n_tuning_trials",
+        type=int,
+        default=20,
+        help="Number of hyperparameter combinations to train with --tuning_strategy tpe. Default is 20",
+    )
+    parser.add_argument(
+        "--warm_start_tuning",
+        action="store_true",
+        default=False,
+        help="Seed the hyperparameter search of every CV split with the scores of the previous splits: their best "
+        "combinations are evaluated first and combinations that were worse than all of them are skipped. The splits of "
+        "a model are then tuned one after another. Cannot be combined with --multiprocessing",
+    )
+    parser.add_argument(
+        "--n_tuning_jobs",
+        type=int,
+        default=1,
+        help="Number of hyperparameter combinations to evaluate in parallel processes (without Ray). Cannot be "
+        "combined with --multiprocessing. Default is 1",
+    )
+    parser.add_argument(
+        "--batch_single_drug_models",
+        action="store_true",
+        default=False,
+        help="Train the models of all drugs of a single drug model and CV split in one job that loads the features "
+        "once, instead of one job per drug. The results are saved per drug as without batching",
+    )
 
     return parser
 
@@ -202,6 +256,16 @@ def check_arguments(args):
     if args.n_cv_splits <= 1:
         raise ValueError("Number of cross-validation splits must be greater than 1")
 
+    check_tuning_arguments(
+        multiprocessing=args.multiprocessing,
+        n_workers=args.n_workers,
+        n_tuning_jobs=args.n_tuning_jobs,
+        tuning_strategy=args.tuning_strategy,
+        warm_start_tuning=args.warm_start_tuning,
+        threads_per_job=args.threads_per_job,
+        n_tuning_trials=args.n_tuning_trials,
+    )
+
     # TODO Allow for custom randomization tests maybe via config file
     if args.randomization_mode[0] != "None":
         if not all(randomization in ["SVCC", "SVRC", "SVSC", "SVRD"] for randomization in args.randomization_mode):
@@ -263,6 +327,13 @@ def main(args):
             run_id=args.run_id,
             overwrite=args.overwrite,
             path_data=args.path_data,
+            n_workers=args.n_workers,
+            threads_per_job=args.threads_per_job,
+            n_tuning_jobs=args.n_tuning_jobs,
+            tuning_strategy=args.tuning_strategy,
+            n_tuning_trials=args.n_tuning_trials,
+            warm_start_tuning=args.warm_start_tuning,
+            batch_single_drug_models=args.batch_single_drug_models,
         )
 
 
@@ -299,3 +370,57 @@ def get_response_transformation(response_transformation: str):
         f"Unknown response transformation {response_transformation}. Choose from 'None', "
         f"'standard', 'minmax', 'robust'"
     )
+
+
+def get_feature_cache_parser():
+    """
+    Get the parser for prebuilding the feature cache.
+    :return:
+    """
+    parser = argparse.ArgumentParser(description="Prebuild the binary feature cache of the drug response datasets.")
+    parser.add_argument(
+        "--path_data",
+        type=str,
+        default="data",
+        help="Path to the data directory",
+    )
+    parser.add_argument(
+        "--dataset_names",
+        nargs="+",
+        default=None,
+        help="Datasets to build the cache for. Default is all datasets that are present in path_data.",
+    )
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=None,
+        help="Models whose features are cached. Default is all models.",
+    )
+    return parser
+
+
+def build_feature_cache(path_data: str = "data", dataset_names: Optional[list] = None, models: Optional[list] = None):
+    """
+    Builds the feature cache by loading the cell line and drug features of every model once.
+
+    Features that are missing for a dataset are skipped with a warning.
+    :param path_data: path to the data directory
+    :param dataset_names: datasets to build the cache for. If None, all available datasets in path_data are used.
+    :param models: names of the models whose features are cached. If None, all models are used.
+    """
+    if dataset_names is None:
+        dataset_names = [name for name in AVAILABLE_DATASETS if os.path.isdir(os.path.join(path_data, name))]
+    if models is None:
+        models = list(MODEL_FACTORY)
+    for dataset_name in dataset_names:
+        for model_name in models:
+            try:
+                model = MODEL_FACTORY[model_name]()
+                model.load_cell_line_features(data_path=path_data, dataset_name=dataset_name)
+                model.load_drug_features(data_path=path_data, dataset_name=dataset_name)
+            except (OSError, KeyError, ValueError, IndexError, TypeError) as exc:
+                warnings.warn(
+                    f"Could not cache the features of {model_name} for {dataset_name}: {exc}",
+                    stacklevel=2,
+                )
+        print(f"Feature cache of {dataset_name} is up to date.")
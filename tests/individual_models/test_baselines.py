@@ -5,11 +5,14 @@ from sklearn.linear_model import ElasticNet, Ridge
 from drevalpy.evaluation import evaluate, pearson
 from drevalpy.models import (
     MODEL_FACTORY,
+    MultiOutputRandomForest,
     NaiveCellLineMeanPredictor,
     NaiveDrugMeanPredictor,
+    NaiveMeanEffectsPredictor,
     NaivePredictor,
     SingleDrugRandomForest,
 )
+from drevalpy.models.drp_model import CompositeDrugModel
 
 from .conftest import sample_dataset
 from .utils import call_save_and_load
@@ -21,6 +24,7 @@ from .utils import call_save_and_load
         "NaivePredictor",
         "NaiveDrugMeanPredictor",
         "NaiveCellLineMeanPredictor",
+        "NaiveMeanEffectsPredictor",
         "ElasticNet",
         "RandomForest",
         "SVR",
@@ -69,6 +73,8 @@ def test_baselines(sample_dataset, model_name, test_mode):
             drug_input,
             test_mode,
         )
+    elif model_name == "NaiveMeanEffectsPredictor":
+        call_naive_mean_effects_predictor(train_dataset, val_dataset, cell_line_input, drug_input, test_mode)
     else:
         call_other_baselines(
             model_name,
@@ -110,12 +116,117 @@ def test_single_drug_baselines(sample_dataset, model_name, test_mode):
         )
         pcc_drug = pearson(val_dataset.response[val_mask], all_predictions[val_mask])
         print(f"{test_mode}: Performance of {model_name} for drug {drug}: PCC = {pcc_drug}")
+    call_save_and_load(
+        model, drug_ids=drug, cell_line_ids=val_dataset.cell_line_ids[val_mask], cell_line_input=cell_line_input
+    )
     val_dataset.predictions = all_predictions
     metrics = evaluate(val_dataset, metric=["Pearson"])
     print(f"{test_mode}: Collapsed performance of {model_name}: PCC = {metrics['Pearson']}")
     assert metrics["Pearson"] > 0.0
 
 
+@pytest.mark.parametrize("test_mode", ["LPO", "LCO"])
+def test_multi_output_random_forest(sample_dataset, test_mode):
+    drug_response, cell_line_input, drug_input = sample_dataset
+    drug_response.split_dataset(n_cv_splits=5, mode=test_mode)
+    split = drug_response.cv_splits[0]
+    train_dataset = split["train"]
+    val_dataset = split["validation"]
+
+    model = MultiOutputRandomForest()
+    hpam_combi = MultiOutputRandomForest.get_hyperparameter_set()[0]
+    model.build_model(hpam_combi)
+    model.train(output=train_dataset, cell_line_input=cell_line_input)
+    # one forest with one output per drug
+    assert model.model.n_outputs_ == len(np.unique(train_dataset.drug_ids))
+    model.build_model({**hpam_combi, "max_depth": 5})
+    assert model.model.max_depth == 5
+    model.train(output=train_dataset, cell_line_input=cell_line_input)
+    val_dataset.predictions = model.predict(
+        drug_ids=val_dataset.drug_ids, cell_line_ids=val_dataset.cell_line_ids, cell_line_input=cell_line_input
+    )
+    metrics = evaluate(val_dataset, metric=["Pearson"])
+    print(f"{test_mode}: Performance of MultiOutputRandomForest: PCC = {metrics['Pearson']}")
+    assert metrics["Pearson"] > 0.0
+
+    with pytest.warns(UserWarning):
+        unknown_drug_predictions = model.predict(
+            drug_ids=np.array(["unknown"]), cell_line_ids=val_dataset.cell_line_ids[:1], cell_line_input=cell_line_input
+        )
+    assert np.all(np.isfinite(unknown_drug_predictions))
+    call_save_and_load(
+        model,
+        drug_ids=val_dataset.drug_ids,
+        cell_line_ids=val_dataset.cell_line_ids,
+        cell_line_input=cell_line_input,
+    )
+
+
+@pytest.mark.parametrize("backend", ["threading", "loky"])
+def test_composite_drug_model(sample_dataset, backend):
+    drug_response, cell_line_input, drug_input = sample_dataset
+    drug_response.split_dataset(n_cv_splits=5, mode="LPO")
+    split = drug_response.cv_splits[0]
+    train_dataset = split["train"]
+    val_dataset = split["validation"]
+    drugs = np.unique(train_dataset.drug_ids)[:4]
+    train_dataset = train_dataset.subset(train_dataset.get_drug_mask(drugs))
+
+    model = CompositeDrugModel(SingleDrugRandomForest, n_jobs=2, backend=backend)
+    hpam_combi = {**SingleDrugRandomForest.get_hyperparameter_set()[0], "n_estimators": 10, "n_jobs": 1}
+    model.build_model({drug: hpam_combi for drug in drugs})
+    model.train(output=train_dataset, cell_line_input=cell_line_input)
+    with pytest.warns(UserWarning):
+        predictions = model.predict(
+            drug_ids=val_dataset.drug_ids, cell_line_ids=val_dataset.cell_line_ids, cell_line_input=cell_line_input
+        )
+    # the predictions of every drug are scattered back to its rows, drugs without a model are NaN
+    trained = val_dataset.get_drug_mask(drugs)
+    assert np.all(np.isnan(predictions[~trained]))
+    for drug in drugs:
+        mask = val_dataset.drug_ids == drug
+        np.testing.assert_allclose(
+            predictions[mask],
+            model.models[drug].predict(
+                drug_ids=drug, cell_line_ids=val_dataset.cell_line_ids[mask], cell_line_input=cell_line_input
+            ),
+        )
+    with pytest.raises(AssertionError):
+        CompositeDrugModel(SingleDrugRandomForest, backend="multiprocessing")
+
+
+def test_elastic_net_hyperparameter_path(sample_dataset):
+    drug_response, cell_line_input, drug_input = sample_dataset
+    drug_response.split_dataset(n_cv_splits=5, mode="LPO")
+    split = drug_response.cv_splits[0]
+    train_dataset = split["train"]
+    val_dataset = split["validation"]
+    train_dataset.reduce_to(cell_line_ids=cell_line_input.identifiers, drug_ids=drug_input.identifiers)
+    val_dataset.reduce_to(cell_line_ids=cell_line_input.identifiers, drug_ids=drug_input.identifiers)
+
+    model = MODEL_FACTORY["ElasticNet"]()
+    hpams = [{"alpha": alpha, "l1_ratio": l1_ratio} for l1_ratio in [0.0, 0.5, 1.0] for alpha in [0.1, 1.0, 5.0]]
+    path_predictions = model.predict_hyperparameter_path(
+        hpam_set=hpams,
+        output=train_dataset,
+        drug_ids=val_dataset.drug_ids,
+        cell_line_ids=val_dataset.cell_line_ids,
+        drug_input=drug_input,
+        cell_line_input=cell_line_input,
+    )
+    assert path_predictions.shape == (len(hpams), len(val_dataset))
+    for hpam_combi, predictions in zip(hpams, path_predictions):
+        model.build_model(hpam_combi)
+        model.train(output=train_dataset, cell_line_input=cell_line_input, drug_input=drug_input)
+        expected = model.predict(
+            drug_ids=val_dataset.drug_ids,
+            cell_line_ids=val_dataset.cell_line_ids,
+            drug_input=drug_input,
+            cell_line_input=cell_line_input,
+        )
+        np.testing.assert_allclose(predictions, expected, atol=1e-3)
+
+
 def call_naive_predictor(train_dataset, val_dataset, test_mode):
     naive = NaivePredictor()
     naive.train(output=train_dataset)
@@ -127,15 +238,16 @@ def call_naive_predictor(train_dataset, val_dataset, test_mode):
     metrics = evaluate(val_dataset, metric=["Pearson"])
     assert metrics["Pearson"] == 0.0
     print(f"{test_mode}: Performance of NaivePredictor: PCC = {metrics['Pearson']}")
-    call_save_and_load(naive)
+    call_save_and_load(naive, drug_ids=val_dataset.drug_ids, cell_line_ids=val_dataset.cell_line_ids)
 
 
 def assert_group_mean(train_dataset, val_dataset, group_ids, naive_means):
     common_ids = np.intersect1d(group_ids["train"], group_ids["val"])
     random_id = np.random.choice(common_ids)
     group_mean = train_dataset.response[group_ids["train"] == random_id].mean()
-    assert group_mean == naive_means[random_id]
-    assert np.all(val_dataset.predictions[group_ids["val"] == random_id] == group_mean)
+    # the means are computed with a weighted bincount, which sums in a different order than np.mean
+    assert naive_means[random_id] == pytest.approx(group_mean)
+    np.testing.assert_allclose(val_dataset.predictions[group_ids["val"] == random_id], group_mean)
 
 
 def call_naive_group_predictor(group, train_dataset, val_dataset, cell_line_input, drug_input, test_mode):
@@ -178,7 +290,28 @@ def call_naive_group_predictor(group, train_dataset, val_dataset, cell_line_inpu
     print(f"{test_mode}: Performance of {naive.model_name}: PCC = {metrics['Pearson']}")
     if (group == "drug" and test_mode == "LDO") or (group == "cell_line" and test_mode == "LCO"):
         assert metrics["Pearson"] == 0.0
-    call_save_and_load(naive)
+    call_save_and_load(naive, drug_ids=val_dataset.drug_ids, cell_line_ids=val_dataset.cell_line_ids)
+
+
+def call_naive_mean_effects_predictor(train_dataset, val_dataset, cell_line_input, drug_input, test_mode):
+    naive = NaiveMeanEffectsPredictor()
+    naive.train(output=train_dataset, cell_line_input=cell_line_input, drug_input=drug_input)
+    val_dataset.predictions = naive.predict(cell_line_ids=val_dataset.cell_line_ids, drug_ids=val_dataset.drug_ids)
+    # the drug effect and the cell line effect add up, unknown drugs and cell lines have no effect
+    drug_means = NaiveDrugMeanPredictor()
+    drug_means.train(output=train_dataset, cell_line_input=cell_line_input, drug_input=drug_input)
+    cell_line_means = NaiveCellLineMeanPredictor()
+    cell_line_means.train(output=train_dataset, cell_line_input=cell_line_input, drug_input=drug_input)
+    np.testing.assert_allclose(
+        val_dataset.predictions,
+        drug_means.predict(drug_ids=val_dataset.drug_ids)
+        + cell_line_means.predict(cell_line_ids=val_dataset.cell_line_ids)
+        - naive.dataset_mean,
+    )
+    metrics = evaluate(val_dataset, metric=["Pearson"])
+    print(f"{test_mode}: Performance of {naive.model_name}: PCC = {metrics['Pearson']}")
+    assert metrics["Pearson"] > 0.0
+    call_save_and_load(naive, drug_ids=val_dataset.drug_ids, cell_line_ids=val_dataset.cell_line_ids)
 
 
 def call_other_baselines(model, train_dataset, val_dataset, cell_line_input, drug_input, test_mode):
@@ -210,4 +343,10 @@ def call_other_baselines(model, train_dataset, val_dataset, cell_line_input, dru
         metrics = evaluate(val_dataset, metric=["Pearson"])
         print(f"{test_mode}: Performance of {model}, hpams: {hpam_combi}: PCC = {metrics['Pearson']}")
         assert metrics["Pearson"] > -0.1
-    call_save_and_load(model_instance)
+    call_save_and_load(
+        model_instance,
+        drug_ids=val_dataset.drug_ids,
+        cell_line_ids=val_dataset.cell_line_ids,
+        cell_line_input=cell_line_input,
+        drug_input=drug_input,
+    )
@@ -5,6 +5,7 @@ from drevalpy.evaluation import evaluate, pearson
 from drevalpy.models import MODEL_FACTORY
 
 from .conftest import sample_dataset
+from .utils import call_save_and_load
 
 
 @pytest.mark.parametrize("test_mode", ["LCO"])
@@ -66,6 +67,9 @@ def test_molir_superfeltr(sample_dataset, model_name, test_mode):
         )
         pcc_drug = pearson(val_es_dataset.response[val_mask], all_predictions[val_mask])
         print(f"{test_mode}: Performance of {model_name} for drug {drug}: PCC = {pcc_drug}")
+        call_save_and_load(
+            model, drug_ids=drug, cell_line_ids=val_es_dataset.cell_line_ids[val_mask], cell_line_input=cell_line_input
+        )
     # subset the dataset to only the drugs that were used
     val_es_mask = np.isin(val_es_dataset.drug_ids, all_unique_drugs)
     val_es_dataset.cell_line_ids = val_es_dataset.cell_line_ids[val_es_mask]
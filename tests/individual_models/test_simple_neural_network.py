@@ -55,4 +55,20 @@ def test_simple_neural_network(sample_dataset, model_name, test_mode):
     print(f"{test_mode}: Performance of {model}, hpams: {hpam_combi}: PCC = {metrics['Pearson']}")
     assert metrics["Pearson"] > 0.0
 
-    call_save_and_load(model)
+    call_save_and_load(
+        model,
+        drug_ids=val_es_dataset.drug_ids,
+        cell_line_ids=val_es_dataset.cell_line_ids,
+        cell_line_input=cell_line_input,
+        drug_input=drug_input,
+    )
+
+
+@pytest.mark.parametrize("model_name", ["SimpleNeuralNetwork", "MultiOmicsNeuralNetwork"])
+def test_epochs_default(model_name):
+    # hyperparameters of earlier runs and custom hyperparameter files may not contain the epochs
+    hyperparameters = MODEL_FACTORY[model_name].get_hyperparameter_set()[0]
+    del hyperparameters["epochs"]
+    model = MODEL_FACTORY[model_name]()
+    model.build_model(hyperparameters)
+    assert model.epochs == 70
@@ -1,11 +1,20 @@
+import os
 import tempfile
 
-import pytest
+import numpy as np
 
 
-def call_save_and_load(model):
-    tmp = tempfile.NamedTemporaryFile()
-    with pytest.raises(NotImplementedError):
-        model.save(path=tmp.name)
-    with pytest.raises(NotImplementedError):
-        model.load(path=tmp.name)
+def call_save_and_load(model, drug_ids, cell_line_ids, cell_line_input=None, drug_input=None):
+    """Saves and loads the trained model and checks that the loaded model predicts the same."""
+    predictions = model.predict(
+        drug_ids=drug_ids, cell_line_ids=cell_line_ids, drug_input=drug_input, cell_line_input=cell_line_input
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model")
+        model.save(path=path)
+        loaded_model = type(model)()
+        loaded_model.load(path=path)
+    loaded_predictions = loaded_model.predict(
+        drug_ids=drug_ids, cell_line_ids=cell_line_ids, drug_input=drug_input, cell_line_input=cell_line_input
+    )
+    np.testing.assert_allclose(loaded_predictions, predictions, rtol=1e-5, atol=1e-6)
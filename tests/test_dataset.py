@@ -5,8 +5,12 @@ import networkx as nx
 import numpy as np
 import pytest
 from flaky import flaky
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
 
 from drevalpy.datasets.dataset import DrugResponseDataset, FeatureDataset
+from drevalpy.datasets.feature_registry import FeatureRegistry
+from drevalpy.datasets.utils import encode_pairs
 from drevalpy.utils import get_response_transformation
 
 # Tests for the DrugResponseDataset class
@@ -115,6 +119,99 @@ def test_response_data_remove_drugs_and_cell_lines():
     assert len(dataset.drug_ids) == 3
 
 
+def test_response_data_remove_drugs_and_cell_lines_with_predictions():
+    dataset = DrugResponseDataset(
+        response=np.array([1, 2, 3, 4, 5]),
+        cell_line_ids=np.array(["CL1", "CL2", "CL3", "CL1", "CL2"]),
+        drug_ids=np.array(["A", "B", "C", "D", "E"]),
+        predictions=np.array([1.5, 2.5, 3.5, 4.5, 5.5]),
+    )
+    dataset.remove_drugs("A")
+    dataset.remove_cell_lines(np.array(["CL3", "unknown"]))
+    assert np.array_equal(dataset.drug_ids, ["B", "D", "E"])
+    assert np.array_equal(dataset.response, [2, 4, 5])
+    assert np.array_equal(dataset.predictions, [2.5, 4.5, 5.5])
+
+    dataset.reduce_to(cell_line_ids={"CL1", "CL2"}, drug_ids=["D", "E"])
+    assert np.array_equal(dataset.cell_line_ids, ["CL1", "CL2"])
+    assert np.array_equal(dataset.predictions, [4.5, 5.5])
+
+
+def test_response_dataset_codes():
+    dataset = DrugResponseDataset(
+        response=np.array([1, 2, 3, 4, 5, 6]),
+        cell_line_ids=np.array(["CL2", "CL1", "CL2", "CL3", "CL1", "CL2"]),
+        drug_ids=np.array(["B", "A", "A", "B", "A", "B"]),
+        predictions=np.array([1.5, 2.5, 3.5, 4.5, 5.5, 6.5]),
+    )
+    assert dataset.cell_line_codes.dtype == np.int32
+    assert np.array_equal(dataset.cell_line_vocabulary[dataset.cell_line_codes], dataset.cell_line_ids)
+    assert np.array_equal(dataset.get_drug_mask("A"), dataset.drug_ids == "A")
+    assert np.array_equal(dataset.get_cell_line_mask(["CL1", "CL3"]), np.isin(dataset.cell_line_ids, ["CL1", "CL3"]))
+    assert not np.any(dataset.get_drug_mask("unknown"))
+
+    groups = dataset.group_row_indices("drug")
+    assert list(groups) == ["A", "B"]
+    assert np.array_equal(groups["A"], [1, 2, 4])
+    with pytest.raises(AssertionError):
+        dataset.group_row_indices("pair")
+
+    # the groups are slices of one sorted copy and match the masks
+    drug_groups = dict(dataset.groupby_drug())
+    assert list(drug_groups) == ["A", "B"]
+    assert np.array_equal(drug_groups["A"].response, dataset.response[dataset.get_drug_mask("A")])
+    assert np.array_equal(drug_groups["B"].predictions, [1.5, 4.5, 6.5])
+    assert drug_groups["A"].response.base is not None
+    assert drug_groups["A"].response.base is drug_groups["B"].response.base
+    assert drug_groups["A"].drug_vocabulary is dataset.drug_vocabulary
+    for cell_line, group in dataset.groupby_cell_line():
+        assert np.array_equal(group.drug_ids, dataset.drug_ids[dataset.get_cell_line_mask(cell_line)])
+
+    pairs = dataset.get_pair_codes()
+    assert pairs[0] == pairs[5]
+    assert pairs[1] == pairs[4]
+    assert len(np.unique(pairs)) == 4
+
+    # subsets, copies and splits share the vocabularies
+    subset = dataset.subset(groups["B"])
+    assert subset.drug_vocabulary is dataset.drug_vocabulary
+    assert np.array_equal(subset.cell_line_ids, ["CL2", "CL3", "CL2"])
+    assert np.array_equal(subset.predictions, [1.5, 4.5, 6.5])
+    copied = dataset.copy()
+    copied.mask(copied.get_cell_line_mask("CL1"))
+    assert np.array_equal(copied.drug_ids, ["A", "A"])
+    assert len(dataset) == 6
+
+    # datasets with different vocabularies are merged
+    other = DrugResponseDataset(
+        response=np.array([7]), cell_line_ids=np.array(["CL4"]), drug_ids=np.array(["A"]), predictions=np.array([7.5])
+    )
+    subset.add_rows(other)
+    assert np.array_equal(subset.cell_line_ids, ["CL2", "CL3", "CL2", "CL4"])
+    assert np.array_equal(subset.drug_ids, ["B", "B", "B", "A"])
+
+
+def test_pair_keys():
+    assert np.array_equal(encode_pairs([0, 1, 1], [1, 0, 1]), [1, 2**32, 2**32 + 1])
+    with pytest.raises(AssertionError):
+        encode_pairs([-1], [0])
+
+    # joined with "_", both pairs would be "A_B_C"
+    dataset = DrugResponseDataset(
+        response=np.array([1, 2, 3]),
+        cell_line_ids=np.array(["A_B", "A", "D"]),
+        drug_ids=np.array(["C", "B_C", "E"]),
+    )
+    other = DrugResponseDataset(
+        response=np.array([1, 2, 3]),
+        cell_line_ids=np.array(["A", "D", "F"]),
+        drug_ids=np.array(["B_C", "C", "E"]),
+    )
+    assert len(np.unique(dataset.get_pair_codes())) == 3
+    assert np.array_equal(dataset.get_pair_mask(other), [False, True, False])
+    assert np.array_equal(other.get_pair_mask(dataset), [True, False, False])
+
+
 def test_remove_rows():
     dataset = DrugResponseDataset(
         response=np.array([1, 2, 3, 4, 5]),
@@ -369,9 +466,39 @@ def test_feature_dataset_get_feature_matrix(sample_dataset):
     assert isinstance(feature_matrix, np.ndarray)
 
 
+def test_feature_dataset_get_feature_matrix_repeated_ids(sample_dataset):
+    identifiers = ["drug2", "drug1", "drug2", "drug2"]
+    feature_matrix = sample_dataset.get_feature_matrix("fingerprints", identifiers)
+    assert feature_matrix.shape == (4, 5)
+    for row, drug in zip(feature_matrix, identifiers):
+        assert np.allclose(row, sample_dataset.features[drug]["fingerprints"])
+    features = sample_dataset.get_feature_matrix("fingerprints", identifiers, stack=False)
+    assert features[0] is sample_dataset.features["drug2"]["fingerprints"]
+    with pytest.raises(AssertionError):
+        sample_dataset.get_feature_matrix("fingerprints", ["drug1", "drug6"])
+
+    sample_dataset.features["drug3"]["fingerprints"] = np.random.rand(3)
+    with pytest.raises(AssertionError):
+        sample_dataset.get_feature_matrix("fingerprints", ["drug1", "drug3"])
+    assert sample_dataset.get_feature_matrix("fingerprints", ["drug1", "drug2"], validate=False).shape == (2, 5)
+
+
+def test_feature_dataset_identifier_index(sample_dataset, graph_dataset):
+    assert np.all(sample_dataset._get_rows(["drug3", "drug6", "drug1"]) == [2, -1, 0])
+    graph_dataset = FeatureDataset(
+        features={drug: graph_dataset.features[drug] for drug in ["drug5", "drug2"]},
+        meta_info=graph_dataset.meta_info,
+    )
+    sample_dataset._add_features(graph_dataset)
+    assert np.all(sample_dataset._get_rows(["drug5", "drug2", "drug1"]) == [1, 0, -1])
+    copied_dataset = sample_dataset.copy()
+    assert np.all(copied_dataset._get_rows(["drug5", "drug2"]) == [1, 0])
+
+
 def test_feature_dataset_copy(sample_dataset):
     copied_dataset = sample_dataset.copy()
-    assert copied_dataset.features["drug1"]["fingerprints"] is not sample_dataset.features["drug1"]["fingerprints"]
+    # copies are copy-on-write: they share the feature arrays until a feature is replaced
+    assert copied_dataset.features["drug1"] is not sample_dataset.features["drug1"]
     assert np.allclose(
         copied_dataset.features["drug1"]["fingerprints"],
         sample_dataset.features["drug1"]["fingerprints"],
@@ -447,6 +574,222 @@ def test_add_features(sample_dataset, graph_dataset):
     assert "molecular_graph" in sample_dataset.get_view_names()
 
 
+@pytest.fixture
+def dense_dataset():
+    identifiers = ["drug1", "drug2", "drug3", "drug4", "drug5"]
+    matrices = {"fingerprints": np.random.rand(5, 5), "chemical_features": np.random.rand(5, 3)}
+    meta_info = {"fingerprints": ["Dim1", "Dim2", "Dim3", "Dim4", "Dim5"]}
+    return FeatureDataset.from_matrices(identifiers=identifiers, matrices=matrices, meta_info=meta_info)
+
+
+def test_dense_feature_dataset_views(dense_dataset):
+    assert dense_dataset.dense_views == ["fingerprints", "chemical_features"]
+    assert dense_dataset.get_view_names() == ["fingerprints", "chemical_features"]
+    assert np.all(dense_dataset.identifiers == ["drug1", "drug2", "drug3", "drug4", "drug5"])
+    assert len(dense_dataset.features) == 5
+    assert "drug3" in dense_dataset.features
+    assert list(dense_dataset.features["drug3"]) == ["fingerprints", "chemical_features"]
+    assert np.allclose(
+        dense_dataset.features["drug3"]["fingerprints"],
+        dense_dataset.get_feature_matrix("fingerprints", ["drug3"])[0],
+    )
+    dense_dataset.features["drug3"]["fingerprints"] = np.zeros(5)
+    assert np.allclose(dense_dataset.get_feature_matrix("fingerprints", ["drug3"]), 0)
+    assert dense_dataset.dense_views == ["fingerprints", "chemical_features"]
+    # a feature that does not fit into the matrix moves the view back to the per-identifier storage
+    dense_dataset.features["drug3"]["fingerprints"] = np.zeros(2)
+    assert dense_dataset.dense_views == ["chemical_features"]
+    assert dense_dataset.features["drug3"]["fingerprints"].shape == (2,)
+    assert dense_dataset.features["drug1"]["fingerprints"].shape == (5,)
+
+
+def test_dense_feature_dataset_errors():
+    with pytest.raises(AssertionError):
+        FeatureDataset.from_matrices(identifiers=["drug1", "drug1"], matrices={"fingerprints": np.random.rand(2, 5)})
+    with pytest.raises(AssertionError):
+        FeatureDataset.from_matrices(identifiers=["drug1", "drug2"], matrices={"fingerprints": np.random.rand(3, 5)})
+    dataset = FeatureDataset.from_matrices(identifiers=["drug1"], matrices={"fingerprints": np.random.rand(1, 5)})
+    with pytest.raises(AssertionError):
+        dataset.get_feature_matrix("fingerprints", ["drug1", "drug2"])
+
+
+def test_to_dense(sample_dataset, graph_dataset):
+    expected = sample_dataset.get_feature_matrix("fingerprints", ["drug5", "drug1"])
+    sample_dataset.to_dense()
+    assert sample_dataset.dense_views == ["fingerprints", "chemical_features"]
+    assert np.allclose(sample_dataset.get_feature_matrix("fingerprints", ["drug5", "drug1"]), expected)
+    with pytest.raises(AssertionError):
+        graph_dataset.to_dense(views=["molecular_graph"])
+
+
+def test_dense_feature_dataset_copy(dense_dataset):
+    copied_dataset = dense_dataset.copy()
+    assert copied_dataset._dense_features["fingerprints"] is dense_dataset._dense_features["fingerprints"]
+    copied_dataset.features["drug1"]["fingerprints"] = np.zeros(5)
+    assert not np.allclose(dense_dataset.features["drug1"]["fingerprints"], 0)
+    dense_dataset.features["drug2"]["fingerprints"] = np.ones(5)
+    assert not np.allclose(copied_dataset.features["drug2"]["fingerprints"], 1)
+    assert copied_dataset.dense_views == dense_dataset.dense_views
+
+    # only the transformed view is materialized
+    copied_dataset = dense_dataset.copy()
+    copied_dataset.fit_transform_features(
+        train_ids=["drug1", "drug2"], transformer=StandardScaler(), view="fingerprints"
+    )
+    assert copied_dataset._dense_features["fingerprints"] is not dense_dataset._dense_features["fingerprints"]
+    assert copied_dataset._dense_features["chemical_features"] is dense_dataset._dense_features["chemical_features"]
+
+
+@flaky(max_runs=25)  # permutation randomization might map to the same feature vector for some tries
+def test_dense_permutation_randomization(dense_dataset):
+    start_dataset = dense_dataset.copy()
+    dense_dataset.randomize_features("fingerprints", "permutation")
+    for drug in dense_dataset.identifiers:
+        assert not np.allclose(
+            dense_dataset.features[drug]["fingerprints"], start_dataset.features[drug]["fingerprints"]
+        )
+    assert np.allclose(
+        dense_dataset.get_feature_matrix("chemical_features", dense_dataset.identifiers),
+        start_dataset.get_feature_matrix("chemical_features", start_dataset.identifiers),
+    )
+
+
+def test_dense_add_features(dense_dataset, graph_dataset):
+    graph_dataset = FeatureDataset(
+        features={drug: graph_dataset.features[drug] for drug in ["drug4", "drug2"]},
+        meta_info=graph_dataset.meta_info,
+    )
+    expected = dense_dataset.get_feature_matrix("fingerprints", ["drug2", "drug4"])
+    dense_dataset._add_features(graph_dataset)
+    assert np.all(dense_dataset.identifiers == ["drug2", "drug4"])
+    assert dense_dataset.get_view_names() == ["fingerprints", "chemical_features", "molecular_graph"]
+    assert np.allclose(dense_dataset.get_feature_matrix("fingerprints", ["drug2", "drug4"]), expected)
+    assert isinstance(dense_dataset.features["drug4"]["molecular_graph"], nx.Graph)
+
+
+def test_dense_transform_features(dense_dataset):
+    train_ids = ["drug1", "drug2", "drug3"]
+    scaler = dense_dataset.fit_transform_features(
+        train_ids=train_ids, transformer=StandardScaler(), view="fingerprints"
+    )
+    assert np.allclose(dense_dataset.get_feature_matrix("fingerprints", train_ids).mean(axis=0), 0)
+    dense_dataset.transform_features(ids=["drug4"], transformer=scaler, view="fingerprints")
+    assert "fingerprints" in dense_dataset.dense_views
+
+    pca = PCA(n_components=2).fit(dense_dataset.get_feature_matrix("chemical_features", train_ids))
+    dense_dataset.transform_features(ids=["drug1"], transformer=pca, view="chemical_features")
+    assert "chemical_features" not in dense_dataset.dense_views
+    assert dense_dataset.features["drug1"]["chemical_features"].shape == (2,)
+    assert dense_dataset.features["drug2"]["chemical_features"].shape == (3,)
+
+
+def test_out_of_place_transform_features(sample_dataset, dense_dataset):
+    train_ids = ["drug1", "drug2", "drug3"]
+    for dataset in [sample_dataset, dense_dataset]:
+        expected = StandardScaler().fit_transform(dataset.get_feature_matrix("fingerprints", dataset.identifiers))
+        original = dataset.get_feature_matrix("fingerprints", dataset.identifiers)
+        scaler = StandardScaler()
+        transformed = dataset.fit_transform_features(
+            train_ids=dataset.identifiers, transformer=scaler, view="fingerprints", inplace=False
+        )
+        assert np.allclose(transformed.get_feature_matrix("fingerprints", transformed.identifiers), expected)
+        assert np.allclose(dataset.get_feature_matrix("fingerprints", dataset.identifiers), original)
+
+        transformed = dataset.transform_features(ids=train_ids, transformer=scaler, view="fingerprints", inplace=False)
+        assert np.allclose(transformed.get_feature_matrix("fingerprints", train_ids), expected[:3])
+        assert np.allclose(dataset.get_feature_matrix("fingerprints", dataset.identifiers), original)
+
+        logged = dataset._apply(function=np.log, view="fingerprints", inplace=False, batched=True)
+        assert np.allclose(logged.get_feature_matrix("fingerprints", logged.identifiers), np.log(original))
+        assert np.allclose(dataset.get_feature_matrix("fingerprints", dataset.identifiers), original)
+
+
+def test_batched_transform_features(sample_dataset):
+    class CountingScaler(StandardScaler):
+        n_transform_calls = 0
+
+        def transform(self, X, copy=None):
+            CountingScaler.n_transform_calls += 1
+            return super().transform(X, copy=copy)
+
+    expected = sample_dataset.get_feature_matrix("fingerprints", sample_dataset.identifiers)
+    scaler = sample_dataset.fit_transform_features(
+        train_ids=sample_dataset.identifiers, transformer=CountingScaler(), view="fingerprints"
+    )
+    sample_dataset.transform_features(ids=["drug1", "drug2"], transformer=scaler, view="fingerprints")
+    assert CountingScaler.n_transform_calls == 2
+    assert np.allclose(
+        sample_dataset.get_feature_matrix("fingerprints", ["drug3"]), StandardScaler().fit_transform(expected)[[2]]
+    )
+
+    # vectors of different lengths are transformed one by one
+    sample_dataset.features["drug1"]["chemical_features"] = np.ones(2)
+    original = sample_dataset.features["drug2"]["chemical_features"]
+    sample_dataset._apply(function=np.negative, view="chemical_features", batched=True)
+    assert np.allclose(sample_dataset.features["drug1"]["chemical_features"], -1)
+    assert np.allclose(sample_dataset.features["drug2"]["chemical_features"], -original)
+
+
+def test_feature_registry():
+    registry = FeatureRegistry(max_bytes=2 * 5 * 5 * 8)
+
+    def load():
+        return FeatureDataset.from_matrices(
+            identifiers=["drug1", "drug2", "drug3", "drug4", "drug5"], matrices={"fingerprints": np.random.rand(5, 5)}
+        )
+
+    first = registry.get_or_load(key="a", load=load)
+    second = registry.get_or_load(key="a", load=load)
+    assert registry.stats()["hits"] == 1
+    assert registry.stats()["misses"] == 1
+    assert np.allclose(
+        first.get_feature_matrix("fingerprints", ["drug1"]), second.get_feature_matrix("fingerprints", ["drug1"])
+    )
+
+    # modifying a view does not change the registered dataset
+    first.features["drug1"]["fingerprints"] = np.zeros(5)
+    first.randomize_features("fingerprints", "invariant")
+    assert not np.allclose(registry.get_or_load(key="a", load=load).features["drug1"]["fingerprints"], 0)
+
+    registry.get_or_load(key="b", load=load)
+    registry.get_or_load(key="c", load=load)
+    stats = registry.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    registry.get_or_load(key="a", load=load)
+    assert registry.stats()["misses"] == 4
+
+
+def test_feature_registry_copies_are_independent():
+    registry = FeatureRegistry()
+    matrix = np.random.rand(2, 3)
+
+    def load():
+        dataset = FeatureDataset(
+            features={
+                "drug1": {"embedding": np.zeros(2), "graph": {"nodes": [0, 1]}},
+                "drug2": {"embedding": np.ones(3), "graph": {"nodes": [2]}},
+            }
+        )
+        dataset._add_features(FeatureDataset.from_matrices(identifiers=["drug1", "drug2"], matrices={"dense": matrix}))
+        return dataset
+
+    copied = registry.get_or_load(key="a", load=load)
+    copied.features["drug1"]["embedding"][0] = 5
+    copied.features["drug1"]["graph"]["nodes"].append(2)
+    copied._apply(function=lambda graph: graph.update(nodes=[]), view="graph")
+    copied.features["drug2"]["dense"] = np.zeros(3)
+
+    registered = registry.get_or_load(key="a", load=load)
+    assert np.allclose(registered.features["drug1"]["embedding"], 0)
+    assert registered.features["drug1"]["graph"] == {"nodes": [0, 1]}
+    assert registered.features["drug2"]["graph"] == {"nodes": [2]}
+    assert np.allclose(registered.get_feature_matrix("dense", ["drug1", "drug2"]), matrix)
+    # the loaded matrix itself stays writable
+    assert matrix.flags.writeable
+    matrix[0, 0] = 1
+
+
 # Run the tests
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -5,6 +5,8 @@ import numpy as np
 import pandas as pd
 import pytest
 
+from drevalpy.datasets.dataset import FeatureDataset
+from drevalpy.datasets.feature_cache import get_cache_dir
 from drevalpy.models import MODEL_FACTORY
 from drevalpy.models.utils import (
     get_multiomics_feature_dataset,
@@ -21,6 +23,7 @@ def test_factory():
     assert "NaivePredictor" in MODEL_FACTORY
     assert "NaiveDrugMeanPredictor" in MODEL_FACTORY
     assert "NaiveCellLineMeanPredictor" in MODEL_FACTORY
+    assert "NaiveMeanEffectsPredictor" in MODEL_FACTORY
     assert "ElasticNet" in MODEL_FACTORY
     assert "RandomForest" in MODEL_FACTORY
     assert "SVR" in MODEL_FACTORY
@@ -32,7 +35,9 @@ def test_factory():
     assert "GradientBoosting" in MODEL_FACTORY
     assert "MOLIR" in MODEL_FACTORY
     assert "SuperFELTR" in MODEL_FACTORY
-    assert len(MODEL_FACTORY) == 14
+    assert "DIPK" in MODEL_FACTORY
+    assert "MultiOutputRandomForest" in MODEL_FACTORY
+    assert len(MODEL_FACTORY) == 17
 
 
 def test_load_cl_ids_from_csv():
@@ -176,6 +181,38 @@ def test_load_drugs_from_fingerprints():
     assert np.all(drug_features_gdsc1.features["Zibotentan"]["fingerprints"] == [1, 1, 0, 1, 1])
 
 
+def test_feature_cache():
+    temp = tempfile.TemporaryDirectory()
+    os.mkdir(os.path.join(temp.name, "GDSC1_small"))
+    temp_file = os.path.join(temp.name, "GDSC1_small", "gene_expression.csv")
+    with open(temp_file, "w") as f:
+        f.write("cellosaurus_id,CELL_LINE_NAME,TSPAN6,TNMD\nCVCL_1104,CAL-120,7.5,2.5\nCVCL_1174,DMS 114,1.5,3.5\n")
+    gene_features = load_and_reduce_gene_features("gene_expression", None, temp.name, "GDSC1_small")
+    assert os.path.exists(os.path.join(get_cache_dir(temp.name, "GDSC1_small"), "gene_expression.npy"))
+
+    cached_gene_features = load_and_reduce_gene_features("gene_expression", None, temp.name, "GDSC1_small")
+    assert np.all(cached_gene_features.identifiers == gene_features.identifiers)
+    assert np.all(cached_gene_features.meta_info["gene_expression"] == ["TSPAN6", "TNMD"])
+    assert np.allclose(
+        cached_gene_features.get_feature_matrix("gene_expression", ["DMS 114", "CAL-120"]), [[1.5, 3.5], [7.5, 2.5]]
+    )
+    # writing into a memory-mapped view copies the matrix
+    cached_gene_features.features["CAL-120"]["gene_expression"] = np.zeros(2)
+    assert np.allclose(
+        load_and_reduce_gene_features("gene_expression", None, temp.name, "GDSC1_small").features["CAL-120"][
+            "gene_expression"
+        ],
+        [7.5, 2.5],
+    )
+
+    # changing the source file invalidates the cache
+    with open(temp_file, "w") as f:
+        f.write("cellosaurus_id,CELL_LINE_NAME,TSPAN6,TNMD\nCVCL_1104,CAL-120,9.5,2.5\nCVCL_1174,DMS 114,1.5,3.5\n")
+    os.utime(temp_file, ns=(0, 0))
+    updated_gene_features = load_and_reduce_gene_features("gene_expression", None, temp.name, "GDSC1_small")
+    assert np.allclose(updated_gene_features.features["CAL-120"]["gene_expression"], [9.5, 2.5])
+
+
 @pytest.mark.parametrize(
     "gene_list",
     [
@@ -291,6 +328,57 @@ def test_get_multiomics_feature_dataset(gene_list):
         assert "The following genes are missing from the dataset GDSC1_small" in str(valerr.value)
 
 
+def test_get_feature_matrices():
+    cell_line_input = FeatureDataset.from_matrices(
+        identifiers=["CL1", "CL2", "CL3"], matrices={"gene_expression": np.random.rand(3, 4)}
+    )
+    drug_input = FeatureDataset.from_matrices(
+        identifiers=["D1", "D2"], matrices={"fingerprints": np.random.randint(0, 2, size=(2, 3))}
+    )
+    cell_line_ids = np.array(["CL2", "CL1", "CL2", "CL3", "CL2"])
+    drug_ids = np.array(["D1", "D1", "D2", "D2", "D1"])
+    model = MODEL_FACTORY["ElasticNet"]()
+    inputs = model.get_feature_matrices(
+        cell_line_ids=cell_line_ids, drug_ids=drug_ids, cell_line_input=cell_line_input, drug_input=drug_input
+    )
+    expected_gene_expression = cell_line_input.get_feature_matrix("gene_expression", cell_line_ids)
+    expected_fingerprints = drug_input.get_feature_matrix("fingerprints", drug_ids)
+    assert np.allclose(inputs["gene_expression"], expected_gene_expression)
+    assert np.allclose(inputs["fingerprints"], expected_fingerprints)
+
+    compact_inputs = model.get_feature_matrices(
+        cell_line_ids=cell_line_ids,
+        drug_ids=drug_ids,
+        cell_line_input=cell_line_input,
+        drug_input=drug_input,
+        compact=True,
+    )
+    unique_matrix, inverse = compact_inputs["gene_expression"]
+    assert unique_matrix.shape == (3, 4)
+    assert np.allclose(unique_matrix[inverse], expected_gene_expression)
+
+    x = model.get_concatenated_features(
+        cell_line_view="gene_expression",
+        drug_view="fingerprints",
+        cell_line_ids_output=cell_line_ids,
+        drug_ids_output=drug_ids,
+        cell_line_input=cell_line_input,
+        drug_input=drug_input,
+        dtype=np.float32,
+    )
+    assert x.dtype == np.float32
+    assert np.allclose(x, np.concatenate((expected_gene_expression, expected_fingerprints), axis=1))
+
+    # missing ids are not mapped to the features of another id
+    with pytest.raises(AssertionError):
+        model.get_feature_matrices(
+            cell_line_ids=np.array(["CL1", None], dtype=object),
+            drug_ids=np.array(["D1", "D2"]),
+            cell_line_input=cell_line_input,
+            drug_input=drug_input,
+        )
+
+
 def test_unique():
     array = np.array([1, 9, 3, 2, 1, 4, 5, 6, 7, 8, 9, 2, 1, 2, 3, 4, 5, 6, 7, 8, 9])
     unique_array = unique(array)
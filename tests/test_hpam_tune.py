@@ -0,0 +1,167 @@
+"""Tests for the hyperparameter tuning."""
+
+import numpy as np
+import pytest
+
+from drevalpy.datasets.loader import load_toy
+from drevalpy.experiment import (
+    apply_budget,
+    evaluate_hyperparameter_path,
+    get_best_hyperparameters,
+    hpam_tune,
+    warm_start_hpam_set,
+)
+from drevalpy.hyperparameter_search import HyperparameterRange
+from drevalpy.models import MODEL_FACTORY
+
+
+def test_get_best_hyperparameters():
+    """Test the selection of the best hyperparameters for metrics that are minimized or maximized."""
+    hpam_set = [{"alpha": 1}, {"alpha": 2}, {"alpha": 3}, {"alpha": 4}]
+    scores = [0.5, np.nan, 0.2, 0.2]
+    assert get_best_hyperparameters(hpam_set, scores, metric="RMSE") == {"alpha": 3}
+    assert get_best_hyperparameters(hpam_set, scores, metric="Pearson") == {"alpha": 1}
+    with pytest.warns(UserWarning):
+        assert get_best_hyperparameters(hpam_set, [np.nan] * 4, metric="RMSE") == {"alpha": 4}
+
+
+def test_hpam_tune_parallel():
+    """Test that tuning in parallel processes selects the same hyperparameters as tuning in serial."""
+    drug_response = load_toy("../data")
+    drug_response.split_dataset(n_cv_splits=2, mode="LPO", random_state=42)
+    split = drug_response.cv_splits[0]
+    model = MODEL_FACTORY["ElasticNet"]()
+    hpam_set = [{"alpha": alpha, "l1_ratio": 0.5} for alpha in [0.1, 1.0, 100.0]]
+    tuning_inputs = {
+        "model": model,
+        "train_dataset": split["train"],
+        "validation_dataset": split["validation"],
+        "hpam_set": hpam_set,
+        "metric": "RMSE",
+        "path_data": "../data",
+    }
+    best_serial = hpam_tune(**tuning_inputs, n_jobs=1)
+    best_parallel = hpam_tune(**tuning_inputs, n_jobs=2)
+    assert best_serial == best_parallel
+    assert best_serial in hpam_set
+
+
+def test_hyperparameter_path_features():
+    """Test that the path uses the features it is given and only loads the missing ones."""
+    drug_response = load_toy("../data")
+    drug_response.split_dataset(n_cv_splits=2, mode="LPO", random_state=42)
+    split = drug_response.cv_splits[0]
+    model = MODEL_FACTORY["ElasticNet"]()
+    evaluation_inputs = {
+        "model": model,
+        "train_dataset": split["train"],
+        "validation_dataset": split["validation"],
+        "metric": "RMSE",
+        "path_data": "../data",
+        "response_transformation": None,
+    }
+    hpam_set = [{"alpha": alpha, "l1_ratio": 0.5} for alpha in [0.01, 0.1]]
+    cl_features = model.load_cell_line_features(data_path="../data", dataset_name="Toy_Data").copy()
+    cl_features.randomize_features("gene_expression", randomization_type="permutation")
+    drug_features = model.load_drug_features(data_path="../data", dataset_name="Toy_Data")
+
+    loaded_scores = evaluate_hyperparameter_path(hpam_set=hpam_set, evaluation_inputs=evaluation_inputs)
+    randomized_scores = evaluate_hyperparameter_path(
+        hpam_set=hpam_set,
+        evaluation_inputs={**evaluation_inputs, "cl_features": cl_features, "drug_features": drug_features},
+    )
+    partial_scores = evaluate_hyperparameter_path(
+        hpam_set=hpam_set, evaluation_inputs={**evaluation_inputs, "cl_features": cl_features}
+    )
+    np.testing.assert_allclose(partial_scores, randomized_scores)
+    assert not np.allclose(partial_scores, loaded_scores)
+
+
+def test_apply_budget():
+    """Test that the budget reduces the epochs, the number of trees or the training rows of a whole round."""
+    drug_response = load_toy("../data")
+    hpam_set, train_dataset = apply_budget(
+        [{"epochs": 30, "dropout_prob": 0.2}, {"epochs": 60, "dropout_prob": 0.1}], drug_response, fraction=1 / 9
+    )
+    assert hpam_set == [{"epochs": 3, "dropout_prob": 0.2}, {"epochs": 7, "dropout_prob": 0.1}]
+    assert train_dataset is drug_response
+    hpam_set, _ = apply_budget([{"n_estimators": 100}], drug_response, fraction=1 / 27)
+    assert hpam_set == [{"n_estimators": 4}]
+    # without a budget hyperparameter, all combinations share one subsample of the training rows
+    hpam_set, train_dataset = apply_budget([{"alpha": 1.0}, {"alpha": 0.1}], drug_response, fraction=1 / 3)
+    assert hpam_set == [{"alpha": 1.0}, {"alpha": 0.1}]
+    assert len(train_dataset) == round(len(drug_response) / 3)
+    hpam_set, train_dataset = apply_budget([{"epochs": 30}, {"alpha": 0.1}], drug_response, fraction=1 / 3)
+    assert hpam_set == [{"epochs": 30}, {"alpha": 0.1}]
+    assert len(train_dataset) == round(len(drug_response) / 3)
+    hpam_set, train_dataset = apply_budget([{"epochs": 30}], drug_response, fraction=1.0)
+    assert hpam_set == [{"epochs": 30}]
+    assert train_dataset is drug_response
+
+
+def test_hpam_tune_successive_halving():
+    """Test that successive halving returns a combination of the grid and that unknown strategies are rejected."""
+    drug_response = load_toy("../data")
+    drug_response.split_dataset(n_cv_splits=2, mode="LPO", random_state=42)
+    split = drug_response.cv_splits[0]
+    model = MODEL_FACTORY["ElasticNet"]()
+    hpam_set = [{"alpha": alpha, "l1_ratio": l1_ratio} for alpha in [0.01, 0.1, 1.0] for l1_ratio in [0, 0.5, 1]]
+    best_hpams = hpam_tune(
+        model=model,
+        train_dataset=split["train"],
+        validation_dataset=split["validation"],
+        hpam_set=hpam_set,
+        metric="RMSE",
+        path_data="../data",
+        strategy="successive_halving",
+    )
+    assert best_hpams in hpam_set
+    with pytest.raises(AssertionError):
+        hpam_tune(
+            model=model,
+            train_dataset=split["train"],
+            validation_dataset=split["validation"],
+            hpam_set=hpam_set,
+            path_data="../data",
+            strategy="bayesian",
+        )
+
+
+def test_hpam_tune_tpe():
+    """Test that the tree-structured Parzen estimator searches continuous ranges with a fixed number of trials."""
+    drug_response = load_toy("../data")
+    drug_response.split_dataset(n_cv_splits=2, mode="LPO", random_state=42)
+    split = drug_response.cv_splits[0]
+    model = MODEL_FACTORY["ElasticNet"]()
+    hpam_space = {"alpha": HyperparameterRange(0.01, 10, log=True), "l1_ratio": [0, 0.5, 1]}
+    best_hpams = hpam_tune(
+        model=model,
+        train_dataset=split["train"],
+        validation_dataset=split["validation"],
+        hpam_set=[{"alpha": 1.0, "l1_ratio": 0.5}],
+        metric="RMSE",
+        path_data="../data",
+        strategy="tpe",
+        hpam_space=hpam_space,
+        n_trials=12,
+    )
+    assert 0.01 <= best_hpams["alpha"] <= 10
+    assert best_hpams["l1_ratio"] in [0, 0.5, 1]
+
+
+def test_warm_start_hpam_set():
+    """Test that the best combinations of previous splits come first and dominated combinations are pruned."""
+    hpam_set = [{"alpha": alpha} for alpha in range(6)]
+    previous_scores = [
+        [{"hyperparameters": {"alpha": alpha}, "score": score} for alpha, score in enumerate([5, 1, 2, 0.5, 4, 3])],
+        [{"hyperparameters": {"alpha": alpha}, "score": score} for alpha, score in enumerate([5, 2, 1, 0.5, 0.7, 3])],
+    ]
+    # top 2: alpha 3 (mean rank 1) and alpha 1 (mean rank 3, tie with alpha 2 goes to the first). alpha 2 and 4 beat
+    # alpha 1 in the second split, alpha 0 and 5 are dominated, alpha 6 was never evaluated
+    warm_started = warm_start_hpam_set(hpam_set + [{"alpha": 6}], previous_scores, metric="RMSE", top_k=2)
+    assert warm_started == [{"alpha": 3}, {"alpha": 1}, {"alpha": 2}, {"alpha": 4}, {"alpha": 6}]
+    # for metrics that are maximized, higher scores are better
+    warm_started = warm_start_hpam_set(hpam_set, previous_scores, metric="Pearson", top_k=2)
+    assert warm_started == [{"alpha": 0}, {"alpha": 5}, {"alpha": 4}]
+    # not enough previous scores: nothing is pruned
+    assert warm_start_hpam_set(hpam_set, previous_scores[:1], metric="RMSE", top_k=6) == hpam_set
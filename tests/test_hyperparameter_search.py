@@ -0,0 +1,68 @@
+"""Tests for the hyperparameter search spaces and the tree-structured Parzen estimator."""
+
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from drevalpy.hyperparameter_search import HyperparameterRange, TreeParzenEstimator, get_grid
+from drevalpy.models import MODEL_FACTORY
+
+
+def test_hyperparameter_space():
+    """Test parsing ranges from a hyperparameters.yaml file and expanding them to a grid."""
+    temp_dir = tempfile.TemporaryDirectory()
+    hyperparameter_file = os.path.join(temp_dir.name, "hyperparameters.yaml")
+    with open(hyperparameter_file, "w", encoding="utf-8") as f:
+        f.write(
+            "ElasticNet:\n"
+            "  alpha:\n"
+            "    low: 0.01\n"
+            "    high: 100\n"
+            "    log: true\n"
+            "  l1_ratio:\n"
+            "    low: 0\n"
+            "    high: 1\n"
+            "    grid_points: 3\n"
+            "  max_iter: 1000\n"
+            "  thresholds:\n"
+            "    GDSC1: 0.1\n"
+        )
+    model_class = MODEL_FACTORY["ElasticNet"]
+    space = model_class.get_hyperparameter_space(hyperparameter_file)
+    assert isinstance(space["alpha"], HyperparameterRange)
+    assert space["alpha"].log
+    assert space["max_iter"] == [1000]
+    assert space["thresholds"] == [{"GDSC1": 0.1}]
+    grid = get_grid(space)
+    np.testing.assert_allclose(grid["alpha"], [0.01, 0.1, 1, 10, 100])
+    assert grid["l1_ratio"] == [0.0, 0.5, 1.0]
+    assert len(model_class.get_hyperparameter_set(hyperparameter_file)) == 15
+
+    assert HyperparameterRange(1, 10, integer=True, grid_points=20).grid() == list(range(1, 11))
+    with pytest.raises(AssertionError):
+        HyperparameterRange(0, 1, log=True)
+    with pytest.raises(AssertionError):
+        HyperparameterRange.from_dict({"low": 0, "high": 1, "step": 0.1})
+
+
+def test_tree_parzen_estimator():
+    """Test that the proposals stay in the search space and concentrate around the optimum."""
+    space = {
+        "x": HyperparameterRange(1e-4, 1e2, log=True),
+        "n": HyperparameterRange(1, 50, integer=True),
+        "layers": [[8], [16, 8], [32, 16, 8]],
+    }
+    optimizer = TreeParzenEstimator(space=space, random_state=0)
+    for _ in range(60):
+        hpams = optimizer.ask()
+        assert 1e-4 <= hpams["x"] <= 1e2
+        assert isinstance(hpams["n"], int) and 1 <= hpams["n"] <= 50
+        assert hpams["layers"] in space["layers"]
+        score = (np.log10(hpams["x"]) - 0) ** 2 + ((hpams["n"] - 10) / 10) ** 2 + (hpams["layers"] != [16, 8])
+        optimizer.tell(hpams, score)
+    scores = np.array([score for _, score in optimizer.observations])
+    # the model-based proposals are better than the random startup proposals
+    assert np.median(scores[-20:]) < np.median(scores[:10])
+    assert scores.min() < 0.5
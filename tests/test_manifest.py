@@ -0,0 +1,183 @@
+"""Tests for the job manifest, atomic result files and incremental experiments."""
+
+import os
+
+import numpy as np
+import pytest
+
+from drevalpy.datasets.dataset import DrugResponseDataset
+from drevalpy.datasets.loader import load_dataset, load_toy
+from drevalpy.datasets.utils import atomic_write
+from drevalpy.experiment import drug_response_experiment
+from drevalpy.manifest import JobManifest, hash_inputs, run_tracked, track_jobs
+from drevalpy.models import MODEL_FACTORY
+from drevalpy.scheduler import Job, run_jobs
+
+
+def _write(path: str, content: str) -> list[str]:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return [path]
+
+
+def _fail():
+    raise ValueError("job failed")
+
+
+def _dataset(response: list[float]) -> DrugResponseDataset:
+    return DrugResponseDataset(
+        response=np.array(response),
+        cell_line_ids=np.array(["A", "B", "C"]),
+        drug_ids=np.array(["d1", "d1", "d2"]),
+        dataset_name="toy",
+    )
+
+
+def test_job_manifest(tmp_path):
+    manifest = JobManifest(os.path.join(tmp_path, "manifest.sqlite"))
+    key = ("ElasticNet", None, 0, "main")
+    assert manifest.get(key) is None
+    manifest.start(key, inputs_hash="abc")
+    assert manifest.get(key)["status"] == "running"
+    assert not manifest.is_done(key, inputs_hash="abc")
+    manifest.finish(key, outputs=["predictions.csv"])
+    record = manifest.get(key)
+    assert record["status"] == "done"
+    assert record["outputs"] == ["predictions.csv"]
+    assert record["finished"] >= record["started"]
+    assert manifest.is_done(key, inputs_hash="abc")
+    assert not manifest.is_done(key, inputs_hash="def")
+
+    with pytest.raises(ValueError):
+        run_tracked(manifest, key=("other",), inputs_hash="abc", function=_fail, kwargs={})
+    assert manifest.get(("other",))["status"] == "failed"
+    assert "job failed" in manifest.get(("other",))["error"]
+    assert manifest.status_counts() == {"done": 1, "failed": 1}
+
+
+def test_hash_inputs():
+    dataset = _dataset([0.1, 0.2, 0.3])
+    inputs = {"model_name": "ElasticNet", "train_dataset": dataset}
+    assert hash_inputs(inputs) == hash_inputs({"model_name": "ElasticNet", "train_dataset": _dataset([0.1, 0.2, 0.3])})
+    assert hash_inputs(inputs) != hash_inputs({"model_name": "ElasticNet", "train_dataset": _dataset([0.1, 0.2, 0.4])})
+    assert hash_inputs(inputs) != hash_inputs({"model_name": "RandomForest", "train_dataset": dataset})
+
+
+def test_track_jobs(tmp_path):
+    manifest = JobManifest(os.path.join(tmp_path, "manifest.sqlite"))
+    main_path = os.path.join(tmp_path, "main.txt")
+    jobs = [
+        Job(key="main", function=_write, kwargs={"path": main_path, "content": "main"}),
+        Job(
+            key="robustness",
+            function=_write,
+            kwargs={"path": os.path.join(tmp_path, "robustness.txt"), "content": "robustness"},
+            depends_on=("main",),
+        ),
+    ]
+    tracked_jobs, n_done = track_jobs(jobs, manifest)
+    assert n_done == 0
+    run_jobs(tracked_jobs)
+    assert manifest.status_counts() == {"done": 2}
+
+    # a restart skips all jobs
+    tracked_jobs, n_done = track_jobs(jobs, manifest)
+    assert n_done == 2
+    assert tracked_jobs == []
+
+    # changed inputs of the main job rerun it and the jobs depending on it, the old outputs are deleted first
+    jobs[0] = Job(key="main", function=_write, kwargs={"path": main_path, "content": "changed"})
+    tracked_jobs, n_done = track_jobs(jobs, manifest)
+    assert n_done == 0
+    assert [job.key for job in tracked_jobs] == ["main", "robustness"]
+    run_jobs(tracked_jobs)
+    with open(main_path, encoding="utf-8") as f:
+        assert f.read() == "changed"
+
+    # untracked inputs do not invalidate a job
+    manifest = JobManifest(os.path.join(tmp_path, "untracked.sqlite"))
+    run_jobs(track_jobs(jobs, manifest, untracked_inputs=frozenset({"path"}))[0])
+    jobs[1].kwargs["path"] = os.path.join(tmp_path, "moved.txt")
+    _, n_done = track_jobs(jobs, manifest, untracked_inputs=frozenset({"path"}))
+    assert n_done == 2
+
+
+def test_atomic_write(tmp_path):
+    path = os.path.join(tmp_path, "result.csv")
+    atomic_write(path, write=lambda f: f.write(b"complete"))
+
+    def write_partially(f):
+        f.write(b"partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        atomic_write(path, write=write_partially)
+    # the previous file is untouched and no temporary file is left behind
+    assert os.listdir(tmp_path) == ["result.csv"]
+    with open(path, "rb") as f:
+        assert f.read() == b"complete"
+
+
+def test_incremental_experiment(tmp_path):
+    """Test that adding a cross-study dataset to a finished experiment only runs the cross-study jobs."""
+    experiment_inputs = {
+        "models": [MODEL_FACTORY["NaivePredictor"]],
+        "n_cv_splits": 2,
+        "path_out": str(tmp_path),
+        "path_data": "../data",
+        "run_id": "incremental",
+    }
+    drug_response_experiment(response_data=load_toy("../data"), **experiment_inputs)
+    manifest = JobManifest(os.path.join(tmp_path, "incremental", "LPO", "manifest.sqlite"))
+    main_record = manifest.get(("NaivePredictor", None, 0, "main"))
+
+    drug_response_experiment(
+        response_data=load_toy("../data"),
+        cross_study_datasets=[load_dataset("GDSC1", path_data="../data")],
+        **experiment_inputs,
+    )
+    assert manifest.get(("NaivePredictor", None, 0, "main")) == main_record
+    assert manifest.status_counts() == {"done": 4}
+    for split_index in range(2):
+        assert os.path.isfile(
+            os.path.join(
+                tmp_path,
+                "incremental",
+                "LPO",
+                "NaivePredictor",
+                "cross_study",
+                f"cross_study_GDSC1_split_{split_index}.csv",
+            )
+        )
+
+
+def test_batched_single_drug_experiment(tmp_path):
+    """Test that batching a single drug model runs one main job per split and keeps the per-drug results."""
+    response_data = load_toy("../data")
+    drug_ids = np.unique(response_data.drug_ids)[:3]
+    response_data = response_data.subset(np.isin(response_data.drug_ids, drug_ids))
+    drug_response_experiment(
+        models=[MODEL_FACTORY["SingleDrugRandomForest"]],
+        response_data=response_data,
+        n_cv_splits=2,
+        path_out=str(tmp_path),
+        path_data="../data",
+        run_id="batched",
+        batch_single_drug_models=True,
+    )
+    result_path = os.path.join(tmp_path, "batched", "LPO")
+    manifest = JobManifest(os.path.join(result_path, "manifest.sqlite"))
+    assert manifest.status_counts() == {"done": 2}
+    for split_index in range(2):
+        outputs = manifest.get(("SingleDrugRandomForest", None, split_index, "main"))["outputs"]
+        for drug_id in drug_ids:
+            prediction_file = os.path.join(
+                result_path,
+                "SingleDrugRandomForest",
+                "drugs",
+                drug_id,
+                "predictions",
+                f"predictions_split_{split_index}.csv",
+            )
+            assert prediction_file in outputs
+            assert os.path.isfile(prediction_file)
@@ -0,0 +1,50 @@
+"""Tests for the randomization and robustness tests on a prepared fold."""
+
+import os
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from drevalpy.datasets.loader import load_toy
+from drevalpy.experiment import PreparedFold, randomization_test, robustness_test
+from drevalpy.models import MODEL_FACTORY
+
+
+def test_prepared_fold(tmp_path):
+    """Test that the tests of a fold share its setup without changing it."""
+    drug_response = load_toy("../data")
+    drug_response.split_dataset(n_cv_splits=2, mode="LPO", random_state=42)
+    split = drug_response.cv_splits[0]
+    response_transformation = StandardScaler()
+    prepared_fold = PreparedFold(
+        model=MODEL_FACTORY["ElasticNet"](),
+        hyperparameters={"alpha": 0.1, "l1_ratio": 0.5},
+        path_data="../data",
+        train_dataset=split["train"].copy(),
+        test_dataset=split["test"].copy(),
+        response_transformation=response_transformation,
+    )
+    train_response = prepared_fold.train_dataset.response.copy()
+    # the response transformation is fitted once on the training dataset
+    np.testing.assert_allclose(train_response.mean(), 0, atol=1e-8)
+
+    predictions = prepared_fold.train_and_predict()
+    shuffled_predictions = prepared_fold.train_and_predict(random_state=1)
+    np.testing.assert_array_equal(prepared_fold.train_dataset.response, train_response)
+    # the predictions are on the original scale
+    np.testing.assert_allclose(np.sort(predictions.response), np.sort(split["test"].response))
+    np.testing.assert_allclose(
+        np.sort(shuffled_predictions.predictions), np.sort(predictions.predictions), rtol=1e-3, atol=1e-3
+    )
+
+    trial_files = robustness_test(n_trials=2, prepared_fold=prepared_fold, path_out=str(tmp_path), split_index=0)
+    randomization_files = randomization_test(
+        randomization_test_views={"SVRC_gene_expression": ["gene_expression"]},
+        prepared_fold=prepared_fold,
+        path_out=str(tmp_path),
+        split_index=0,
+    )
+    assert all(os.path.isfile(file) for file in trial_files + randomization_files)
+    # the randomized features are copies, the prepared features are unchanged
+    prepared_predictions = prepared_fold.train_and_predict()
+    np.testing.assert_allclose(prepared_predictions.predictions, predictions.predictions)
@@ -29,7 +29,39 @@ from drevalpy.utils import main
             "response_transformation": "None",
             "multiprocessing": False,
             "path_data": "../data",
-        }
+            "n_workers": 1,
+            "threads_per_job": None,
+            "n_tuning_jobs": 1,
+            "tuning_strategy": "grid",
+            "n_tuning_trials": 20,
+            "warm_start_tuning": False,
+            "batch_single_drug_models": False,
+        },
+        {
+            "run_id": "test_run",
+            "dataset_name": "Toy_Data",
+            "models": ["NaiveCellLineMeanPredictor"],
+            "baselines": ["NaiveDrugMeanPredictor"],
+            "test_mode": ["LPO"],
+            "randomization_mode": ["SVRC"],
+            "randomization_type": "permutation",
+            "n_trials_robustness": 2,
+            "cross_study_datasets": [],
+            "curve_curator": False,
+            "overwrite": False,
+            "optim_metric": "RMSE",
+            "n_cv_splits": 2,
+            "response_transformation": "None",
+            "multiprocessing": False,
+            "path_data": "../data",
+            "n_workers": 2,
+            "threads_per_job": 1,
+            "n_tuning_jobs": 2,
+            "tuning_strategy": "successive_halving",
+            "n_tuning_trials": 20,
+            "warm_start_tuning": True,
+            "batch_single_drug_models": True,
+        },
     ],
 )
 def test_run_suite(args):
@@ -43,6 +75,8 @@ def test_run_suite(args):
     args = Namespace(**args)
     main(args)
     assert os.listdir(temp_dir.name) == ["test_run"]
+    for test_mode in args.test_mode:
+        assert os.path.exists(os.path.join(temp_dir.name, args.run_id, test_mode, "manifest.sqlite"))
     """
     (
         evaluation_results,
@@ -0,0 +1,51 @@
+"""Tests for the task graph scheduler."""
+
+import os
+import time
+
+import pytest
+
+from drevalpy.scheduler import Job, run_jobs
+
+
+def _append(path: str, name: str, delay: float = 0.0) -> str:
+    time.sleep(delay)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"{name}\n")
+    return name
+
+
+def _fail():
+    raise ValueError("job failed")
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_run_jobs(tmp_path, n_workers):
+    log = os.path.join(tmp_path, "log.txt")
+    jobs = [
+        Job(key="main", function=_append, kwargs={"path": log, "name": "main", "delay": 0.5}),
+        Job(key="independent", function=_append, kwargs={"path": log, "name": "independent"}),
+        Job(key="randomization", function=_append, kwargs={"path": log, "name": "randomization"}, depends_on=("main",)),
+        Job(key="robustness", function=_append, kwargs={"path": log, "name": "robustness"}, depends_on=("main",)),
+    ]
+    results = run_jobs(jobs, n_workers=n_workers, threads_per_job=1)
+    assert results == {job.key: job.key for job in jobs}
+    with open(log, encoding="utf-8") as f:
+        order = f.read().split()
+    assert sorted(order) == sorted(results)
+    assert order.index("main") < order.index("randomization")
+    assert order.index("main") < order.index("robustness")
+    if n_workers > 1:
+        # the independent job does not wait for the slow main job
+        assert order.index("independent") < order.index("main")
+
+
+def test_run_jobs_errors():
+    with pytest.raises(AssertionError):
+        run_jobs([Job(key="a", function=_fail), Job(key="a", function=_fail)])
+    with pytest.raises(AssertionError):
+        run_jobs([Job(key="a", function=_fail, depends_on=("b",)), Job(key="b", function=_fail)])
+    with pytest.raises(AssertionError):
+        run_jobs([Job(key="a", function=_fail)], n_workers=0)
+    with pytest.raises(ValueError):
+        run_jobs([Job(key="a", function=_fail)], n_workers=2)